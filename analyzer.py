@@ -1,27 +1,18 @@
+import argparse
 import json
-import os
+import sys
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 
+from utils.json_stream import Event, iter_payload_events
+from utils.payloads import parse_payload
 
-def strip_wrappers(text: str) -> str:
-    """Remove XSSI prefix and trailing comment markers from Maps responses."""
-    text = text.strip()
-    if text.startswith(")]}'"):
-        text = text[4:]
-    if text.endswith("*/"):
-        start = text.rfind("/*")
-        if start != -1:
-            text = text[:start]
-    return text.strip()
-
-
-def parse_payload(raw_text: str) -> Any:
-    """Parse nested Maps payload that may be wrapped twice."""
-    outer = json.loads(strip_wrappers(raw_text))
-    if isinstance(outer, dict) and isinstance(outer.get("d"), str):
-        return json.loads(strip_wrappers(outer["d"]))
-    return outer
+# Lists whose items share one layout; their indices collapse to [*] in path stats.
+# $[64] is the list of businesses in a search payload.
+DEFAULT_COLLAPSE = ("$[64]",)
+MAX_PATHS = 5000
+# Dict keys listed per summary node; None lists them all, as the printout always has.
+MAX_KEYS_SHOWN: int | None = None
 
 
 def load_payload_from_file(path: str = "f.txt") -> Any:
@@ -30,96 +21,259 @@ def load_payload_from_file(path: str = "f.txt") -> Any:
         raw_text = f.read()
     if not raw_text.strip():
         raise ValueError(f"{path} is empty; add a payload first.")
-    return parse_payload(raw_text)
+    return parse_payload(raw_text, lazy=False)
 
 
-def _summarize(node: Any, indent: int = 0, max_children: int = 5) -> None:
-    """Print a quick shape summary of the parsed payload."""
-    prefix = "  " * indent
-    if isinstance(node, list):
-        print(f"{prefix}list (len={len(node)})")
-        for child in node[:max_children]:
-            _summarize(child, indent + 1, max_children)
-        if len(node) > max_children:
-            print(f"{prefix}  ... ({len(node) - max_children} more)")
-    elif isinstance(node, dict):
-        print(f"{prefix}dict (keys={list(node.keys())})")
-        for i, (k, v) in enumerate(node.items()):
-            if i >= max_children:
-                print(f"{prefix}  ... ({len(node) - max_children} more)")
-                break
-            print(f"{prefix}  {k}:")
-            _summarize(v, indent + 2, max_children)
-    else:
-        print(f"{prefix}{type(node).__name__}: {repr(node)[:80]}")
+def _new_node(kind: str) -> Dict[str, Any]:
+    # cut: children left out by summary_depth; keys_more: keys past max_keys
+    return {"type": kind, "len": 0, "keys": [], "keys_more": 0, "children": [], "cut": 0}
+
+
+def _record(stats: Dict[str, Dict[str, Any]], path: str, kind: str, length: int | None) -> bool:
+    """Add one value to the stats of path; False when the path budget is spent."""
+    entry = stats.get(path)
+    if entry is None:
+        if len(stats) >= MAX_PATHS:
+            return False
+        entry = stats[path] = {"count": 0, "types": {}, "len_min": None, "len_max": None, "len_total": 0}
+    entry["count"] += 1
+    entry["types"][kind] = entry["types"].get(kind, 0) + 1
+    if length is not None:
+        entry["len_total"] += length
+        entry["len_min"] = length if entry["len_min"] is None else min(entry["len_min"], length)
+        entry["len_max"] = length if entry["len_max"] is None else max(entry["len_max"], length)
+    return True
+
+
+def analyze_events(
+    events: Iterable[Event],
+    *,
+    max_children: int = 5,
+    summary_depth: int | None = None,
+    max_keys: int | None = MAX_KEYS_SHOWN,
+    collapse: Tuple[str, ...] = DEFAULT_COLLAPSE,
+) -> Dict[str, Any]:
+    """
+    Build the shape summary, depth and per-path type/length stats in one pass.
+
+    The payload is never held whole and path stats stop at MAX_PATHS, but the
+    summary is only as bounded as its limits: without summary_depth it keeps
+    up to max_children children per container at every level (growing like
+    max_children ** depth), and without max_keys every dict key. With neither
+    set the summary matches the full printout; when set, what they cut is
+    counted on the node so summary_lines can say so.
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+    root: Dict[str, Any] | None = None
+    # Open containers: [path, kind, item count, summary node or None, pending key]
+    stack: List[list] = []
+    max_depth = 0
+    dropped = 0
+    values = 0
+
+    def child_path() -> str:
+        if not stack:
+            return "$"
+        parent = stack[-1]
+        if parent[1] == "dict":
+            return f"{parent[0]}.{parent[4]}"
+        index = "*" if parent[0] in collapse else parent[2]
+        return f"{parent[0]}[{index}]"
+
+    def child_node(kind: str, value: Any = None) -> Dict[str, Any] | None:
+        """Summary node for a new child, when the summary still has room for it."""
+        nonlocal root
+        if stack:
+            parent = stack[-1]
+            if parent[3] is None or parent[2] >= max_children:
+                return None
+            if summary_depth is not None and len(stack) >= summary_depth:
+                parent[3]["cut"] += 1
+                return None
+        node = _new_node(kind)
+        if kind not in ("list", "dict"):
+            node["repr"] = repr(value)[:80]
+        if stack:
+            parent[3]["children"].append((parent[4], node))
+        else:
+            root = node
+        return node
+
+    def finish_child() -> None:
+        if stack:
+            stack[-1][2] += 1
 
+    for kind, value in events:
+        if kind == "map_key":
+            top = stack[-1]
+            top[4] = value
+            if top[3] is not None:
+                if max_keys is None or len(top[3]["keys"]) < max_keys:
+                    top[3]["keys"].append(value)
+                else:
+                    top[3]["keys_more"] += 1
+            continue
+        if kind in ("start_map", "start_array"):
+            container = "dict" if kind == "start_map" else "list"
+            stack.append([child_path(), container, 0, child_node(container), None])
+            max_depth = max(max_depth, len(stack))
+            continue
+        if kind in ("end_map", "end_array"):
+            path, container, count, node, _ = stack.pop()
+            if node is not None:
+                node["len"] = count
+            if not _record(stats, path, container, count):
+                dropped += 1
+            finish_child()
+            continue
+        if kind in ("start_embedded", "end_embedded"):
+            continue
+        values += 1
+        type_name = type(value).__name__
+        child_node(type_name, value)
+        length = len(value) if isinstance(value, str) else None
+        if not _record(stats, child_path(), type_name, length):
+            dropped += 1
+        finish_child()
 
-def summarize_to_lines(node: Any, indent: int = 0, max_children: int = 5) -> List[str]:
-    """Return summary lines to optionally save to disk."""
+    return {
+        "root": root,
+        "max_depth": max_depth,
+        "scalars": values,
+        "paths": stats,
+        "paths_dropped": dropped,
+    }
+
+
+def summary_lines(node: Dict[str, Any] | None, indent: int = 0, max_children: int = 5) -> List[str]:
+    """
+    Render a summary node the way the shape printout has always looked, plus
+    an explicit "..." line wherever summary_depth left children out.
+    """
+    if node is None:
+        return []
     lines: List[str] = []
     prefix = "  " * indent
-    if isinstance(node, list):
-        lines.append(f"{prefix}list (len={len(node)})")
-        for child in node[:max_children]:
-            lines.extend(summarize_to_lines(child, indent + 1, max_children))
-        if len(node) > max_children:
-            lines.append(f"{prefix}  ... ({len(node) - max_children} more)")
-    elif isinstance(node, dict):
-        lines.append(f"{prefix}dict (keys={list(node.keys())})")
-        for i, (k, v) in enumerate(node.items()):
-            if i >= max_children:
-                lines.append(f"{prefix}  ... ({len(node) - max_children} more)")
-                break
-            lines.append(f"{prefix}  {k}:")
-            lines.extend(summarize_to_lines(v, indent + 2, max_children))
+    cut_line = f"{prefix}  ... ({node.get('cut', 0)} nested below the summary depth)"
+    if node["type"] == "list":
+        lines.append(f"{prefix}list (len={node['len']})")
+        for _, child in node["children"]:
+            lines.extend(summary_lines(child, indent + 1, max_children))
+        if node.get("cut"):
+            lines.append(cut_line)
+        if node["len"] > max_children:
+            lines.append(f"{prefix}  ... ({node['len'] - max_children} more)")
+    elif node["type"] == "dict":
+        keys_more = f" +{node['keys_more']} more" if node.get("keys_more") else ""
+        lines.append(f"{prefix}dict (keys={node['keys']}{keys_more})")
+        for key, child in node["children"]:
+            lines.append(f"{prefix}  {key}:")
+            lines.extend(summary_lines(child, indent + 2, max_children))
+        if node.get("cut"):
+            lines.append(cut_line)
+        if node["len"] > max_children:
+            lines.append(f"{prefix}  ... ({node['len'] - max_children} more)")
     else:
-        lines.append(f"{prefix}{type(node).__name__}: {repr(node)[:80]}")
+        lines.append(f"{prefix}{node['type']}: {node['repr']}")
     return lines
 
 
-def _prompt(message: str, default: str | None = None) -> str:
-    suffix = f" [{default}]" if default else ""
-    response = input(f"{message}{suffix}: ").strip()
-    return response or (default or "")
-
+def path_stat_lines(paths: Dict[str, Dict[str, Any]], limit: int | None = None) -> List[str]:
+    lines = []
+    for path in sorted(paths)[:limit]:
+        entry = paths[path]
+        types = ", ".join(f"{k}={v}" for k, v in sorted(entry["types"].items()))
+        line = f"  {path}  n={entry['count']}  [{types}]"
+        if entry["len_min"] is not None:
+            avg = entry["len_total"] / entry["count"]
+            line += f"  len {entry['len_min']}..{entry['len_max']} (avg {avg:.1f})"
+        lines.append(line)
+    if limit is not None and len(paths) > limit:
+        lines.append(f"  ... ({len(paths) - limit} more paths)")
+    return lines
 
-def _maybe_save_json(payload: Any, default_path: str) -> None:
-    """Optionally write a normalized JSON file."""
-    choice = _prompt("Save normalized JSON to disk? y/N", "N").lower()
-    if choice != "y":
-        return
-    out_path = _prompt("Output file path", default_path)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    print(f"[structure] wrote normalized JSON to {out_path}")
 
+def analyze_file(path: str, **kwargs) -> Dict[str, Any]:
+    """Stream a payload file through analyze_events."""
+    with open(path, "r", encoding="utf-8") as f:
+        report = analyze_events(iter_payload_events(f.read), **kwargs)
+    if report["root"] is None:
+        raise ValueError(f"{path} is empty; add a payload first.")
+    return report
 
-def _maybe_save_summary(lines: List[str], default_path: str) -> None:
-    """Optionally write the summary shape to disk."""
-    choice = _prompt("Save shape summary to a text file? y/N", "N").lower()
-    if choice != "y":
-        return
-    out_path = _prompt("Summary file path", default_path)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    print(f"[structure] wrote summary to {out_path}")
 
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Summarize the shape of a Maps payload file without loading it whole."
+    )
+    parser.add_argument("path", nargs="?", default="f.txt", help="Payload file")
+    parser.add_argument("--max-children", type=int, default=5, help="Children shown per container")
+    parser.add_argument(
+        "--summary-depth", type=int, default=None, help="Nesting shown in the summary (default: all)"
+    )
+    parser.add_argument(
+        "--max-keys", type=int, default=MAX_KEYS_SHOWN, help="Dict keys listed per node (default: all)"
+    )
+    parser.add_argument(
+        "--collapse",
+        action="append",
+        default=None,
+        help=f"List path whose indices merge into [*] (repeatable; default {DEFAULT_COLLAPSE[0]})",
+    )
+    parser.add_argument("--paths", type=int, default=200, help="Path stats printed (0 for none)")
+    parser.add_argument("--summary-out", help="Write the shape summary to this text file")
+    parser.add_argument("--stats-out", help="Write the full report to this JSON file")
+    parser.add_argument(
+        "--normalized-out",
+        help="Also write the unwrapped payload as JSON (loads the whole file)",
+    )
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
     try:
-        path = _prompt("Enter payload file path", "f.txt")
-        payload = load_payload_from_file(path)
-        print("[structure] Parsed payload shape:")
-        _summarize(payload)
-        summary_lines = summarize_to_lines(payload)
-        print("\n[structure] Quick stats:")
-        print(f"  Top-level type: {type(payload).__name__}")
-        if isinstance(payload, list):
-            print(f"  Top-level list length: {len(payload)}")
-        if isinstance(payload, dict):
-            print(f"  Top-level keys: {list(payload.keys())}")
-        base = os.path.splitext(path)[0]
-        _maybe_save_json(payload, f"{base}_normalized.json")
-        _maybe_save_summary(summary_lines, f"{base}_summary.txt")
+        report = analyze_file(
+            args.path,
+            max_children=args.max_children,
+            summary_depth=args.summary_depth,
+            max_keys=args.max_keys,
+            collapse=tuple(args.collapse or DEFAULT_COLLAPSE),
+        )
     except Exception as exc:
-        print(f"[structure] Failed to load/parse payloadexample.txt: {exc}")
+        print(f"[structure] Failed to load/parse {args.path}: {exc}")
+        return 1
+
+    lines = summary_lines(report["root"], max_children=args.max_children)
+    print("[structure] Parsed payload shape:")
+    print("\n".join(lines))
+    root = report["root"]
+    print("\n[structure] Quick stats:")
+    print(f"  Top-level type: {root['type']}")
+    if root["type"] == "list":
+        print(f"  Top-level list length: {root['len']}")
+    if root["type"] == "dict":
+        print(f"  Top-level keys: {root['keys']}")
+    print(f"  Max depth: {report['max_depth']}")
+    print(f"  Scalar values: {report['scalars']}")
+    print(f"  Distinct paths: {len(report['paths'])}")
+    if report["paths_dropped"]:
+        print(f"  Values past the {MAX_PATHS}-path limit: {report['paths_dropped']}")
+    if args.paths:
+        print("\n[structure] Per-path stats:")
+        print("\n".join(path_stat_lines(report["paths"], args.paths)))
+
+    if args.summary_out:
+        with open(args.summary_out, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        print(f"[structure] wrote summary to {args.summary_out}")
+    if args.stats_out:
+        with open(args.stats_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[structure] wrote stats to {args.stats_out}")
+    if args.normalized_out:
+        with open(args.normalized_out, "w", encoding="utf-8") as f:
+            json.dump(load_payload_from_file(args.path), f, ensure_ascii=False, indent=2)
+        print(f"[structure] wrote normalized JSON to {args.normalized_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from main import combined_csv_path, save_combined_csv
+from scraper import MAX_PAGINATION_PAGES, search_city
+from utils import metrics, rate_limit
+from utils.job_queue import Heartbeat, open_queue
+from utils.jobs import DONE, FAILED, RUNNING, WorkQueue, expand_jobs, load_job_file
+from utils.payloads import output_dir
+from utils.spill import SPILL_MERGE, consolidate
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "1"))
+# Seconds a queue worker waits before polling again while other hosts hold leases.
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "15"))
+
+
+def _scrape(item: dict, out_dir: str) -> list:
+    """
+    Run one item's search with its side outputs (payload pages, extracted
+    JSON/CSV) in its own directory, so concurrent items never share files.
+    """
+    with output_dir(os.path.join(out_dir, item["id"])):
+        return (
+            search_city(
+                data={
+                    "niche": item["niche"],
+                    "city": item["city"],
+                    "max_pages": item["depth"],
+                    "bbox": item.get("bbox"),
+                    "tiled": item.get("tiled"),
+                    "deadline_seconds": item.get("deadline_seconds"),
+                    "non_interactive": True,
+                }
+            )
+            or []
+        )
+
+
+def run_item(item: dict, queue: WorkQueue, out_dir: str) -> None:
+    """Scrape one niche/city item and record its status in the queue."""
+    queue.update(item["id"], status=RUNNING, attempts=item["attempts"] + 1, error=None)
+    print(f"\n=== [{item['id']}] {item['niche']} in {item['city']} ===")
+    try:
+        records = _scrape(item, out_dir)
+    except Exception as e:
+        print(f"[batch] {item['id']} failed: {e}")
+        queue.update(item["id"], status=FAILED, error=str(e))
+        return
+
+    item_path = os.path.join(out_dir, f"{item['id']}.json")
+    with open(item_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    queue.update(item["id"], status=DONE, records=len(records), output=item_path)
+    print(f"[batch] {item['id']} done ({len(records)} records)")
+
+
+def run_leased_items(queue, out_dir: str, worker: str, poll: float = QUEUE_POLL_SECONDS) -> None:
+    """
+    Claim, scrape and commit items from a shared lease queue until nothing is
+    pending or held by another worker.
+    """
+    while True:
+        item = queue.claim(worker)
+        if item is None:
+            if not queue.counts().get(RUNNING):
+                return
+            # Other hosts still hold leases; theirs may expire back to us
+            time.sleep(poll)
+            continue
+        print(f"\n=== [{item['id']}] {item['niche']} in {item['city']} ({worker}) ===")
+        with Heartbeat(queue, item) as beat:
+            try:
+                records = _scrape(item, out_dir)
+            except Exception as e:
+                print(f"[batch] {item['id']} failed: {e}")
+                queue.fail(item["id"], item["lease_token"], str(e))
+                continue
+        if beat.lost:
+            print(f"[batch] {item['id']}: lease lost; dropping this result")
+            continue
+        # One file per lease, so a late duplicate never overwrites the committed one
+        item_path = os.path.join(out_dir, f"{item['id']}.{item['lease_token'][:8]}.json")
+        with open(item_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        committed = queue.complete(
+            item["id"], item["lease_token"], records=len(records), output=item_path, result=records
+        )
+        if committed:
+            print(f"[batch] {item['id']} done ({len(records)} records)")
+        else:
+            print(f"[batch] {item['id']}: already committed elsewhere; dropping this result")
+            os.remove(item_path)
+
+
+def _read_output(item: dict) -> list:
+    """A finished item's records from its output file; a missing file is an error."""
+    try:
+        with open(item["output"], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"could not read output of {item['id']} ({item['output']}): {e}") from e
+
+
+def _queue_reader(queue):
+    """Reader for write_combined that takes records from the shared queue, not local files."""
+
+    def read(item: dict) -> list:
+        records = queue.results(item["id"])
+        if records is None:
+            raise RuntimeError(f"no records stored in the queue for {item['id']}")
+        return records
+
+    return read
+
+
+def write_combined_spilled(items, out_dir: str, read=_read_output) -> None:
+    """write_combined on disk: each item is read once per export, then spilled."""
+    done = [item for item in items if item["status"] == DONE and item.get("output")]
+    niches = sorted({item["id"].split("__", 1)[0] for item in done})
+    for niche_part in niches:
+        consolidate(
+            (read(item) for item in done if item["id"].split("__", 1)[0] == niche_part),
+            combined_csv_path(f"{niche_part}_all", out_dir),
+        )
+    if done:
+        consolidate((read(item) for item in done), combined_csv_path("batch_all", out_dir))
+
+
+def write_combined(items, out_dir: str, read=_read_output) -> None:
+    """
+    Combine every finished item's records into one CSV per niche and overall.
+    ``read`` returns an item's records and raises when they are unavailable.
+    """
+    if SPILL_MERGE:
+        write_combined_spilled(items, out_dir, read)
+        return
+    by_niche: dict[str, list] = {}
+    for item in items:
+        if item["status"] != DONE or not item.get("output"):
+            continue
+        records = read(item)
+        if not records:
+            continue
+        by_niche.setdefault(item["id"].split("__", 1)[0], []).extend(records)
+
+    all_records = []
+    for niche_part, records in by_niche.items():
+        save_combined_csv(records, f"{niche_part}_all", out_dir=out_dir)
+        all_records.extend(records)
+    if all_records:
+        save_combined_csv(all_records, "batch_all", out_dir=out_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run niche x city scraping jobs from a job file without prompts."
+    )
+    parser.add_argument(
+        "job_file", nargs="?", help="Job file (.json, .yaml or .csv); optional with --queue"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help="Items processed at once; HTTP searches overlap, browser searches share one browser in turn",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=MAX_PAGINATION_PAGES,
+        help="Default pagination depth for jobs that do not set one",
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="Also rerun items that failed before"
+    )
+    parser.add_argument("--out-dir", default=None, help="Where queue and outputs go")
+    parser.add_argument(
+        "--queue",
+        help="Shared lease queue (path, sqlite:///path or http://host:port) for multi-host runs",
+    )
+    parser.add_argument("--worker-id", default=None, help="Name of this worker in the queue")
+    args = parser.parse_args(argv)
+    # Unattended runs hit Maps for hours; pace them unless told otherwise
+    rate_limit.use_default_rate(rate_limit.BATCH_RATE_LIMIT_RPS)
+    if args.queue:
+        return run_queue(args)
+    if not args.job_file:
+        parser.error("job_file is required without --queue")
+
+    job_name = os.path.splitext(os.path.basename(args.job_file))[0]
+    out_dir = args.out_dir or os.path.join("output", "batch", job_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    items = expand_jobs(load_job_file(args.job_file), args.depth)
+    queue = WorkQueue(os.path.join(out_dir, "queue.json"), items)
+    todo = queue.pending(retry_failed=args.retry_failed)
+    print(f"[batch] {len(todo)} of {len(queue.items)} items to process")
+
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [pool.submit(run_item, item, queue, out_dir) for item in todo]
+        for future in as_completed(futures):
+            future.result()
+
+    write_combined(queue.items.values(), out_dir)
+    metrics.save(os.path.join(out_dir, "run_metrics.json"))
+    counts = queue.counts()
+    print(f"[batch] finished: {counts}")
+    return 1 if counts.get(FAILED) else 0
+
+
+def run_queue(args) -> int:
+    """
+    --queue mode: optionally enqueue a job file, then run --concurrency
+    workers against the shared queue. Any number of hosts can do the same.
+    """
+    name = os.path.splitext(os.path.basename(args.job_file))[0] if args.job_file else "queue"
+    out_dir = args.out_dir or os.path.join("output", "batch", name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    queue = open_queue(args.queue)
+    if args.job_file:
+        added = queue.enqueue(expand_jobs(load_job_file(args.job_file), args.depth))
+        print(f"[batch] queued {added} new items")
+    if args.retry_failed:
+        print(f"[batch] requeued {queue.retry_failed()} failed items")
+    print(f"[batch] queue: {queue.counts()}")
+
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    workers = max(1, args.concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_leased_items, queue, out_dir, f"{worker}-{n}") for n in range(workers)
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+    # Records travel through the queue, so every host's export is complete
+    write_combined(queue.items(DONE), out_dir, _queue_reader(queue))
+    metrics.save(os.path.join(out_dir, f"run_metrics_{worker}.json"))
+    counts = queue.counts()
+    print(f"[batch] finished: {counts}")
+    return 1 if counts.get(FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,16 @@
+import os
 import sys
 
-from scraper import initial_request
+from scraper import capture_city, process_bundle, process_bundles, search_city
+from utils import metrics
+from utils.async_pagination import ASYNC_PAGINATION
+from utils.jobs import safe_part
+from utils.payloads import _dedupe
+from utils.pipeline import run_pipeline
+from utils.spill import SPILL_MERGE, SpillMerger, write_merged
+
+# Overlap browser capture and HTTP pagination across cities.
+PIPELINE = os.getenv("PIPELINE", "0") == "1"
 
 
 def prompt_locations() -> list[str]:
@@ -10,6 +20,60 @@ def prompt_locations() -> list[str]:
     return [c.strip() for c in raw.split(",") if c.strip()]
 
 
+def combined_csv_path(name_part: str, out_dir: str = "output") -> str:
+    from datetime import datetime
+
+    os.makedirs(out_dir, exist_ok=True)
+    date_part = datetime.utcnow().strftime("%Y%m%d")
+    return os.path.join(out_dir, f"{date_part}_{name_part}.csv")
+
+
+def save_combined_csv(records: list[dict], name_part: str, out_dir: str = "output") -> str:
+    """
+    Dedupe records across cities (the rules SpillMerger applies on disk), write
+    them to <date>_<name_part>.csv in out_dir and return the path.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(_dedupe(records))
+    if "City" not in df.columns:
+        df["City"] = ""
+    out_path = combined_csv_path(name_part, out_dir)
+    df.to_csv(out_path, index=False)
+    print(f"\nCombined CSV saved to {out_path} ({len(df)} rows)")
+    return out_path
+
+
+def capture_cities(niche: str, cities: list[str]):
+    """Yield each city's browser capture as soon as it is done."""
+    for city in cities:
+        print(f"\n=== Capturing {city} ===")
+        yield capture_city({"niche": niche, "city": city})
+
+
+def collect_cities(niche: str, cities: list[str], collect) -> None:
+    """Search every city with the configured strategy, passing each one's records to collect."""
+    if ASYNC_PAGINATION:
+        # Each city starts paginating on one shared event loop as soon as the
+        # browser has captured it, while the next city is being captured
+        for recs in process_bundles(capture_cities(niche, cities)):
+            collect(recs)
+    elif PIPELINE:
+        # Browser searches city N+1 while city N paginates in the background
+        per_city = run_pipeline(
+            [{"niche": niche, "city": city} for city in cities],
+            capture_city,
+            process_bundle,
+        )
+        for recs in per_city:
+            collect(recs)
+    else:
+        for city in cities:
+            print(f"\n=== Processing {city} ===")
+            recs = search_city(data={"niche": niche, "city": city}) or []
+            collect(recs)
+
+
 def main():
     niche = input("Niche to search for: ").strip()
     cities = prompt_locations()
@@ -17,36 +81,20 @@ def main():
         print("No cities provided; exiting.")
         sys.exit(1)
 
-    combined_records = []
-    for city in cities:
-        print(f"\n=== Processing {city} ===")
-        recs = initial_request(data={"niche": niche, "city": city}) or []
-        combined_records.extend(recs)
-
     # Save combined CSV across all cities
-    if combined_records:
-        from datetime import datetime
-        import os
-        import pandas as pd
-
-        os.makedirs("output", exist_ok=True)
-
-        def safe_part(text: str) -> str:
-            if not text:
-                return "unknown"
-            return "".join(
-                ch for ch in text.lower() if ch.isalnum() or ch in ("-", "_")
-            )
-
-        date_part = datetime.utcnow().strftime("%Y%m%d")
-        niche_part = safe_part(niche)
-        fname = f"{date_part}_{niche_part}_all.csv"
-        df = pd.DataFrame(combined_records)
-        if "City" not in df.columns:
-            df["City"] = ""
-        out_path = os.path.join("output", fname)
-        df.to_csv(out_path, index=False)
-        print(f"\nCombined CSV saved to {out_path} ({len(df)} rows)")
+    if SPILL_MERGE:
+        # Hand each city's records to disk-backed runs right away; the runs
+        # are removed however the collection ends
+        with SpillMerger() as merger:
+            collect_cities(niche, cities, merger.add)
+            if merger.added:
+                write_merged(merger, combined_csv_path(f"{safe_part(niche)}_all"))
+    else:
+        combined_records = []
+        collect_cities(niche, cities, combined_records.extend)
+        if combined_records:
+            save_combined_csv(combined_records, f"{safe_part(niche)}_all")
+    metrics.save()
 
 
 if __name__ == "__main__":
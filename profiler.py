@@ -0,0 +1,284 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+from utils.payloads import parse_payload
+
+# Worker processes for profiling; 0 uses one per CPU.
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", "0"))
+# A path is "present" above this fill rate; changes of at least DRIFT_THRESHOLD
+# in fill or fast-path hit rate are reported as drift.
+MIN_FILL = 0.05
+DRIFT_THRESHOLD = 0.2
+
+# Names of saved search pages (ech1_payload_page1.json, ...) picked up when
+# walking a directory; extracted records, metrics and queue files are not payloads.
+PAYLOAD_GLOB = "ech*_payload*"
+
+ENTRY_PREFIX = "data[64][*][1]"
+TOKEN_PREFIX = "data[29]"
+
+# Positions the extractors read directly before falling back to scans, with
+# the type they expect there.
+FAST_PATHS: Dict[str, Tuple[Tuple[int, ...], Tuple[type, ...]]] = {
+    "name": ((11,), (str,)),
+    "place_id": ((78,), (str,)),
+    "feature_id": ((10,), (str,)),
+    "rating": ((4, 7), (int, float)),
+    "reviews": ((4, 8), (int, float)),
+    "website": ((7, 0), (str,)),
+    "address": ((18,), (str,)),
+    "coordinates": ((9, 2), (int, float)),
+    "token": ((29, 0, 1, 0), (str, list)),
+}
+
+
+def _type_name(value: Any) -> str:
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def _lookup(obj: Any, path: Tuple[int, ...]) -> Any:
+    for idx in path:
+        if not isinstance(obj, list) or idx >= len(obj):
+            return None
+        obj = obj[idx]
+    return obj
+
+
+def _count(paths: Dict[str, Dict[str, int]], path: str, value: Any) -> None:
+    types = paths.setdefault(path, {})
+    name = _type_name(value)
+    types[name] = types.get(name, 0) + 1
+
+
+def _walk(paths: Dict[str, Dict[str, int]], prefix: str, node: Any, depth: int) -> None:
+    """Count the type at every index of node, depth levels down."""
+    if depth <= 0 or not isinstance(node, list):
+        return
+    for idx, child in enumerate(node):
+        path = f"{prefix}[{idx}]"
+        _count(paths, path, child)
+        _walk(paths, path, child, depth - 1)
+
+
+def _empty_profile() -> Dict[str, Any]:
+    return {"files": 0, "failed": 0, "skipped": 0, "entries": 0, "paths": {}, "fast_paths": {}}
+
+
+def _is_search_payload(payload: Any) -> bool:
+    """True for a list with the search layout: [29] and [64] are lists or empty."""
+    return (
+        isinstance(payload, list)
+        and len(payload) > 64
+        and all(payload[idx] is None or isinstance(payload[idx], list) for idx in (29, 64))
+    )
+
+
+def profile_payload(payload: Any, depth: int = 2) -> Dict[str, Any]:
+    """Type counts per index path for one parsed payload; other documents are skipped."""
+    profile = _empty_profile()
+    if not _is_search_payload(payload):
+        profile["skipped"] = 1
+        return profile
+    profile["files"] = 1
+    paths = profile["paths"]
+    hits = profile["fast_paths"]
+    hits.update((label, 0) for label in FAST_PATHS)
+
+    token_path, token_kinds = FAST_PATHS["token"]
+    hits["token"] = int(isinstance(_lookup(payload, token_path), token_kinds))
+    if len(payload) > 29:
+        _walk(paths, TOKEN_PREFIX, payload[29], depth)
+
+    entries = payload[64] if len(payload) > 64 and isinstance(payload[64], list) else []
+    for entry in entries:
+        if not isinstance(entry, list) or len(entry) < 2 or not isinstance(entry[1], list):
+            continue
+        company_data = entry[1]
+        profile["entries"] += 1
+        _walk(paths, ENTRY_PREFIX, company_data, depth)
+        for label, (path, kinds) in FAST_PATHS.items():
+            if label != "token" and isinstance(_lookup(company_data, path), kinds):
+                hits[label] += 1
+    return profile
+
+
+def profile_file(path: str, depth: int = 2) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = parse_payload(f.read(), lazy=False)
+    except (OSError, ValueError) as e:
+        print(f"[profile] skipping {path}: {e}")
+        profile = _empty_profile()
+        profile["failed"] = 1
+        return profile
+    return profile_payload(payload, depth)
+
+
+def _profile_file_args(args: Tuple[str, int]) -> Dict[str, Any]:
+    return profile_file(*args)
+
+
+def merge_profiles(profiles: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = _empty_profile()
+    for profile in profiles:
+        for key in ("files", "failed", "skipped", "entries"):
+            merged[key] += profile[key]
+        for path, types in profile["paths"].items():
+            target = merged["paths"].setdefault(path, {})
+            for name, count in types.items():
+                target[name] = target.get(name, 0) + count
+        for label, count in profile["fast_paths"].items():
+            merged["fast_paths"][label] = merged["fast_paths"].get(label, 0) + count
+    return merged
+
+
+def find_payload_files(inputs: List[str], pattern: str = PAYLOAD_GLOB) -> List[str]:
+    """
+    Expand files and directories into payload files. Directories contribute
+    .json / .txt files whose names match pattern; files are taken as given.
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if name.endswith((".json", ".txt")) and fnmatch.fnmatch(name, pattern)
+                )
+        elif os.path.exists(item):
+            files.append(item)
+    return files
+
+
+def profile_corpus(files: List[str], depth: int = 2, workers: int = PROFILE_WORKERS) -> Dict[str, Any]:
+    """Profile payload files on a process pool and merge the results."""
+    workers = workers or os.cpu_count() or 1
+    jobs = [(path, depth) for path in files]
+    if workers == 1 or len(files) < 2:
+        return merge_profiles(map(_profile_file_args, jobs))
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_profiles(pool.map(_profile_file_args, jobs, chunksize=chunksize))
+
+
+def summarize(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-path fill rate and type distribution, plus fast-path hit rates."""
+    paths = {}
+    for path, types in profile["paths"].items():
+        total = profile["files"] if path.startswith(TOKEN_PREFIX) else profile["entries"]
+        non_null = {name: count for name, count in types.items() if name != "null"}
+        filled = sum(non_null.values())
+        seen = sum(types.values())
+        paths[path] = {
+            "fill": filled / total if total else 0.0,
+            "types": {name: count / seen for name, count in sorted(types.items())},
+            "dominant": max(non_null, key=non_null.get) if non_null else "null",
+        }
+    fast_paths = {}
+    for label, count in profile["fast_paths"].items():
+        total = profile["files"] if label == "token" else profile["entries"]
+        fast_paths[label] = count / total if total else 0.0
+    return {
+        "files": profile["files"],
+        "failed": profile["failed"],
+        "skipped": profile.get("skipped", 0),
+        "entries": profile["entries"],
+        "paths": paths,
+        "fast_paths": fast_paths,
+    }
+
+
+def diff_summaries(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DRIFT_THRESHOLD
+) -> List[str]:
+    """Describe every field path and fast path that moved since the baseline."""
+    changes = []
+    old_paths, new_paths = baseline["paths"], current["paths"]
+
+    def key(path: str):
+        # Sort data[64][*][1][9] before data[64][*][1][10]
+        return [int(p) if p.isdigit() else p for p in path.replace("]", "").split("[")]
+
+    for path in sorted(set(old_paths) | set(new_paths), key=key):
+        old = old_paths.get(path, {"fill": 0.0, "dominant": None})
+        new = new_paths.get(path, {"fill": 0.0, "dominant": None})
+        was, now = old["fill"] >= MIN_FILL, new["fill"] >= MIN_FILL
+        if was and not now:
+            changes.append(f"gone     {path}  fill {old['fill']:.0%} -> {new['fill']:.0%}")
+        elif now and not was:
+            changes.append(f"new      {path}  fill {new['fill']:.0%} ({new['dominant']})")
+        elif was and old["dominant"] != new["dominant"]:
+            changes.append(f"retyped  {path}  {old['dominant']} -> {new['dominant']}")
+        elif abs(new["fill"] - old["fill"]) >= threshold:
+            changes.append(f"fill     {path}  {old['fill']:.0%} -> {new['fill']:.0%}")
+
+    for label in sorted(set(baseline["fast_paths"]) | set(current["fast_paths"])):
+        old_rate = baseline["fast_paths"].get(label, 0.0)
+        new_rate = current["fast_paths"].get(label, 0.0)
+        if old_rate - new_rate >= threshold:
+            changes.append(
+                f"fallback {label}: fast path hit rate {old_rate:.0%} -> {new_rate:.0%}"
+            )
+    return changes
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Profile the layout of archived Maps payloads and detect drift."
+    )
+    parser.add_argument("inputs", nargs="*", default=["output"], help="Payload files or directories")
+    parser.add_argument(
+        "--pattern", default=PAYLOAD_GLOB, help="File names taken from directories (use * for all)"
+    )
+    parser.add_argument("--depth", type=int, default=2, help="Index levels profiled under each root")
+    parser.add_argument("--workers", type=int, default=PROFILE_WORKERS, help="Processes (0 = CPUs)")
+    parser.add_argument("--save-baseline", help="Write this profile as the new baseline")
+    parser.add_argument("--baseline", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=DRIFT_THRESHOLD, help="Reported change in rate")
+    parser.add_argument("--out", help="Write the profile summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    files = find_payload_files(args.inputs, args.pattern)
+    if not files:
+        print("[profile] no payload files found")
+        return 1
+    print(f"[profile] profiling {len(files)} payload files")
+    current = summarize(profile_corpus(files, args.depth, args.workers))
+    print(
+        f"[profile] {current['entries']} entries in {current['files']} payloads "
+        f"({current['failed']} unreadable, {current['skipped']} not search payloads)"
+    )
+    for label, rate in sorted(current["fast_paths"].items()):
+        print(f"  fast path {label}: {rate:.0%}")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+            print(f"[profile] wrote {path}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    changes = diff_summaries(baseline, current, args.threshold)
+    if not changes:
+        print("[profile] layout matches the baseline")
+        return 0
+    print(f"[profile] {len(changes)} field paths moved since the baseline:")
+    for line in changes:
+        print(f"  {line}")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import argparse
+import sys
+from typing import List
+
+from utils import store
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and export the SQLite results store.")
+    parser.add_argument("--db", default=store.RESULTS_DB or "output/results.db", help="Database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    runs = sub.add_parser("runs", help="List recorded runs")
+    runs.add_argument("--limit", type=int, default=20)
+
+    export = sub.add_parser("export", help="Export businesses changed after a run to CSV")
+    export.add_argument("--since", type=int, default=0, help="Last run already exported (0 = all)")
+    export.add_argument("--out", required=True, help="CSV file to write")
+    export.add_argument("--niche")
+    export.add_argument("--city")
+    args = parser.parse_args(argv)
+
+    conn = store.connect(args.db)
+    try:
+        if args.command == "runs":
+            rows = conn.execute(
+                "SELECT id, started_at, niche, city, records FROM runs ORDER BY id DESC LIMIT ?",
+                (args.limit,),
+            ).fetchall()
+            for row in rows:
+                print(f"{row['id']:>6}  {row['niche'] or '-':<24} {row['city'] or '-':<24} {row['records']}")
+            return 0
+        store.export_changed(conn, args.since, args.out, niche=args.niche, city=args.city)
+        print(f"[store] latest run is {store.latest_run(conn)}; pass it as --since next time")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,51 @@
 import os
+import threading
 import time
 
 from botasaurus.browser import Driver, browser
 
-from utils.capture import build_capture_tracker
-from utils.payloads import process_captured_payloads
+from utils import watchdog
+from utils.async_pagination import process_bundles_concurrently
+from utils.capture import tab_lock
+from utils.deadline import Deadline
+from utils.direct_search import (
+    build_search_template,
+    direct_search,
+    load_search_template,
+    save_search_template,
+)
+from utils.geo_tiles import parse_bbox, tiled_search
+from utils.payloads import (
+    collect_captured_bodies,
+    process_captured_payloads,
+    process_collected_payloads,
+)
+from utils.resource_policy import apply_resource_policy, forget_driver, resource_report
+from utils.session import drop_session, start_search
 
 # Cap how many paginated "requests" pages we will fetch after ech=2.
 MAX_PAGINATION_PAGES = int(os.getenv("MAX_PAGINATION_PAGES", "5"))
+# Reuse a captured search template over plain HTTP before opening the browser.
+DIRECT_SEARCH = os.getenv("DIRECT_SEARCH", "0") == "1"
+# Cover each city with viewport tiles (needs a saved template).
+TILED_SEARCH = os.getenv("TILED_SEARCH", "0") == "1"
 
+# initial_request reuses one driver, so concurrent callers take turns on it
+_browser_lock = threading.Lock()
 
-@browser(reuse_driver=True, headless=True)
-def initial_request(driver: Driver, data):
-    # Open Maps and search for the niche/city
-    driver.google_get("https://www.google.com/maps/", accept_google_cookies=True)
+
+def _run_search(driver: Driver, data, deadline: Deadline):
+    """
+    Search Maps in the browser; return (captured, cookies, niche, city) or None.
+    Scrolling and the capture wait stop early once ``deadline`` passes.
+    """
+    # Keep tiles, images and fonts out of the browser; only search XHRs matter
+    apply_resource_policy(driver)
     niche = (data or {}).get("niche") or input("Niche to search for: ")
     city = (data or {}).get("city") or input("City to target: ")
 
-    wait_seconds = 60
-    search_box = driver.wait_for_element("input#searchboxinput", wait=wait_seconds)
-    search_btn = driver.wait_for_element(
-        'button[aria-label="Search"]', wait=wait_seconds
-    )
-
-    captured, response_handler = build_capture_tracker()
-    driver.after_response_received(response_handler)
-
-    search_box.type(f"{niche} in {city}")
-    search_btn.click()
+    # Reuses the already-open Maps app when this driver has searched before
+    captured = start_search(driver, f"{niche} in {city}", deadline=deadline)
     driver.sleep(3)  # give Maps time to fire network calls
 
     # Scroll until we see an ech=2 response (pagination trigger) or timeout
@@ -38,31 +56,161 @@ def initial_request(driver: Driver, data):
         except Exception:
             pass
         driver.sleep(1)
-        if time.time() - start_scroll > 30:
+        if time.time() - start_scroll > 30 or deadline.expired("scroll"):
             break
 
     # Wait until no new endpoints for 10 seconds
 
     cookies = driver.get_cookies()
     captured["last_seen"] = time.time()
-    while time.time() - captured["last_seen"] < 1:
+    while time.time() - captured["last_seen"] < 1 and not deadline.expired("capture_wait"):
         driver.sleep(1)
 
+    if watchdog.check_driver(driver):
+        # The pool owner closes this driver after the task; keep what we need
+        drop_session(driver, keep_cookies=True)
+        forget_driver(driver)
+
     if not captured["request_ids"]:
         print("No business page endpoints (ech=2/3) captured within the wait window.")
-        driver.prompt()
-        return
-
-    extracted_path, count, records = process_captured_payloads(
-        captured,
-        driver,
-        max_pages=MAX_PAGINATION_PAGES,
-        meta={"city": city, "niche": niche},
+        if not (data or {}).get("non_interactive"):
+            driver.prompt()
+        return None
+
+    template = build_search_template(captured, cookies)
+    if template:
+        save_search_template(template)
+    print(resource_report())
+    return captured, cookies, niche, city
+
+
+@browser(reuse_driver=True, headless=True)
+def initial_request(driver: Driver, data):
+    deadline = Deadline.for_job(data)
+    with tab_lock(driver):
+        result = _run_search(driver, data, deadline)
+        if not result:
+            return
+        captured, _, niche, city = result
+
+        extracted_path, count, records = process_captured_payloads(
+            captured,
+            driver,
+            max_pages=(data or {}).get("max_pages") or MAX_PAGINATION_PAGES,
+            meta={"city": city, "niche": niche},
+            deadline=deadline,
+        )
+    print(f"Saved structured data to {extracted_path} ({count} records)")
+    return records
+
+
+@browser(reuse_driver=True, headless=True, output=None)
+def capture_request(driver: Driver, data):
+    """
+    Browser stage of the pipeline: search and hand back the captured bodies
+    and cookies so pagination and extraction can run without the browser.
+    """
+    deadline = Deadline.for_job(data)
+    with tab_lock(driver):
+        result = _run_search(driver, data, deadline)
+        if not result:
+            return None
+        captured, cookies, niche, city = result
+        bodies = collect_captured_bodies(captured, driver, deadline)
+    return {
+        "niche": niche,
+        "city": city,
+        "max_pages": (data or {}).get("max_pages") or MAX_PAGINATION_PAGES,
+        "bodies": bodies,
+        "cookies": {c.get("name"): c.get("value") for c in cookies},
+        # The HTTP stage spends what is left of the same budget
+        "deadline_at": deadline.expires_at,
+    }
+
+
+def _recycle_if_due(task) -> None:
+    """Close a browser task's pooled drivers when the watchdog asked for it."""
+    pending = watchdog.take_pending()
+    if pending:
+        task.close()
+        watchdog.record_recycle(pending)
+
+
+def capture_city(data):
+    """Pipeline browser stage: capture_request plus driver recycling."""
+    try:
+        return capture_request(data=data)
+    finally:
+        _recycle_if_due(capture_request)
+
+
+def process_bundle(bundle):
+    """HTTP/extraction stage of the pipeline for one capture_request result."""
+    extracted_path, count, records = process_collected_payloads(
+        bundle["bodies"],
+        bundle["cookies"],
+        bundle["max_pages"],
+        meta={"city": bundle["city"], "niche": bundle["niche"]},
+        deadline=Deadline.for_job(bundle),
     )
     print(f"Saved structured data to {extracted_path} ({count} records)")
     return records
 
 
+def process_bundles(bundles):
+    """
+    process_bundle for many cities, paginating all of their chains on one
+    event loop. bundles may be a generator of captures; each city starts
+    paginating as soon as it is yielded.
+    """
+    per_city = []
+    for extracted_path, count, records in process_bundles_concurrently(bundles):
+        print(f"Saved structured data to {extracted_path} ({count} records)")
+        per_city.append(records)
+    return per_city
+
+
+def search_city(data):
+    """
+    Scrape one niche/city, trying a direct HTTP search from the saved template
+    first (when DIRECT_SEARCH=1) and falling back to the browser flow. Tiled
+    searches (TILED_SEARCH=1, or "tiled"/"bbox" in data) also need the template.
+    One deadline (CITY_DEADLINE_SECONDS or "deadline_seconds") covers every
+    attempt; whatever was gathered when it passes is saved. HTTP searches
+    can run concurrently; browser searches run one at a time.
+    """
+    deadline = Deadline.for_job(data)
+    tiled = data.get("tiled") or TILED_SEARCH or bool(data.get("bbox"))
+    template = load_search_template() if (DIRECT_SEARCH or tiled) else None
+    if template:
+        max_pages = data.get("max_pages") or MAX_PAGINATION_PAGES
+        try:
+            if tiled:
+                extracted_path, count, records = tiled_search(
+                    template,
+                    data["niche"],
+                    data["city"],
+                    max_pages,
+                    bbox=parse_bbox(data.get("bbox")),
+                    deadline=deadline,
+                )
+            else:
+                extracted_path, count, records = direct_search(
+                    template, data["niche"], data["city"], max_pages, deadline=deadline
+                )
+            print(f"Saved structured data to {extracted_path} ({count} records)")
+            return records
+        except Exception as e:
+            print(f"[direct] {e}; falling back to the browser")
+        if deadline.expired("direct"):
+            return []
+    with _browser_lock:
+        try:
+            return initial_request(data={**data, "deadline_at": deadline.expires_at})
+        finally:
+            _recycle_if_due(initial_request)
+
+
 # Initiate the web scraping task
 if __name__ == "__main__":
     initial_request()
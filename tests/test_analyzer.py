@@ -0,0 +1,77 @@
+import json
+from typing import Any, List
+
+import pytest
+
+import analyzer
+
+PAYLOADS = [
+    [None, [1, 2.5, 3e2, "x" * 200], {"a": [True, False], "b": {"c": "d"}}],
+    {"k": list(range(12)), "nested": [[[[{"deep": "value"}]]]], "s": ""},
+    [{f"key{n}": n for n in range(9)}, [], {}],
+]
+
+
+def _reference_lines(node: Any, indent: int = 0, max_children: int = 5) -> List[str]:
+    """The shape printout as it was built from a fully loaded payload."""
+    lines: List[str] = []
+    prefix = "  " * indent
+    if isinstance(node, list):
+        lines.append(f"{prefix}list (len={len(node)})")
+        for child in node[:max_children]:
+            lines.extend(_reference_lines(child, indent + 1, max_children))
+        if len(node) > max_children:
+            lines.append(f"{prefix}  ... ({len(node) - max_children} more)")
+    elif isinstance(node, dict):
+        lines.append(f"{prefix}dict (keys={list(node.keys())})")
+        for i, (k, v) in enumerate(node.items()):
+            if i >= max_children:
+                lines.append(f"{prefix}  ... ({len(node) - max_children} more)")
+                break
+            lines.append(f"{prefix}  {k}:")
+            lines.extend(_reference_lines(v, indent + 2, max_children))
+    else:
+        lines.append(f"{prefix}{type(node).__name__}: {repr(node)[:80]}")
+    return lines
+
+
+def _write_wrapped(tmp_path, payload) -> str:
+    path = tmp_path / "payload.txt"
+    inner = ")]}'\n" + json.dumps(payload)
+    path.write_text(")]}'\n" + json.dumps({"c": 0, "d": inner}) + '/*""*/', encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_streamed_summary_matches_the_loaded_printout(tmp_path, payload):
+    report = analyzer.analyze_file(_write_wrapped(tmp_path, payload))
+    assert analyzer.summary_lines(report["root"]) == _reference_lines(payload)
+
+
+def test_path_stats_collapse_business_list(tmp_path):
+    payload = [None] * 64 + [[[None, ["a", 1]], [None, ["bb", 2]], [None, ["ccc", 3]]]]
+    report = analyzer.analyze_file(_write_wrapped(tmp_path, payload))
+    paths = report["paths"]
+    assert paths["$[64][*][1][0]"]["count"] == 3
+    assert (paths["$[64][*][1][0]"]["len_min"], paths["$[64][*][1][0]"]["len_max"]) == (1, 3)
+    assert not any(p.startswith("$[64][1]") for p in paths)
+    assert report["max_depth"] == 4
+
+
+def test_summary_depth_cuts_and_says_so(tmp_path):
+    payload = {"nested": [[[[{"deep": "value"}]]]]}
+    report = analyzer.analyze_file(_write_wrapped(tmp_path, payload), summary_depth=2)
+    lines = analyzer.summary_lines(report["root"])
+    assert any("nested below the summary depth" in line for line in lines)
+    assert not any("deep" in line for line in lines)
+    assert report["max_depth"] == 6
+
+
+def test_main_writes_reports(tmp_path, capsys):
+    path = _write_wrapped(tmp_path, PAYLOADS[0])
+    stats_out = tmp_path / "stats.json"
+    normalized_out = tmp_path / "normalized.json"
+    assert analyzer.main([path, "--stats-out", str(stats_out), "--normalized-out", str(normalized_out)]) == 0
+    assert json.loads(stats_out.read_text(encoding="utf-8"))["root"]["type"] == "list"
+    assert json.loads(normalized_out.read_text(encoding="utf-8")) == PAYLOADS[0]
+    assert "Top-level list length: 3" in capsys.readouterr().out
@@ -0,0 +1,58 @@
+import json
+import os
+
+from utils import changefeed
+from utils.payloads import record_key
+
+
+def _rec(place_id, **fields):
+    return {"PlaceId": place_id, "Name": place_id.lower(), **fields}
+
+
+def _snapshot(records, fields=changefeed.FINGERPRINT_FIELDS):
+    return {record_key(r): {"fp": changefeed.fingerprint(r, fields), "record": r} for r in records}
+
+
+def test_diff_reports_new_changed_and_removed():
+    previous = _snapshot([_rec("A", Reviews=1), _rec("B", Reviews=2), _rec("C")])
+    events, snapshot, fields = changefeed.diff_records(
+        previous, [_rec("A", Reviews=1), _rec("B", Reviews=3), _rec("D")], record_key
+    )
+    ops = {(e["op"], e["key"]) for e in events}
+    assert ops == {("changed", "place:B"), ("new", "place:D"), ("removed", "place:C")}
+    assert next(e for e in events if e["op"] == "changed")["fields"] == ["Reviews"]
+    assert set(snapshot) == {"place:A", "place:B", "place:D"}
+    assert fields == changefeed.FINGERPRINT_FIELDS
+
+
+def test_partial_run_keeps_unseen_businesses():
+    previous = _snapshot([_rec(f"P{n}") for n in range(10)])
+    events, snapshot, _ = changefeed.diff_records(previous, [_rec("P0"), _rec("P1")], record_key)
+    assert events == []
+    assert len(snapshot) == 10
+
+
+def test_narrowed_fields_compare_only_what_both_runs_carry():
+    previous = _snapshot([_rec("A", Phone="1", Website="a.example", Reviews=5)])
+    narrowed = ("Name", "Phone")
+    events, snapshot, fields = changefeed.diff_records(
+        previous, [{"PlaceId": "A", "Name": "a", "Phone": "1"}], record_key, fields=narrowed
+    )
+    assert events == []
+    assert fields == narrowed
+    events, _, _ = changefeed.diff_records(
+        previous, [{"PlaceId": "A", "Name": "a", "Phone": "2"}], record_key, fields=narrowed
+    )
+    assert [(e["op"], e["fields"]) for e in events] == [("changed", ["Phone"])]
+
+
+def test_emit_changes_writes_feed_then_snapshot(tmp_path):
+    out_dir = str(tmp_path)
+    first = changefeed.emit_changes([_rec("A")], record_key, niche="cafe", city="Leeds", out_dir=out_dir)
+    assert first and os.path.exists(first)
+    assert changefeed.emit_changes([_rec("A")], record_key, niche="cafe", city="Leeds", out_dir=out_dir) is None
+    with open(first, encoding="utf-8") as f:
+        assert [json.loads(line)["op"] for line in f] == ["new"]
+    previous, fields = changefeed.load_snapshot(changefeed.snapshot_path("cafe", "Leeds", out_dir))
+    assert list(previous) == ["place:A"]
+    assert fields == changefeed.FINGERPRINT_FIELDS
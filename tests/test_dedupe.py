@@ -0,0 +1,35 @@
+import json
+
+from utils import payloads
+
+
+def _records():
+    return [
+        {"Name": "Acme Plumbing", "PlaceId": "ChIJ1", "Phone": "0113 496 0000", "Reviews": "3"},
+        {"Name": "Acme Plumbing", "PlaceId": "ChIJ1", "Phone": None, "Reviews": "12"},
+        {"Name": "Other", "PlaceId": "ChIJ2", "Phone": "0113 496 0001"},
+    ]
+
+
+def test_dedupe_merges_on_place_id_and_keeps_more_reviews():
+    merged = payloads._dedupe(_records())
+    assert len(merged) == 2
+    assert merged[0]["Phone"] == "0113 496 0000"
+    assert merged[0]["Reviews"] == 12
+
+
+def test_dedupe_projection_leaves_other_fields_out():
+    merged = payloads._dedupe(_records(), ("Name", "Phone"))
+    assert set(merged[0]) == {"Name", "PlaceId", "Phone", "City", "Niche"}
+
+
+def test_finalize_records_writes_only_projected_fields(tmp_path):
+    with payloads.output_dir(str(tmp_path)):
+        path, count, records = payloads.finalize_records(
+            _records(), [], meta={"city": "Leeds", "niche": "plumbers"}, fields=("Name", "Phone")
+        )
+    assert count == 2
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert all("Reviews" not in rec and "Website" not in rec for rec in saved)
+    assert saved[0]["City"] == "Leeds"
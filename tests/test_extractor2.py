@@ -0,0 +1,51 @@
+from utils.extractor2 import entry_identity, extract_companies_advanced
+
+
+def _entry(name, reviews, place_id="ChIJplace000001", rating=4.5):
+    data = [None] * 79
+    data[4] = [None] * 7 + [rating, reviews]
+    data[10] = "0x48795c1f:0x1a2b"
+    data[11] = name
+    data[78] = place_id
+    return [None, data]
+
+
+def _page(*entries):
+    payload = [None] * 65
+    payload[64] = list(entries)
+    return payload
+
+
+def test_entry_identity_prefers_place_id_at_78():
+    assert entry_identity(_entry("Acme", 3)[1]) == "ChIJplace000001"
+
+
+def test_entry_identity_scans_for_place_id_before_cid():
+    data = _entry("Acme", 3)[1]
+    data[78] = None
+    data[40] = [["ChIJnested00002"]]
+    assert entry_identity(data) == "ChIJnested00002"
+
+
+def test_entry_identity_falls_back_to_cid():
+    data = _entry("Acme", 3)[1]
+    data[78] = None
+    assert entry_identity(data) == f"cid:{int('1a2b', 16)}"
+
+
+def test_repeat_keeps_the_higher_review_count():
+    seen = {}
+    first = extract_companies_advanced(_page(_entry("Acme", 3)), seen=seen, fields=("Rating", "Reviews"))
+    again = extract_companies_advanced(_page(_entry("Acme", 12)), seen=seen, fields=("Rating", "Reviews"))
+    assert again == []
+    assert first[0]["Reviews"] == 12
+    assert first[0]["Rating"] == 4.5
+
+
+def test_every_repeat_is_merged_without_lowering_reviews():
+    seen = {}
+    first = extract_companies_advanced(_page(_entry("Acme", 12)), seen=seen, fields=("Reviews",))
+    extract_companies_advanced(_page(_entry("Acme", 3)), seen=seen, fields=("Reviews",))
+    assert first[0]["Reviews"] == 12
+    assert extract_companies_advanced(_page(_entry("Acme", 40)), seen=seen, fields=("Reviews",)) == []
+    assert first[0]["Reviews"] == 40
@@ -0,0 +1,56 @@
+import json
+import time
+from email.utils import formatdate
+
+import pytest
+
+from utils.http import FetchError, check_response, classify_status, parse_retry_after
+
+
+@pytest.mark.parametrize(
+    "status, kind",
+    [
+        (200, None),
+        (302, None),
+        (403, "client_error"),
+        (404, "client_error"),
+        (429, "throttled"),
+        (500, "server_error"),
+        (503, "server_error"),
+    ],
+)
+def test_classify_status(status, kind):
+    assert classify_status(status) == kind
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("-3") == 0.0
+
+
+def test_parse_retry_after_http_date():
+    delay = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+    assert 55 <= delay <= 60
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_parse_retry_after_rejects_garbage(value):
+    assert parse_retry_after(value) is None
+
+
+def test_check_response_carries_retry_after_on_throttling():
+    with pytest.raises(FetchError) as info:
+        check_response(429, "", json.loads, "7")
+    assert (info.value.kind, info.value.status, info.value.retry_after) == ("throttled", 429, 7.0)
+
+
+def test_check_response_tells_truncated_from_unparsable():
+    with pytest.raises(FetchError) as info:
+        check_response(200, '[1, [2, 3', json.loads, None)
+    assert info.value.kind == "truncated"
+    with pytest.raises(FetchError) as info:
+        check_response(200, "[1, oops]", json.loads, None)
+    assert info.value.kind == "parse"
+    assert check_response(200, "[1]", json.loads, None) == [1]
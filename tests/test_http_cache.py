@@ -0,0 +1,26 @@
+from utils import http_cache
+
+PAGE = (
+    "https://www.google.com/search?tbm=map&hl=en&q=cafe%20in%20leeds&ech=3&psi={psi}"
+    "&pb=!4m4!1m3!1d2000!2d-1.5!3d53.8!7i20!8i{offset}!22m2!1s{psi}!7e81!50m2!5e1!9s{token}"
+)
+
+
+def _url(psi="abc.1", token="TOKEN1", offset=20):
+    return PAGE.format(psi=psi, token=token, offset=offset)
+
+
+def test_psi_and_token_do_not_change_the_cache_file(tmp_path):
+    first = _url(psi="abc.1", token="TOKEN1")
+    rerun = _url(psi="xyz.2", token="TOKEN2")
+    assert first != rerun
+    assert http_cache.normalize_url(first) == http_cache.normalize_url(rerun)
+    assert http_cache._path(first, str(tmp_path)) == http_cache._path(rerun, str(tmp_path))
+
+
+def test_page_offset_and_query_keep_pages_apart(tmp_path):
+    page2 = _url(offset=20)
+    page3 = _url(offset=40)
+    other_query = page2.replace("cafe", "bakery")
+    paths = {http_cache._path(u, str(tmp_path)) for u in (page2, page3, other_query)}
+    assert len(paths) == 3
@@ -0,0 +1,59 @@
+import time
+
+from utils.job_queue import SQLiteLeaseQueue
+from utils.jobs import DONE, FAILED, PENDING, RUNNING, expand_jobs
+
+
+def _queue(tmp_path, lease_seconds=60.0):
+    queue = SQLiteLeaseQueue(str(tmp_path / "queue.db"), lease_seconds=lease_seconds)
+    queue.enqueue(expand_jobs([{"niche": "cafe", "cities": "Leeds, York"}], 2))
+    return queue
+
+
+def _expire(queue):
+    queue._conn.execute("UPDATE jobs SET lease_expires = ?", (time.time() - 1,))
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    queue = _queue(tmp_path)
+    assert queue.enqueue(expand_jobs([{"niche": "cafe", "city": "Leeds"}], 2)) == 0
+    assert queue.counts() == {PENDING: 2}
+
+
+def test_complete_succeeds_once_for_the_lease_holder(tmp_path):
+    queue = _queue(tmp_path)
+    item = queue.claim("w1")
+    assert not queue.complete(item["id"], "not-the-token", records=1, output=None)
+    assert queue.complete(item["id"], item["lease_token"], records=1, output="a.csv", result=[{"Name": "x"}])
+    assert not queue.complete(item["id"], item["lease_token"], records=2, output="b.csv", result=[])
+    done = queue.items(DONE)
+    assert [(i["id"], i["records"], i["output"]) for i in done] == [(item["id"], 1, "a.csv")]
+    assert queue.results(item["id"]) == [{"Name": "x"}]
+
+
+def test_expired_lease_goes_to_another_worker(tmp_path):
+    queue = _queue(tmp_path)
+    first = queue.claim("w1")
+    queue.claim("w1")
+    _expire(queue)
+    second = queue.claim("w2")
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+    # The old holder lost the lease: its heartbeat and result are refused
+    assert not queue.heartbeat(first["id"], first["lease_token"])
+    assert not queue.complete(first["id"], first["lease_token"], records=1, output=None)
+    assert queue.heartbeat(second["id"], second["lease_token"])
+    assert queue.complete(second["id"], second["lease_token"], records=3, output=None)
+
+
+def test_expired_lease_fails_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path)
+    queue.claim("w1", max_attempts=1)
+    _expire(queue)
+    queue.claim("w2", max_attempts=1)
+    statuses = {i["id"]: i["status"] for i in queue.items()}
+    assert sorted(statuses.values()) == [FAILED, RUNNING]
+    failed = queue.items(FAILED)[0]
+    assert "lease expired" in failed["error"]
+    assert queue.retry_failed() == 1
+    assert queue.claim("w3")["id"] == failed["id"]
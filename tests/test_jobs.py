@@ -0,0 +1,20 @@
+from utils.jobs import expand_jobs, safe_part
+
+
+def test_safe_part_keeps_filename_characters():
+    assert safe_part("St. Louis, MO") == "stlouismo"
+    assert safe_part("") == "unknown"
+
+
+def test_expand_jobs_drops_repeated_pairs(capsys):
+    items = expand_jobs([{"niche": "cafe", "cities": "Leeds, York"}, {"niche": "Cafe", "city": "leeds"}], 2)
+    assert [item["id"] for item in items] == ["cafe__leeds", "cafe__york"]
+    assert "skipped 1" in capsys.readouterr().out
+
+
+def test_expand_jobs_reports_and_keeps_colliding_spellings(capsys):
+    items = expand_jobs([{"niche": "cafe", "cities": ["St. Louis", "St Louis"]}], 2)
+    assert [item["id"] for item in items] == ["cafe__stlouis", "cafe__stlouis__2"]
+    assert [item["city"] for item in items] == ["St. Louis", "St Louis"]
+    out = capsys.readouterr().out
+    assert "'St Louis'" in out and "'St. Louis'" in out
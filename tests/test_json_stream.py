@@ -0,0 +1,63 @@
+import io
+import json
+
+import pytest
+
+from utils.json_stream import iter_events, iter_payload_events
+from utils.payloads import parse_payload
+
+DOCS = [
+    '[1, -2.5, 3e2, "x", true, false, null]',
+    '{"a": {"b": [[], {}, [{"c": "d"}]]}, "e": ""}',
+    '["esc \\" \\\\ \\/ \\n \\t \\u00e9 \\ud83d\\ude00", "tail"]',
+    "[" + ",".join(f'{{"k{n}": [{n}, "{"v" * n}"]}}' for n in range(60)) + "]",
+    '  \n {"spaced" :  [ 1 , 2 ] }  ',
+]
+
+
+def _build(events):
+    """Rebuild the document an event stream describes."""
+    # Open containers as [container, pending map key]
+    stack, root = [], None
+
+    def add(value):
+        nonlocal root
+        if not stack:
+            root = value
+        elif isinstance(stack[-1][0], list):
+            stack[-1][0].append(value)
+        else:
+            stack[-1][0][stack[-1][1]] = value
+
+    for kind, value in events:
+        if kind in ("start_map", "start_array"):
+            container = {} if kind == "start_map" else []
+            add(container)
+            stack.append([container, None])
+        elif kind in ("end_map", "end_array"):
+            stack.pop()
+        elif kind == "map_key":
+            stack[-1][1] = value
+        elif kind not in ("start_embedded", "end_embedded"):
+            add(value)
+    return root
+
+
+@pytest.mark.parametrize("doc", DOCS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+def test_events_rebuild_what_json_loads_returns(doc, chunk_size):
+    events = iter_events(io.StringIO(doc).read, chunk_size=chunk_size)
+    assert _build(events) == json.loads(doc)
+
+
+@pytest.mark.parametrize("chunk_size", [2, 5, 1 << 16])
+def test_payload_events_unwrap_like_parse_payload(chunk_size):
+    inner = json.dumps([None, ["page", 1], {"x": [1, 2]}])
+    raw = ")]}'\n" + json.dumps({"c": 0, "d": ")]}'\n" + inner, "e": 1}) + '/*""*/'
+    events = iter_payload_events(io.StringIO(raw).read, chunk_size=chunk_size)
+    assert _build(events) == parse_payload(raw, lazy=False)
+
+
+def test_payload_events_pass_unwrapped_documents_through():
+    raw = ")]}'\n[1, {\"d\": 2}]"
+    assert _build(iter_payload_events(io.StringIO(raw).read)) == parse_payload(raw, lazy=False)
@@ -0,0 +1,162 @@
+import pytest
+
+from utils import payloads
+from utils.deadline import Deadline
+from utils.http import ErrorBudget, FetchError
+from utils.pb_url import SearchUrlTemplate
+
+START = (
+    "https://www.google.com/search?tbm=map&hl=en&q=cafe%20in%20leeds&ech=2"
+    "&pb=!4m4!1m3!1d2000!2d-1.5!3d53.8!7i20!8i0!22m2!1sabc!7e81!50m2!5e1!9sSTART"
+)
+SIZE = 20
+
+
+def _entry(place_id):
+    data = [None] * 79
+    data[11] = f"biz {place_id}"
+    data[78] = place_id
+    return [None, data]
+
+
+def _page(n, total, ids=None):
+    """Page n of a search with total pages; every page but the last links the next."""
+    payload = [None] * 65
+    payload[29] = [[None, [f"0ahUtok{n + 1}"]]] if n < total else None
+    payload[64] = [_entry(i) for i in (ids or [f"ChIJp{n:02d}e{k:02d}" for k in range(SIZE)])]
+    return payload
+
+
+def _offset_page(url):
+    return SearchUrlTemplate.from_url(url).page_offset // SIZE
+
+
+def _token_page(url):
+    token = SearchUrlTemplate.from_url(url).token
+    return int(token[len("0ahUtok"):])
+
+
+@pytest.fixture(autouse=True)
+def _outputs(tmp_path):
+    with payloads.output_dir(str(tmp_path)):
+        yield
+
+
+def _run_chain(chain, respond):
+    fetched = []
+    try:
+        url = next(chain)
+        while True:
+            fetched.append(url)
+            url = chain.send(respond(url))
+    except StopIteration as done:
+        records, last_url, stats = done.value
+    return records, fetched, stats
+
+
+def test_chain_stops_when_tokens_run_out():
+    chain = payloads.pagination_chain(START, "0ahUtok1", 10)
+    records, fetched, stats = _run_chain(chain, lambda url: _page(_token_page(url), 3))
+    assert len(fetched) == 3
+    assert len(records) == 3 * SIZE
+    # Page URLs carry their offset next to the token
+    assert [SearchUrlTemplate.from_url(u).page_offset for u in fetched] == [20, 40, 60]
+    assert all("ech=3" in u for u in fetched)
+
+
+def test_chain_stops_at_max_pages():
+    chain = payloads.pagination_chain(START, "0ahUtok1", 2)
+    _, fetched, _ = _run_chain(chain, lambda url: _page(_token_page(url), 10))
+    assert len(fetched) == 2
+
+
+def test_chain_stops_on_a_repeated_token():
+    def respond(url):
+        page = _page(_token_page(url), 10)
+        page[29] = [[None, ["0ahUtok1"]]]
+        return page
+
+    _, fetched, _ = _run_chain(payloads.pagination_chain(START, "0ahUtok1", 10), respond)
+    assert len(fetched) == 1
+
+
+def test_chain_stops_after_low_yield_pages():
+    same = [f"ChIJsame{k:02d}" for k in range(SIZE)]
+    chain = payloads.pagination_chain(START, "0ahUtok1", 10, min_yield=0.5, patience=2)
+    records, fetched, stats = _run_chain(chain, lambda url: _page(_token_page(url), 10, same))
+    assert len(fetched) == 3
+    assert [s["new"] for s in stats] == [SIZE, 0, 0]
+    assert len(records) == SIZE
+
+
+def test_chain_stops_on_fetch_error_and_keeps_earlier_pages():
+    def respond(url):
+        n = _token_page(url)
+        return FetchError("HTTP 500", "server_error", 500) if n == 2 else _page(n, 10)
+
+    records, fetched, _ = _run_chain(payloads.pagination_chain(START, "0ahUtok1", 10), respond)
+    assert len(fetched) == 2
+    assert len(records) == SIZE
+
+
+def test_chain_respects_budget_and_deadline():
+    spent = ErrorBudget(limit=1)
+    spent.spend()
+    _, fetched, _ = _run_chain(
+        payloads.pagination_chain(START, "0ahUtok1", 10, budget=spent), lambda url: _page(1, 10)
+    )
+    assert fetched == []
+    _, fetched, _ = _run_chain(
+        payloads.pagination_chain(START, "0ahUtok1", 10, deadline=Deadline(1.0)), lambda url: _page(1, 10)
+    )
+    assert fetched == []
+
+
+class _Server:
+    """Fake search endpoint paging by offset (honours_offsets) or by token only."""
+
+    def __init__(self, total, honours_offsets):
+        self.total = total
+        self.honours_offsets = honours_offsets
+        self.urls = []
+
+    def __call__(self, url, **kwargs):
+        self.urls.append(url)
+        n = _offset_page(url) if self.honours_offsets else _token_page(url)
+        if n > self.total:
+            return _page(n, self.total, ids=[])
+        return _page(n, self.total)
+
+
+def _paginate(monkeypatch, server, max_pages=4):
+    monkeypatch.setattr(payloads, "OFFSET_PAGINATION", True)
+    monkeypatch.setattr(payloads, "fetch_with_retry", server)
+    return payloads._paginate_requests(START, "0ahUtok1", max_pages, headers={}, cookies={})
+
+
+def test_offsets_honoured_fetch_every_page_in_one_wave(monkeypatch):
+    monkeypatch.setattr(payloads, "_offset_verdicts", {})
+    server = _Server(total=4, honours_offsets=True)
+    records, _, stats = _paginate(monkeypatch, server)
+    assert len(records) == 4 * SIZE
+    assert len(server.urls) == 1 + 4
+    assert list(payloads._offset_verdicts.values()) == [True]
+
+
+def test_offsets_ignored_fall_back_to_the_token_chain(monkeypatch):
+    monkeypatch.setattr(payloads, "_offset_verdicts", {})
+    server = _Server(total=3, honours_offsets=False)
+    records, _, _ = _paginate(monkeypatch, server)
+    assert len(records) == 3 * SIZE
+    assert list(payloads._offset_verdicts.values()) == [False]
+    # The wave (token page + 4 offset pages) plus chain pages 2 and 3
+    assert len(server.urls) == 1 + 4 + 2
+
+
+def test_cached_ignored_verdict_skips_the_wave(monkeypatch):
+    monkeypatch.setattr(payloads, "_offset_verdicts", {})
+    _paginate(monkeypatch, _Server(total=3, honours_offsets=False))
+    server = _Server(total=3, honours_offsets=False)
+    records, _, _ = _paginate(monkeypatch, server)
+    assert len(records) == 3 * SIZE
+    assert len(server.urls) == 3
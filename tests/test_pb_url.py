@@ -0,0 +1,53 @@
+from utils.pb_url import SearchUrlTemplate
+
+URL = (
+    "https://www.google.com/search?tbm=map&authuser=0&hl=en&q=cafe%20in%20leeds&ech=2&psi=abc"
+    "&pb=!4m4!1m3!1d2000!2d-1.5!3d53.8!7i20!8i0!22m2!1sabc!7e81!50m2!5e1!9sTOKEN1&flag"
+)
+
+
+def test_unchanged_template_round_trips_exactly():
+    assert SearchUrlTemplate(URL).to_url() == URL
+    assert SearchUrlTemplate.from_url(URL).to_url() == URL
+
+
+def test_known_fields_are_parsed():
+    template = SearchUrlTemplate(URL)
+    assert template.token == "TOKEN1"
+    assert template.page_size == 20
+    assert template.page_offset == 0
+    assert template.viewport == (2000.0, -1.5, 53.8)
+    assert template.get_param("q") == "cafe in leeds"
+    assert template.get_param("flag") is None
+
+
+def test_edits_reserialize_only_what_changed():
+    template = SearchUrlTemplate.from_url(URL)
+    template.set_token("TOKEN2")
+    template.set_page_offset(40)
+    template.set_query("bars in york")
+    template.set_viewport(53.96, -1.08)
+    url = template.to_url()
+    assert "!9sTOKEN2" in url and "!8i40" in url
+    assert "q=bars%20in%20york" in url
+    assert "!2d-1.08!3d53.96" in url
+    assert url.endswith("&flag")
+    reparsed = SearchUrlTemplate(url)
+    assert reparsed.pb() == template.pb()
+    assert reparsed.get_param("q") == "bars in york"
+
+
+def test_copies_do_not_share_edits():
+    first = SearchUrlTemplate.from_url(URL)
+    first.set_token("CHANGED")
+    first.set_param("new", "1")
+    second = SearchUrlTemplate.from_url(URL)
+    assert second.token == "TOKEN1"
+    assert second.get_param("new") is None
+    assert second.to_url() == URL
+
+
+def test_token_slot_needs_the_5e1_sibling():
+    template = SearchUrlTemplate(URL.replace("!5e1!9sTOKEN1", "!5e2!9sTOKEN1"))
+    assert not template.has_token_slot
+    assert template.token is None
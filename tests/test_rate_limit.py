@@ -0,0 +1,24 @@
+from utils import rate_limit
+
+URL = "https://www.google.com/search?tbm=map"
+
+
+def test_limiting_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_RPS", raising=False)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_RPS", 0.0)
+    assert rate_limit.bucket_for(URL) is None
+
+
+def test_batch_default_turns_limiting_on(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_RPS", raising=False)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_RPS", 0.0)
+    monkeypatch.setattr(rate_limit, "_buckets", {})
+    rate_limit.use_default_rate(rate_limit.BATCH_RATE_LIMIT_RPS)
+    assert rate_limit.bucket_for(URL).base_rate == rate_limit.BATCH_RATE_LIMIT_RPS
+
+
+def test_explicit_setting_wins_over_batch_default(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_RPS", "0")
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_RPS", 0.0)
+    rate_limit.use_default_rate(rate_limit.BATCH_RATE_LIMIT_RPS)
+    assert rate_limit.bucket_for(URL) is None
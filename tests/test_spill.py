@@ -0,0 +1,67 @@
+import random
+
+from utils import payloads
+from utils.spill import SpillMerger, write_csv
+
+
+def _records():
+    return [
+        {"Name": "ACME", "PlaceId": "ChIJ1", "Phone": "0113 496 0000", "Reviews": "12", "City": "Leeds"},
+        {"Name": "Acme Plumbing", "PlaceId": "ChIJ1", "Reviews": "3", "City": "Leeds"},
+        # No place id: the phone, then the site, tie these to the first record
+        {"Name": "Acme Plumbing Ltd", "Phone": "0113496 0000", "Website": "https://acme.example/", "City": "Leeds"},
+        {"Name": "Acme Ltd", "Website": "http://www.acme.example", "Rating": "4.5", "City": "Leeds"},
+        # Same name in another city stays a separate business
+        {"Name": "Acme Plumbing", "City": "York"},
+        {"Name": "Other", "PlaceId": "ChIJ2", "City": "Leeds"},
+        {"Phone": None},
+    ]
+
+
+def _canonical(records):
+    return sorted(sorted((k, str(v)) for k, v in rec.items()) for rec in records)
+
+
+def test_merge_matches_in_memory_dedupe(tmp_path):
+    records = _records()
+    with SpillMerger(str(tmp_path), partitions=3, run_records=2) as merger:
+        merger.add(records[:3])
+        merger.add(records[3:])
+        spilled = list(merger.merge())
+    assert _canonical(spilled) == _canonical(payloads._dedupe(records))
+
+
+def test_merge_links_records_through_secondary_keys(tmp_path):
+    with SpillMerger(str(tmp_path), partitions=4, run_records=1) as merger:
+        merger.add(_records())
+        merged = list(merger.merge())
+    acme_leeds = [r for r in merged if r["City"] == "Leeds" and r["PlaceId"] != "ChIJ2"]
+    assert len(acme_leeds) == 1
+    assert acme_leeds[0]["PlaceId"] == "ChIJ1"
+    assert acme_leeds[0]["Reviews"] == 12
+    assert acme_leeds[0]["Website"] == "https://acme.example/"
+    assert acme_leeds[0]["Rating"] == "4.5"
+    assert len(merged) == 4
+
+
+def test_merge_matches_dedupe_on_shuffled_streams(tmp_path):
+    rng = random.Random(7)
+    records = []
+    for _ in range(300):
+        rec = {"Name": f"biz {rng.randrange(60)}", "City": rng.choice(["Leeds", "York"])}
+        if rng.random() < 0.5:
+            rec["PlaceId"] = f"ChIJ{rng.randrange(80)}"
+        if rng.random() < 0.5:
+            rec["Phone"] = f"0113 496 {rng.randrange(100):04d}"
+        rec["Reviews"] = str(rng.randrange(50))
+        records.append(rec)
+    with SpillMerger(str(tmp_path), partitions=5, run_records=37) as merger:
+        merger.add(records)
+        spilled = list(merger.merge())
+    assert _canonical(spilled) == _canonical(payloads._dedupe(records))
+
+
+def test_write_csv_counts_rows(tmp_path):
+    path = tmp_path / "out.csv"
+    assert write_csv(payloads._dedupe(_records()), str(path)) == 4
+    assert path.read_text(encoding="utf-8").splitlines()[0].startswith("Name,PlaceId")
@@ -0,0 +1,55 @@
+from utils import store
+from utils.payloads import _normalize_phone, record_key
+
+
+def _rows(conn):
+    return {row["business_key"]: row for row in conn.execute("SELECT * FROM businesses")}
+
+
+def _upsert(conn, records):
+    run_id = store.start_run(conn, niche="cafe", city="Leeds")
+    store.upsert_records(conn, run_id, records, record_key, normalize_phone=_normalize_phone)
+    return run_id
+
+
+def test_changed_run_moves_only_when_a_value_changes(tmp_path):
+    conn = store.connect(str(tmp_path / "results.db"))
+    first = _upsert(
+        conn,
+        [
+            {"Name": "Acme", "PlaceId": "ChIJ1", "Phone": "0113 496 0000", "Reviews": "10"},
+            {"Name": "Other", "PlaceId": "ChIJ2", "Reviews": "4"},
+        ],
+    )
+    second = _upsert(
+        conn,
+        [
+            {"Name": "Acme", "PlaceId": "ChIJ1", "Phone": "0113 496 0000", "Reviews": "10"},
+            {"Name": "Other", "PlaceId": "ChIJ2", "Reviews": "5"},
+        ],
+    )
+    rows = _rows(conn)
+    assert rows["place:ChIJ1"]["changed_run"] == first
+    assert rows["place:ChIJ1"]["last_run"] == second
+    assert rows["place:ChIJ2"]["changed_run"] == second
+    assert [row["business_key"] for row in store.changed_since(conn, first)] == ["place:ChIJ2"]
+
+
+def test_missing_values_never_erase_or_count_as_changes(tmp_path):
+    conn = store.connect(str(tmp_path / "results.db"))
+    first = _upsert(conn, [{"Name": "Acme", "PlaceId": "ChIJ1", "Phone": "0113 496 0000", "Rating": "4.5"}])
+    _upsert(conn, [{"Name": "Acme", "PlaceId": "ChIJ1", "Phone": "N/A", "Rating": None}])
+    row = _rows(conn)["place:ChIJ1"]
+    assert row["phone"] == "0113 496 0000"
+    assert row["phone_norm"] == "01134960000"
+    assert row["rating"] == 4.5
+    assert row["changed_run"] == first
+
+
+def test_observations_are_kept_per_run(tmp_path):
+    conn = store.connect(str(tmp_path / "results.db"))
+    _upsert(conn, [{"Name": "Acme", "PlaceId": "ChIJ1", "Reviews": "1,204"}])
+    _upsert(conn, [{"Name": "Acme", "PlaceId": "ChIJ1", "Reviews": "1,300"}, {"Name": None}])
+    reviews = [row["reviews"] for row in conn.execute("SELECT reviews FROM observations ORDER BY run_id")]
+    assert reviews == [1204, 1300]
+    assert [row["records"] for row in conn.execute("SELECT records FROM runs ORDER BY id")] == [1, 1]
@@ -0,0 +1,262 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+from utils import metrics, rate_limit
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.http import (
+    HTTP_TIMEOUT,
+    RETRY_ATTEMPTS,
+    ErrorBudget,
+    FetchError,
+    cached_payload,
+    check_response,
+    fetch_with_retry,
+    retry_delay,
+    store_body,
+)
+from utils.payloads import (
+    CHROME_HEADERS,
+    extract_collected_bodies,
+    finalize_records,
+    pagination_chain,
+    parse_payload,
+)
+from utils.pipeline import PIPELINE_QUEUE_SIZE
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Paginate captured cities on one event loop instead of one after another.
+ASYNC_PAGINATION = os.getenv("ASYNC_PAGINATION", "0") == "1"
+# Page requests in flight at once across every chain.
+ASYNC_PAGINATION_CONCURRENCY = int(os.getenv("ASYNC_PAGINATION_CONCURRENCY", "16"))
+
+_DONE = object()
+
+
+async def _acquire(url: str) -> None:
+    """rate_limit.acquire without blocking the event loop."""
+    bucket = rate_limit.bucket_for(url)
+    waited = 0.0
+    while bucket:
+        wait = bucket.try_acquire()
+        if not wait:
+            break
+        await asyncio.sleep(wait)
+        waited += wait
+    if waited:
+        metrics.incr("rate_limit.wait_seconds", waited)
+
+
+async def _fetch_aiohttp(
+    session: "aiohttp.ClientSession",
+    url: str,
+    *,
+    headers: Dict[str, str],
+    cookies: Dict[str, str],
+    budget: ErrorBudget,
+    attempts: int = RETRY_ATTEMPTS,
+    timeout: float = HTTP_TIMEOUT,
+    deadline: Deadline = NO_DEADLINE,
+) -> Any:
+    """fetch_with_retry on aiohttp: same cache, classification, backoff, budget and deadline."""
+    cached = cached_payload(url, parse_payload)
+    if cached is not None:
+        return cached
+    for attempt in range(max(1, attempts)):
+        if deadline.expired("http"):
+            raise FetchError("search deadline exceeded", "deadline")
+        await _acquire(url)
+        try:
+            async with session.get(
+                url,
+                headers=headers,
+                cookies=cookies,
+                timeout=aiohttp.ClientTimeout(total=deadline.cap(timeout)),
+            ) as resp:
+                text = await resp.text()
+            rate_limit.report(url, resp.status)
+            payload = check_response(resp.status, text, parse_payload, resp.headers.get("Retry-After"))
+            store_body(url, text)
+            return payload
+        except FetchError as e:
+            error = e
+        except asyncio.TimeoutError:
+            error = FetchError("request timed out", "timeout")
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+            error = FetchError(str(e), "connection")
+        except aiohttp.ClientError as e:
+            error = FetchError(str(e), "client_error")
+        await asyncio.sleep(min(retry_delay(error, attempt, attempts, budget, "async"), deadline.remaining()))
+    raise FetchError("no attempts made", "client_error")
+
+
+async def _run_chain(job: Dict[str, Any], session, limit: asyncio.Semaphore):
+    budget = job.get("budget") or ErrorBudget()
+    deadline = job.get("deadline") or NO_DEADLINE
+    chain = pagination_chain(
+        job["start_url"],
+        job["first_token"],
+        job["max_pages"],
+        seen=job.get("seen"),
+        budget=budget,
+        deadline=deadline,
+    )
+    try:
+        url = next(chain)
+        while True:
+            async with limit:
+                try:
+                    if session is not None:
+                        result = await _fetch_aiohttp(
+                            session,
+                            url,
+                            headers=job.get("headers", CHROME_HEADERS),
+                            cookies=job["cookies"],
+                            budget=budget,
+                            deadline=deadline,
+                        )
+                    else:
+                        result = await asyncio.to_thread(
+                            fetch_with_retry,
+                            url,
+                            headers=job.get("headers", CHROME_HEADERS),
+                            cookies=job["cookies"],
+                            parse=parse_payload,
+                            budget=budget,
+                            deadline=deadline,
+                        )
+                except FetchError as e:
+                    result = e
+            # Extraction runs on the loop between fetches; pages are small
+            url = chain.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+async def paginate_chains_async(
+    jobs: List[Dict[str, Any]], concurrency: int = ASYNC_PAGINATION_CONCURRENCY
+) -> List[Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]]:
+    """
+    Run every job's token chain as its own coroutine.
+
+    A job holds start_url, first_token, max_pages, cookies and optionally
+    headers, seen, budget and deadline, the same inputs as _paginate_requests, and gets
+    back the same (records, last URL, page stats). Within a chain pages stay
+    sequential; across chains at most ``concurrency`` requests are in flight.
+    Without aiohttp, each page goes through fetch_with_retry on a worker thread.
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+    if aiohttp is None:
+        return await asyncio.gather(*(_run_chain(job, None, limit) for job in jobs))
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*(_run_chain(job, session, limit) for job in jobs))
+
+
+def paginate_chains(
+    jobs: List[Dict[str, Any]], concurrency: int = ASYNC_PAGINATION_CONCURRENCY
+) -> List[Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]]:
+    """Blocking entry point for paginate_chains_async."""
+    if not jobs:
+        return []
+    return asyncio.run(paginate_chains_async(jobs, concurrency))
+
+
+async def _process_bundle(bundle: Dict[str, Any], session, limit: asyncio.Semaphore):
+    """Extract one captured city, paginate its chains on the shared loop, finalize it."""
+    deadline = Deadline(bundle.get("deadline_at"), f"{bundle.get('niche') or ''} in {bundle.get('city') or ''}".strip())
+    state = await asyncio.to_thread(extract_collected_bodies, bundle["bodies"])
+    jobs = [
+        {
+            "start_url": url,
+            "first_token": token,
+            "max_pages": bundle["max_pages"],
+            "cookies": bundle["cookies"],
+            "seen": state["seen"],
+            "budget": state["budget"],
+            "deadline": deadline,
+        }
+        for url, token in state["chains"]
+    ]
+    print(f"[async] paginating {len(jobs)} chains for {bundle.get('niche')} in {bundle.get('city')}")
+    for records, _, _ in await asyncio.gather(*(_run_chain(job, session, limit) for job in jobs)):
+        state["ech2plus"].extend(records)
+    return await asyncio.to_thread(
+        finalize_records,
+        state["ech1"],
+        state["ech2plus"],
+        meta={"city": bundle["city"], "niche": bundle["niche"]},
+    )
+
+
+async def _drain(handoff: "queue.Queue[Any]", concurrency: int, results: Dict[int, Any]) -> None:
+    """Start each bundle's pagination as soon as it comes off the queue."""
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(idx, bundle, session):
+        try:
+            results[idx] = await _process_bundle(bundle, session, limit)
+        except Exception as e:
+            print(f"[async] processing search {idx} failed: {e}")
+
+    async def consume(session):
+        tasks = []
+        while True:
+            job = await asyncio.to_thread(handoff.get)
+            if job is _DONE:
+                break
+            tasks.append(asyncio.create_task(run(*job, session)))
+        await asyncio.gather(*tasks)
+
+    if aiohttp is None:
+        await consume(None)
+        return
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await consume(session)
+
+
+def process_bundles_concurrently(
+    bundles: Iterable[Dict[str, Any] | None],
+    concurrency: int = ASYNC_PAGINATION_CONCURRENCY,
+    *,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+) -> List[Tuple[str, int, List[Dict[str, Any]]]]:
+    """
+    process_collected_payloads for many captured cities on one event loop.
+
+    bundles may be a generator that captures lazily: the calling thread pulls
+    from it and hands each bundle to the loop through a bounded queue, as
+    run_pipeline does, so a city's chains start paginating while the browser
+    captures the next one. Empty bundles are skipped. Each bundle's
+    deadline_at bounds its own chains; its captured bodies are always
+    extracted. Returns one (path, count, records) per processed bundle, in
+    capture order.
+    """
+    handoff: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+    results: Dict[int, Tuple[str, int, List[Dict[str, Any]]]] = {}
+    loop_thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(asyncio.run, _drain(handoff, concurrency, results)),
+        name="async-pagination",
+        daemon=True,
+    )
+    loop_thread.start()
+    count = 0
+    try:
+        for bundle in bundles:
+            if bundle:
+                # Blocks while pagination is behind (backpressure)
+                handoff.put((count, bundle))
+                count += 1
+    finally:
+        handoff.put(_DONE)
+        loop_thread.join()
+    return [results[idx] for idx in range(count) if idx in results]
@@ -1,9 +1,53 @@
+import base64
+import os
+import queue
+import threading
 import time
-from typing import Any, Callable, Dict, Tuple
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Tuple
 from urllib.parse import parse_qs, urlsplit
 
 from botasaurus.browser import cdp
 
+from utils import metrics, rate_limit
+
+try:
+    from botasaurus_driver.core.connection import make_request_body, parse_response
+except ImportError:  # older driver layout; bodies are fetched one by one
+    make_request_body = parse_response = None
+
+try:
+    DRIVER_VERSION = metadata.version("botasaurus-driver")
+except metadata.PackageNotFoundError:
+    DRIVER_VERSION = None
+
+# Seconds to wait for all pipelined Network.getResponseBody replies.
+BODY_FETCH_TIMEOUT = float(os.getenv("BODY_FETCH_TIMEOUT", "30"))
+# botasaurus-driver releases whose Connection internals (message counter,
+# reply queue, listener) the pipelined fetch was checked against; any other
+# release uses the driver's public collect_response.
+PIPELINED_DRIVER_VERSIONS = ("4.0.",)
+
+_TAB_LOCK_ATTR = "_devtools_lock"
+_tab_lock_guard = threading.Lock()
+
+
+def tab_lock(driver) -> threading.RLock:
+    """
+    Lock for sending DevTools commands on driver's tab.
+
+    The driver's connection puts every reply on one queue and each waiter
+    drops ids it does not expect, so two threads issuing commands on the same
+    tab lose each other's replies. Everything that drives the tab (searching,
+    scrolling, fetching bodies) holds this lock while it does.
+    """
+    with _tab_lock_guard:
+        lock = getattr(driver, _TAB_LOCK_ATTR, None)
+        if lock is None:
+            lock = threading.RLock()
+            setattr(driver, _TAB_LOCK_ATTR, lock)
+        return lock
+
 
 def _is_target_response(url: str) -> bool:
     """Return True when the response looks like a Maps business page (ech=1/2/3)."""
@@ -16,15 +60,42 @@ def _is_target_response(url: str) -> bool:
     return any(val in {"1", "2", "3"} for val in ech_vals)
 
 
+def _matches_query(url: str, query: str | None) -> bool:
+    if not query:
+        return True
+    q_vals = parse_qs(urlsplit(url).query).get("q", [])
+    return not q_vals or q_vals[0].strip().lower() == query.strip().lower()
+
+
+def reset_capture_tracker(captured: Dict[str, Any], query: str | None = None) -> None:
+    """Clear a tracker in place so its registered handler can serve a new search."""
+    captured["urls"].clear()
+    captured["request_ids"].clear()
+    captured["ech_map"].clear()
+    captured["last_seen"] = None
+    captured["query"] = query
+
+
 def build_capture_tracker() -> Tuple[Dict[str, Any], Callable]:
     """
     Provide a captured state dict and a response handler for driver.after_response_received.
     """
-    captured: Dict[str, Any] = {"urls": [], "request_ids": [], "last_seen": None, "ech_map": {}}
+    captured: Dict[str, Any] = {
+        "urls": [],
+        "request_ids": [],
+        "last_seen": None,
+        "ech_map": {},
+        "query": None,
+    }
 
     def handler(request_id, response: cdp.network.Response, event: cdp.network.ResponseReceived):
         url = response.url or ""
         if _is_target_response(url):
+            if not _matches_query(url, captured["query"]):
+                # Late response for the previous query of a reused tab
+                return
+            # Let the shared limiter back off when the browser gets throttled too
+            rate_limit.report(url, response.status)
             captured["urls"].append(url)
             captured["request_ids"].append(request_id)
             captured["last_seen"] = time.time()
@@ -33,3 +104,97 @@ def build_capture_tracker() -> Tuple[Dict[str, Any], Callable]:
             print(f"[network] saw business page endpoint (ech): {url}")
 
     return captured, handler
+
+
+def _decode_body(body: str | None, is_base64: bool) -> bytes | None:
+    if body is None:
+        return None
+    return base64.b64decode(body) if is_base64 else body.encode("utf-8")
+
+
+def _fetch_bodies_serial(driver, request_ids: List[str]) -> Dict[str, bytes | None]:
+    bodies: Dict[str, bytes | None] = {}
+    for req_id in request_ids:
+        response = driver.collect_response(req_id)
+        bodies[req_id] = _decode_body(response.content, response.is_base_64)
+    return bodies
+
+
+def _can_pipeline(conn) -> bool:
+    """True when conn is a driver connection the raw batch knows how to drive."""
+    if make_request_body is None or not DRIVER_VERSION:
+        return False
+    if not DRIVER_VERSION.startswith(PIPELINED_DRIVER_VERSIONS):
+        return False
+    listener = getattr(conn, "listener", None)
+    return bool(
+        listener
+        and listener.running
+        and hasattr(conn, "__count__")
+        and hasattr(conn, "queue")
+        and hasattr(conn, "websocket")
+    )
+
+
+def fetch_response_bodies(
+    driver, request_ids: List[str], timeout: float = BODY_FETCH_TIMEOUT
+) -> Dict[str, bytes | None]:
+    """
+    Fetch the bodies of request_ids from the browser as raw bytes.
+
+    On a known driver release every Network.getResponseBody command is written
+    to the DevTools socket before any reply is awaited, so the whole batch costs
+    about one round trip instead of one per response. This reads the driver's
+    private reply queue, so it runs under tab_lock: no other command on the tab
+    can consume or drop the replies meanwhile. Other releases, and anything the
+    batch did not return, go through the driver's serial collect_response.
+    """
+    if not request_ids:
+        return {}
+    with tab_lock(driver):
+        conn = getattr(driver, "_tab", None)
+        if not _can_pipeline(conn):
+            return _fetch_bodies_serial(driver, request_ids)
+        return _fetch_bodies_pipelined(driver, conn, request_ids, timeout)
+
+
+def _fetch_bodies_pipelined(
+    driver, conn, request_ids: List[str], timeout: float
+) -> Dict[str, bytes | None]:
+    bodies: Dict[str, bytes | None] = {}
+    pending: Dict[int, Tuple[str, Any]] = {}
+    try:
+        for req_id in request_ids:
+            command = cdp.network.get_response_body(req_id)
+            tx_id = next(conn.__count__)
+            conn.websocket.send(make_request_body(id=tx_id, cdp_obj=command))
+            pending[tx_id] = (req_id, command)
+
+        deadline = time.time() + timeout
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                message = conn.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            entry = pending.pop(message.get("id"), None)
+            if entry is None:
+                continue
+            req_id, command = entry
+            if "error" in message:
+                # e.g. "No data found for resource": evicted or never finished
+                bodies[req_id] = None
+                continue
+            body, is_base64 = parse_response(message, command)
+            bodies[req_id] = _decode_body(body, is_base64)
+    except Exception as e:
+        print(f"[network] batched body fetch failed ({e}); falling back to serial")
+
+    missing = [req_id for req_id in request_ids if req_id not in bodies]
+    metrics.incr("capture.bodies_batched", len(request_ids) - len(missing))
+    if missing:
+        metrics.incr("capture.bodies_serial", len(missing))
+        bodies.update(_fetch_bodies_serial(driver, missing))
+    return bodies
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+from utils import metrics
+from utils.jobs import safe_part
+
+# Emit a change feed against the previous snapshot of the same niche/city ("1").
+CHANGE_FEED = os.getenv("CHANGE_FEED", "0") == "1"
+CHANGE_FEED_DIR = os.getenv("CHANGE_FEED_DIR", os.path.join("output", "changes"))
+# A run with fewer records than this share of the snapshot looks partial
+# (blocked, timed out); its missing businesses are not reported as removed.
+REMOVAL_MIN_COVERAGE = float(os.getenv("REMOVAL_MIN_COVERAGE", "0.5"))
+
+# Fields whose changes downstream consumers care about
+FINGERPRINT_FIELDS = ("Name", "Phone", "Website", "Rating", "Reviews", "Profile")
+
+
+def fingerprint(rec: Dict[str, Any], fields=FINGERPRINT_FIELDS) -> str:
+    values = [str(rec.get(field, "")) for field in fields]
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def snapshot_path(niche: str | None, city: str | None, out_dir: str = CHANGE_FEED_DIR) -> str:
+    return os.path.join(out_dir, "snapshots", f"{safe_part(niche)}__{safe_part(city)}.json")
+
+
+def load_snapshot(path: str) -> tuple[Dict[str, Dict[str, Any]], tuple]:
+    """
+    Previous snapshot as ({key: {"fp": ..., "record": ...}}, fingerprinted
+    fields); empty if none. Snapshots without "fields" used all of them.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot["records"], tuple(snapshot.get("fields") or FINGERPRINT_FIELDS)
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.exists(path):
+            print(f"[changes] ignoring unreadable snapshot {path}: {e}")
+        return {}, FINGERPRINT_FIELDS
+
+
+def carried_fields(extracted: Iterable[str]) -> tuple:
+    """FINGERPRINT_FIELDS a run extracting ``extracted`` actually fills."""
+    return tuple(f for f in FINGERPRINT_FIELDS if f in extracted)
+
+
+def diff_records(
+    previous: Dict[str, Dict[str, Any]],
+    records: List[Dict[str, Any]],
+    key: Callable[[Dict[str, Any]], str | None],
+    *,
+    fields: tuple = FINGERPRINT_FIELDS,
+    previous_fields: tuple = FINGERPRINT_FIELDS,
+    min_coverage: float = REMOVAL_MIN_COVERAGE,
+) -> tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Compare records with the previous snapshot.
+
+    ``fields`` are the fingerprinted fields this run filled and
+    ``previous_fields`` those of the snapshot; only fields both carry are
+    compared, so a narrowed extraction does not report every business as
+    changed. Returns the change events (op new / changed / removed), the
+    snapshot to store next and the fields its fingerprints cover. Businesses
+    missing from a run that looks partial are kept in the snapshot instead of
+    being reported as removed.
+    """
+    shared = tuple(f for f in fields if f in previous_fields)
+    events: List[Dict[str, Any]] = []
+    current: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        rec_key = key(rec)
+        if not rec_key or rec_key in current:
+            continue
+        current[rec_key] = {"fp": fingerprint(rec, fields), "record": rec}
+        old = previous.get(rec_key)
+        if old is None:
+            events.append({"op": "new", "key": rec_key, "record": rec})
+            continue
+        old_fp = old["fp"] if shared == tuple(previous_fields) else fingerprint(old["record"], shared)
+        if old_fp != fingerprint(rec, shared):
+            changed = [
+                field
+                for field in shared
+                if str(old["record"].get(field, "")) != str(rec.get(field, ""))
+            ]
+            events.append({"op": "changed", "key": rec_key, "fields": changed, "record": rec})
+
+    gone = [k for k in previous if k not in current]
+    if gone and len(current) < min_coverage * len(previous):
+        print(
+            f"[changes] only {len(current)} of {len(previous)} known businesses seen; "
+            f"keeping {len(gone)} unseen ones instead of reporting removals"
+        )
+        for rec_key in gone:
+            current[rec_key] = previous[rec_key]
+        if tuple(previous_fields) != tuple(fields):
+            # Kept records only carry the old fields; fingerprint everything on the shared ones
+            for entry in current.values():
+                entry["fp"] = fingerprint(entry["record"], shared)
+            return events, current, shared
+    else:
+        for rec_key in gone:
+            events.append({"op": "removed", "key": rec_key, "record": previous[rec_key]["record"]})
+    return events, current, tuple(fields)
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def emit_changes(
+    records: List[Dict[str, Any]],
+    key: Callable[[Dict[str, Any]], str | None],
+    *,
+    niche: str | None,
+    city: str | None,
+    fields: tuple = FINGERPRINT_FIELDS,
+    out_dir: str = CHANGE_FEED_DIR,
+) -> str | None:
+    """
+    Write the NDJSON change feed of one niche/city run and update its
+    snapshot. ``fields`` are the fingerprinted fields the records carry
+    (see carried_fields). Returns the feed path, or None when nothing changed.
+    """
+    snap_path = snapshot_path(niche, city, out_dir)
+    previous, previous_fields = load_snapshot(snap_path)
+    events, snapshot, snapshot_fields = diff_records(
+        previous, records, key, fields=fields, previous_fields=previous_fields
+    )
+    now = time.time()
+
+    counts: Dict[str, int] = {}
+    for event in events:
+        counts[event["op"]] = counts.get(event["op"], 0) + 1
+        metrics.incr(f"changes.{event['op']}")
+
+    feed_path = None
+    if events:
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        feed_path = os.path.join(out_dir, f"{stamp}_{safe_part(niche)}__{safe_part(city)}.ndjson")
+        os.makedirs(out_dir, exist_ok=True)
+        with open(feed_path, "w", encoding="utf-8") as f:
+            for event in events:
+                event.update(niche=niche, city=city, ts=now)
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    # The snapshot moves only after the feed is on disk
+    _write_json_atomic(
+        snap_path,
+        {"niche": niche, "city": city, "updated_at": now, "fields": list(snapshot_fields), "records": snapshot},
+    )
+
+    summary = ", ".join(f"{count} {op}" for op, count in sorted(counts.items())) or "no changes"
+    print(f"[changes] {summary}" + (f"; feed at {feed_path}" if feed_path else ""))
+    return feed_path
@@ -0,0 +1,71 @@
+import math
+import os
+import time
+from typing import Any, Dict
+
+from utils import metrics
+
+# Wall-clock budget for one niche/city, capture through extraction; 0 = none.
+# A job's "deadline_seconds" overrides it.
+CITY_DEADLINE_SECONDS = float(os.getenv("CITY_DEADLINE_SECONDS", "0"))
+# Shortest timeout handed to a wait once the budget is nearly spent.
+MIN_WAIT = 1.0
+
+
+class Deadline:
+    """
+    Absolute cut-off shared by every stage of one niche/city.
+
+    Stages cap their own timeouts with cap() and call expired() between units
+    of work, returning what they have so far. The first stage to find the
+    budget spent is recorded as the timeout reason.
+    """
+
+    def __init__(self, expires_at: float | None = None, label: str = ""):
+        self.expires_at = expires_at
+        self.label = label
+        self.reason: str | None = None
+
+    @classmethod
+    def after(cls, seconds: float | None, label: str = "") -> "Deadline":
+        if not seconds or seconds <= 0:
+            return cls(None, label)
+        return cls(time.time() + seconds, label)
+
+    @classmethod
+    def for_job(cls, data: Dict[str, Any] | None) -> "Deadline":
+        """
+        Deadline for a search's data dict: an absolute deadline_at handed down
+        by an earlier stage, else deadline_seconds or CITY_DEADLINE_SECONDS.
+        """
+        data = data or {}
+        label = f"{data.get('niche') or ''} in {data.get('city') or ''}".strip()
+        if data.get("deadline_at"):
+            return cls(float(data["deadline_at"]), label)
+        seconds = data.get("deadline_seconds") or CITY_DEADLINE_SECONDS
+        return cls.after(float(seconds), label)
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.time())
+
+    def cap(self, timeout: float, floor: float = MIN_WAIT) -> float:
+        """timeout, shortened to what is left (never below floor)."""
+        return max(floor, min(timeout, self.remaining()))
+
+    def expired(self, stage: str) -> bool:
+        """True once the budget is spent; records stage as the reason the first time."""
+        if self.expires_at is None or time.time() < self.expires_at:
+            return False
+        if self.reason is None:
+            self.reason = stage
+            metrics.incr("deadline.expired")
+            metrics.incr(f"deadline.expired.{stage}")
+            metrics.record_event("deadline", search=self.label, stage=stage)
+            print(f"[deadline] {self.label or 'search'}: budget spent during {stage}; keeping partial results")
+        return True
+
+
+# Default for callers that do not pass one
+NO_DEADLINE = Deadline()
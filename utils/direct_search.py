@@ -0,0 +1,123 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.extractor2 import extract_companies_advanced
+from utils.http import FetchError, fetch_with_retry
+from utils.payloads import (
+    CHROME_HEADERS,
+    EXTRACT_FIELDS,
+    _paginate_requests,
+    finalize_records,
+    parse_payload,
+)
+from utils.pb_url import SearchUrlTemplate
+from utils.token_generator import extract_token
+
+TEMPLATE_PATH = os.path.join("output", "search_template.json")
+
+
+class DirectSearchError(RuntimeError):
+    """Raised when a direct HTTP search cannot stand in for the browser flow."""
+
+
+def build_search_template(
+    captured: Dict[str, Any], cookies: List[Dict[str, Any]]
+) -> Dict[str, Any] | None:
+    """
+    Pick reusable search URLs from a browser capture.
+
+    search_url is the first-page (ech=1) request, page_url the ech=2 request
+    whose pb carries the pagination token slot.
+    """
+    by_ech: Dict[str, str] = {}
+    for req_id, url in zip(captured["request_ids"], captured["urls"]):
+        by_ech.setdefault(captured["ech_map"].get(req_id) or "", url)
+    search_url = by_ech.get("1") or by_ech.get("2")
+    if not search_url:
+        return None
+    return {
+        "search_url": search_url,
+        "page_url": by_ech.get("2"),
+        "cookies": {c.get("name"): c.get("value") for c in cookies},
+        "captured_at": time.time(),
+    }
+
+
+def save_search_template(template: Dict[str, Any], path: str = TEMPLATE_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(template, f, ensure_ascii=False, indent=2)
+    print(f"[direct] saved search template to {path}")
+
+
+def load_search_template(path: str = TEMPLATE_PATH) -> Dict[str, Any] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_search_page(url: str, cookies: Dict[str, str], deadline: Deadline = NO_DEADLINE) -> Any:
+    """GET one search page (with retries) and return the parsed payload."""
+    try:
+        return fetch_with_retry(
+            url,
+            headers=CHROME_HEADERS,
+            cookies=cookies,
+            parse=parse_payload,
+            label="direct",
+            deadline=deadline,
+        )
+    except FetchError as e:
+        raise DirectSearchError(f"search page failed ({e.kind}): {e}") from e
+
+
+def direct_search(
+    template: Dict[str, Any],
+    niche: str,
+    city: str,
+    max_pages: int,
+    *,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    Run one niche/city search over plain HTTP using a captured template.
+    Pagination stops at ``deadline``; the pages fetched by then are saved.
+    """
+    query = f"{niche} in {city}"
+    cookies = template.get("cookies") or {}
+    search = SearchUrlTemplate.from_url(template["search_url"])
+    search.set_query(query)
+    url = search.to_url()
+
+    print(f"[direct] fetching first page for {query!r}")
+    payload = fetch_search_page(url, cookies, deadline)
+
+    seen_entries: Dict[str, Any] = {}
+    first_records = extract_companies_advanced(payload, seen=seen_entries, fields=EXTRACT_FIELDS)
+    if not first_records:
+        # An expired template usually answers with an empty or consent page
+        raise DirectSearchError("first page returned no businesses")
+
+    paged_records: List[Dict[str, Any]] = []
+    next_token = extract_token(payload)
+    if next_token and template.get("page_url"):
+        page = SearchUrlTemplate.from_url(template["page_url"])
+        page.set_query(query)
+        paged_records, _, _ = _paginate_requests(
+            page.to_url(),
+            next_token,
+            max_pages,
+            headers=CHROME_HEADERS,
+            cookies=cookies,
+            seen=seen_entries,
+            deadline=deadline,
+        )
+
+    return finalize_records(
+        first_records, paged_records, meta={"city": city, "niche": niche}
+    )
@@ -2,14 +2,16 @@ import json
 import os
 import tempfile
 
-from .extractor2 import extract_companies_advanced
+from .extractor2 import ALL_FIELDS, extract_companies_advanced
 
 
-def extract(json_data, *, force_extractor2: bool = False) -> list[dict]:
+def extract(json_data, *, force_extractor2: bool = False, fields=None) -> list[dict]:
     """
     Extracts company information from Google Maps JSON data using extractor2.
 
     The force_extractor2 flag is kept for compatibility but no longer changes behavior.
+    ``fields`` (extractor2 names, e.g. ("Name", "Phone")) skips the work for the
+    others; their normalized keys come back as None.
     """
     # Parse JSON if needed
     if isinstance(json_data, str):
@@ -24,7 +26,7 @@ def extract(json_data, *, force_extractor2: bool = False) -> list[dict]:
 
     def run_extractor(func, payload):
         if isinstance(payload, (str, bytes, os.PathLike)):
-            return func(payload)
+            return func(payload, fields=fields)
         # write temp file for extractor API
         with tempfile.NamedTemporaryFile(
             "w", delete=False, suffix=".json", encoding="utf-8"
@@ -32,13 +34,16 @@ def extract(json_data, *, force_extractor2: bool = False) -> list[dict]:
             json.dump(payload, tmp, ensure_ascii=False)
             tmp_path = tmp.name
         try:
-            return func(tmp_path)
+            return func(tmp_path, fields=fields)
         finally:
             try:
                 os.remove(tmp_path)
             except OSError:
                 pass
 
+    # Address is not part of the normalized record
+    if fields is None:
+        fields = tuple(f for f in ALL_FIELDS if f != "Address")
     companies = run_extractor(extract_companies_advanced, data)
 
     normalized = []
@@ -51,6 +56,7 @@ def extract(json_data, *, force_extractor2: bool = False) -> list[dict]:
                 "company_phone": c.get("Phone"),
                 "rating_of_reviews": c.get("Rating"),
                 "number_of_reviews": c.get("Reviews"),
+                "place_id": c.get("PlaceId"),
             }
         )
     return normalized
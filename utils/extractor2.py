@@ -26,14 +26,99 @@ def _load_payload(json_source):
     raise TypeError(f"Unsupported payload type: {type(json_source)}")
 
 
-def extract_companies_advanced(json_source):
+def _find_place_id(obj):
+    """Breadth-first search for the first ``ChI...`` place id in a subtree."""
+    queue = deque([obj])
+    while queue:
+        item = queue.popleft()
+        if isinstance(item, str) and item.startswith("ChI") and len(item) > 10:
+            return item
+        if isinstance(item, list):
+            queue.extend(item)
+        elif isinstance(item, dict):
+            queue.extend(item.values())
+    return None
+
+
+def _cid_from_feature_id(value):
+    """Convert a ``0x...:0x...`` feature id into its decimal CID string."""
+    if not isinstance(value, str) or ":" not in value:
+        return None
+    _, _, cid_hex = value.partition(":")
+    try:
+        return str(int(cid_hex, 16))
+    except ValueError:
+        return None
+
+
+def entry_identity(company_data):
+    """
+    Return a stable identity for a company entry without full field extraction.
+
+    Prefers the place id the extracted record carries: index 78, else the
+    first ``ChI...`` id found by scanning the entry. Only entries without any
+    place id fall back to the feature id at index 10, prefixed with ``cid:``.
+    """
+    if not isinstance(company_data, list):
+        return None
+    if len(company_data) > 78:
+        candidate = company_data[78]
+        if isinstance(candidate, str) and candidate.startswith("ChI"):
+            return candidate
+    place_id = _find_place_id(company_data)
+    if place_id:
+        return place_id
+    cid = _cid_from_feature_id(company_data[10]) if len(company_data) > 10 else None
+    return f"cid:{cid}" if cid else None
+
+
+# Every field extract_companies_advanced can produce. Name and PlaceId are
+# always returned: filtering and the ``seen`` identity need them anyway.
+ALL_FIELDS = ("Name", "Profile", "Website", "Phone", "Rating", "Reviews", "Address", "PlaceId")
+ALWAYS_FIELDS = ("Name", "PlaceId")
+
+
+def _review_count(value):
+    try:
+        if isinstance(value, str):
+            value = value.replace(",", "")
+        return int(float(value))
+    except Exception:
+        return None
+
+
+def _merge_duplicate(existing, company):
+    """
+    Fold a later sighting into the record already returned, the way _dedupe
+    merges: empty fields are filled, and the review count of whichever
+    sighting has more reviews wins.
+    """
+    new_reviews = _review_count(company.get("Reviews"))
+    if new_reviews is not None and new_reviews > (_review_count(existing.get("Reviews")) or 0):
+        existing["Reviews"] = new_reviews
+    for field, value in company.items():
+        if existing.get(field) in (None, "N/A", ""):
+            existing[field] = value
+
+
+def extract_companies_advanced(json_source, *, seen=None, fields=None):
     """
     More advanced extraction that handles various structures in the new format.
 
     Accepts either a path to a JSON file or an already-parsed JSON payload.
+
+    ``seen`` is an optional dict shared across pages of the same run, mapping
+    entry identities to the record already extracted for them (or None when
+    the entry was filtered out). Repeats of a known entry are merged into the
+    earlier record (gaps filled, higher review count kept, as _dedupe does)
+    and never returned again; repeats of filtered entries are skipped.
+
+    ``fields`` limits the record to those keys (plus Name and PlaceId); the
+    phone, rating/review and address scans only run when asked for.
     """
 
     data = _load_payload(json_source)
+    wanted = set(fields or ALL_FIELDS) | set(ALWAYS_FIELDS)
 
     companies = []
 
@@ -42,18 +127,6 @@ def extract_companies_advanced(json_source):
         keywords = ["lgbtq", "lgbt", "lgbtq+", "queer", "transgender", "safe space"]
         return any(k in text for k in keywords)
 
-    def find_place_id(obj):
-        queue = deque([obj])
-        while queue:
-            item = queue.popleft()
-            if isinstance(item, str) and item.startswith("ChI") and len(item) > 10:
-                return item
-            if isinstance(item, list):
-                queue.extend(item)
-            elif isinstance(item, dict):
-                queue.extend(item.values())
-        return None
-
     def find_tel(obj):
         queue = deque([obj])
         while queue:
@@ -135,6 +208,17 @@ def extract_companies_advanced(json_source):
                 if not isinstance(company_data, list):
                     continue
 
+                identity = entry_identity(company_data)
+                existing = None
+                if seen is not None and identity:
+                    if identity in seen:
+                        existing = seen[identity]
+                        if existing is None:
+                            continue
+                    else:
+                        # Mark as filtered until a record is produced below
+                        seen[identity] = None
+
                 if is_notg_company(company_data):
                     continue
 
@@ -157,140 +241,149 @@ def extract_companies_advanced(json_source):
                     continue
 
                 # Extract rating and reviews (tolerant of different layouts)
-                rating_info = safe_get(company_data, [4], [])
-
-                rating = safe_get(rating_info, [7], None)
-                reviews = safe_get(rating_info, [8], None)
-                fallback_rating, fallback_reviews = scan_rating_reviews(rating_info)
-                if isinstance(rating_info, list):
-                    # Explicit indices for ech1/ech2 style: rating at 7 or 8, reviews at 8 or 9
-                    if rating is None and len(rating_info) > 7 and isinstance(
-                        rating_info[7], (int, float)
-                    ):
-                        rating = rating_info[7]
-                    if rating is None and len(rating_info) > 8 and isinstance(
-                        rating_info[8], (int, float)
-                    ):
-                        rating = rating_info[8]
-                    cand8 = (
-                        int(rating_info[8])
-                        if len(rating_info) > 8 and isinstance(rating_info[8], (int, float))
-                        else None
-                    )
-                    cand9 = (
-                        int(rating_info[9])
-                        if len(rating_info) > 9 and isinstance(rating_info[9], (int, float))
-                        else None
-                    )
-                    for cand in (cand8, cand9):
-                        if cand is None:
-                            continue
-                        if reviews is None or (isinstance(reviews, (int, float)) and cand > reviews):
-                            reviews = cand
-                if rating in (None, "N/A") and fallback_rating is not None:
-                    rating = fallback_rating
-                if reviews in (None, "N/A") and fallback_reviews is not None:
-                    reviews = fallback_reviews
-                if rating is None:
-                    rating = "N/A"
-                if reviews is None:
-                    reviews = "N/A"
+                rating = reviews = "N/A"
+                if "Rating" in wanted or "Reviews" in wanted:
+                    rating_info = safe_get(company_data, [4], [])
+
+                    rating = safe_get(rating_info, [7], None)
+                    reviews = safe_get(rating_info, [8], None)
+                    fallback_rating, fallback_reviews = scan_rating_reviews(rating_info)
+                    if isinstance(rating_info, list):
+                        # Explicit indices for ech1/ech2 style: rating at 7 or 8, reviews at 8 or 9
+                        if rating is None and len(rating_info) > 7 and isinstance(
+                            rating_info[7], (int, float)
+                        ):
+                            rating = rating_info[7]
+                        if rating is None and len(rating_info) > 8 and isinstance(
+                            rating_info[8], (int, float)
+                        ):
+                            rating = rating_info[8]
+                        cand8 = (
+                            int(rating_info[8])
+                            if len(rating_info) > 8 and isinstance(rating_info[8], (int, float))
+                            else None
+                        )
+                        cand9 = (
+                            int(rating_info[9])
+                            if len(rating_info) > 9 and isinstance(rating_info[9], (int, float))
+                            else None
+                        )
+                        for cand in (cand8, cand9):
+                            if cand is None:
+                                continue
+                            if reviews is None or (isinstance(reviews, (int, float)) and cand > reviews):
+                                reviews = cand
+                    if rating in (None, "N/A") and fallback_rating is not None:
+                        rating = fallback_rating
+                    if reviews in (None, "N/A") and fallback_reviews is not None:
+                        reviews = fallback_reviews
+                    if rating is None:
+                        rating = "N/A"
+                    if reviews is None:
+                        reviews = "N/A"
 
                 # Extract website - index 8 usually contains website info
-                website_data = safe_get(company_data, [7], [])
                 website = "N/A"
-
-                if isinstance(website_data, str):
-                    website = website_data
-                elif isinstance(website_data, list) and len(website_data) > 0:
-                    # Try to find URL in the list
-                    for item in website_data:
-                        if isinstance(item, str) and (
-                            "http://" in item or "https://" in item or "www." in item
-                        ):
-                            website = item
-                            break
-                        elif (
-                            isinstance(item, list)
-                            and len(item) > 0
-                            and isinstance(item[0], str)
-                        ):
-                            if (
-                                "http://" in item[0]
-                                or "https://" in item[0]
-                                or "www." in item[0]
+                if "Website" in wanted:
+                    website_data = safe_get(company_data, [7], [])
+                    if isinstance(website_data, str):
+                        website = website_data
+                    elif isinstance(website_data, list) and len(website_data) > 0:
+                        # Try to find URL in the list
+                        for item in website_data:
+                            if isinstance(item, str) and (
+                                "http://" in item or "https://" in item or "www." in item
                             ):
-                                website = item[0]
+                                website = item
                                 break
+                            elif (
+                                isinstance(item, list)
+                                and len(item) > 0
+                                and isinstance(item[0], str)
+                            ):
+                                if (
+                                    "http://" in item[0]
+                                    or "https://" in item[0]
+                                    or "www." in item[0]
+                                ):
+                                    website = item[0]
+                                    break
 
-                def clean_url(url: str) -> str:
-                    if not url:
-                        return "N/A"
-                    if url.startswith("/url?q="):
-                        url = url[len("/url?q=") :]
-                    if "&" in url:
-                        url = url.split("&", 1)[0]
-                    url = re.sub(r"^https?://", "", url)
-                    url = re.sub(r"^www\.", "", url)
-                    return url.rstrip("/")
+                    def clean_url(url: str) -> str:
+                        if not url:
+                            return "N/A"
+                        if url.startswith("/url?q="):
+                            url = url[len("/url?q=") :]
+                        if "&" in url:
+                            url = url.split("&", 1)[0]
+                        url = re.sub(r"^https?://", "", url)
+                        url = re.sub(r"^www\.", "", url)
+                        return url.rstrip("/")
 
-                if website != "N/A":
-                    website = clean_url(website)
+                    if website != "N/A":
+                        website = clean_url(website)
 
                 # Extract phone - prefer tel:
-                phone = find_tel(company_data) or "N/A"
-                if phone == "N/A":
-                    for phone_idx in [186, 187, 188, 189, 185]:
-                        if len(company_data) > phone_idx:
-                            phone_candidate = company_data[phone_idx]
-                            if isinstance(phone_candidate, str) and "tel:" in phone_candidate:
-                                digits = "".join(ch for ch in phone_candidate if ch.isdigit())
-                                if len(digits) >= 6:
-                                    phone = digits
+                phone = "N/A"
+                if "Phone" in wanted:
+                    phone = find_tel(company_data) or "N/A"
+                    if phone == "N/A":
+                        for phone_idx in [186, 187, 188, 189, 185]:
+                            if len(company_data) > phone_idx:
+                                phone_candidate = company_data[phone_idx]
+                                if isinstance(phone_candidate, str) and "tel:" in phone_candidate:
+                                    digits = "".join(ch for ch in phone_candidate if ch.isdigit())
+                                    if len(digits) >= 6:
+                                        phone = digits
+                                        break
+                                elif (
+                                    isinstance(phone_candidate, list)
+                                    and len(phone_candidate) > 0
+                                ):
+                                    for sub_item in phone_candidate:
+                                        if isinstance(sub_item, str) and "tel:" in sub_item:
+                                            digits = "".join(ch for ch in sub_item if ch.isdigit())
+                                            if len(digits) >= 6:
+                                                phone = digits
+                                                break
+                                        elif (
+                                            isinstance(sub_item, list)
+                                            and len(sub_item) > 0
+                                            and isinstance(sub_item[0], str)
+                                            and "tel:" in sub_item[0]
+                                        ):
+                                            digits = "".join(ch for ch in sub_item[0] if ch.isdigit())
+                                            if len(digits) >= 6:
+                                                phone = digits
+                                                break
+                                if phone != "N/A":
                                     break
-                            elif (
-                                isinstance(phone_candidate, list)
-                                and len(phone_candidate) > 0
-                            ):
-                                for sub_item in phone_candidate:
-                                    if isinstance(sub_item, str) and "tel:" in sub_item:
-                                        digits = "".join(ch for ch in sub_item if ch.isdigit())
-                                        if len(digits) >= 6:
-                                            phone = digits
-                                            break
-                                    elif (
-                                        isinstance(sub_item, list)
-                                        and len(sub_item) > 0
-                                        and isinstance(sub_item[0], str)
-                                        and "tel:" in sub_item[0]
-                                    ):
-                                        digits = "".join(ch for ch in sub_item[0] if ch.isdigit())
-                                        if len(digits) >= 6:
-                                            phone = digits
-                                            break
-                            if phone != "N/A":
-                                break
 
                 # Extract address
-                address_parts = safe_get(company_data, [2], [])
-                full_address = safe_get(company_data, [18], "N/A")
-
-                # If we have address parts but no full address, construct it
-                if (
-                    full_address == "N/A"
-                    and isinstance(address_parts, list)
-                    and len(address_parts) > 0
-                ):
-                    full_address = ", ".join(
-                        [str(part) for part in address_parts if part]
-                    )
+                full_address = "N/A"
+                if "Address" in wanted:
+                    address_parts = safe_get(company_data, [2], [])
+                    full_address = safe_get(company_data, [18], "N/A")
 
-                place_id = find_place_id(company_data)
-                profile_url = (
-                    f"https://www.google.com/maps/place/?q=place_id:{place_id}"
-                    if place_id
-                    else f"https://www.google.com/maps/search/?api=1&query={name.replace(' ', '+')}"
-                )
+                    # If we have address parts but no full address, construct it
+                    if (
+                        full_address == "N/A"
+                        and isinstance(address_parts, list)
+                        and len(address_parts) > 0
+                    ):
+                        full_address = ", ".join(
+                            [str(part) for part in address_parts if part]
+                        )
+
+                place_id = identity or _find_place_id(company_data)
+                if place_id and place_id.startswith("cid:"):
+                    profile_url = f"https://maps.google.com/?cid={place_id[4:]}"
+                elif place_id:
+                    profile_url = (
+                        f"https://www.google.com/maps/place/?q=place_id:{place_id}"
+                    )
+                else:
+                    profile_url = f"https://www.google.com/maps/search/?api=1&query={name.replace(' ', '+')}"
 
                 company = {
                     "Name": name,
@@ -300,7 +393,16 @@ def extract_companies_advanced(json_source):
                     "Rating": rating,
                     "Reviews": reviews,
                     "Address": full_address,
+                    "PlaceId": place_id or "N/A",
                 }
+                if len(wanted) < len(ALL_FIELDS):
+                    company = {k: v for k, v in company.items() if k in wanted}
+                if existing is not None:
+                    # Duplicate of an earlier page: merge into it, never return it twice
+                    _merge_duplicate(existing, company)
+                    continue
+                if seen is not None and identity:
+                    seen[identity] = company
                 companies.append(company)
 
     return companies
@@ -0,0 +1,194 @@
+import contextvars
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.direct_search import DirectSearchError, fetch_search_page
+from utils.extractor2 import extract_companies_advanced
+from utils.payloads import CHROME_HEADERS, EXTRACT_FIELDS, _paginate_requests, finalize_records
+from utils.pb_url import PAGE_SIZE_PATH, SearchUrlTemplate
+from utils.token_generator import extract_token
+
+# (south, west, north, east) in degrees
+BBox = Tuple[float, float, float, float]
+
+METERS_PER_DEG_LAT = 111_320.0
+TILE_GRID = int(os.getenv("TILE_GRID", "2"))
+TILE_MAX_DEPTH = int(os.getenv("TILE_MAX_DEPTH", "3"))
+TILE_CONCURRENCY = int(os.getenv("TILE_CONCURRENCY", "4"))
+# Fraction added around the bbox of first-page results when no bbox is given.
+TILE_BBOX_MARGIN = float(os.getenv("TILE_BBOX_MARGIN", "0.25"))
+
+
+def parse_bbox(value: Any) -> BBox | None:
+    """Accept "south,west,north,east" strings or 4-item sequences."""
+    if not value:
+        return None
+    parts = value.split(",") if isinstance(value, str) else list(value)
+    if len(parts) != 4:
+        raise ValueError(f"bbox needs 4 values (south,west,north,east), got {value!r}")
+    south, west, north, east = (float(p) for p in parts)
+    return south, west, north, east
+
+
+def split_bbox(bbox: BBox, grid: int) -> List[BBox]:
+    """Split a bbox into grid x grid equal tiles."""
+    south, west, north, east = bbox
+    dlat = (north - south) / grid
+    dlng = (east - west) / grid
+    return [
+        (south + r * dlat, west + c * dlng, south + (r + 1) * dlat, west + (c + 1) * dlng)
+        for r in range(grid)
+        for c in range(grid)
+    ]
+
+
+def tile_viewport(bbox: BBox) -> Tuple[float, float, float]:
+    """Return (lat, lng, distance_m) for a pb viewport covering the bbox."""
+    south, west, north, east = bbox
+    lat = (south + north) / 2
+    lng = (west + east) / 2
+    height_m = (north - south) * METERS_PER_DEG_LAT
+    width_m = (east - west) * METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+    return lat, lng, max(height_m, width_m)
+
+
+def entry_coordinates(payload: Any) -> List[Tuple[float, float]]:
+    """Collect (lat, lng) of company entries; Maps keeps them at entry[1][9][2:4]."""
+    coords = []
+    entries = payload[64] if isinstance(payload, list) and len(payload) > 64 else None
+    for entry in entries or []:
+        try:
+            loc = entry[1][9]
+            lat, lng = float(loc[2]), float(loc[3])
+        except (IndexError, TypeError, ValueError):
+            continue
+        coords.append((lat, lng))
+    return coords
+
+
+def bbox_from_payload(payload: Any, margin: float = TILE_BBOX_MARGIN) -> BBox | None:
+    """Estimate a city bbox from the spread of first-page results."""
+    coords = entry_coordinates(payload)
+    if len(coords) < 2:
+        return None
+    lats = [c[0] for c in coords]
+    lngs = [c[1] for c in coords]
+    pad_lat = (max(lats) - min(lats)) * margin
+    pad_lng = (max(lngs) - min(lngs)) * margin
+    return min(lats) - pad_lat, min(lngs) - pad_lng, max(lats) + pad_lat, max(lngs) + pad_lng
+
+
+def _search_tile(
+    template: Dict[str, Any],
+    niche: str,
+    bbox: BBox,
+    *,
+    paginate: bool,
+    max_pages: int,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Search one tile; return its records and whether the first page was full."""
+    lat, lng, distance = tile_viewport(bbox)
+    cookies = template.get("cookies") or {}
+    search = SearchUrlTemplate.from_url(template["search_url"])
+    search.set_query(niche)
+    search.set_viewport(lat, lng, distance)
+    payload = fetch_search_page(search.to_url(), cookies, deadline)
+
+    page_size = int(search.get(PAGE_SIZE_PATH) or 20)
+    entries = payload[64] if isinstance(payload, list) and len(payload) > 64 else None
+    full = isinstance(entries, list) and len(entries) >= page_size
+
+    seen_entries: Dict[str, Any] = {}
+    records = extract_companies_advanced(payload, seen=seen_entries, fields=EXTRACT_FIELDS)
+    next_token = extract_token(payload)
+    if paginate and full and next_token and template.get("page_url"):
+        page = SearchUrlTemplate.from_url(template["page_url"])
+        page.set_query(niche)
+        page.set_viewport(lat, lng, distance)
+        paged, _, _ = _paginate_requests(
+            page.to_url(),
+            next_token,
+            max_pages,
+            headers=CHROME_HEADERS,
+            cookies=cookies,
+            seen=seen_entries,
+            deadline=deadline,
+        )
+        records.extend(paged)
+    return records, full
+
+
+def tiled_search(
+    template: Dict[str, Any],
+    niche: str,
+    city: str,
+    max_pages: int,
+    *,
+    bbox: BBox | None = None,
+    grid: int = TILE_GRID,
+    max_depth: int = TILE_MAX_DEPTH,
+    concurrency: int = TILE_CONCURRENCY,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    Cover a city with viewport tiles instead of one deep query.
+
+    Tiles are searched concurrently for the bare niche. A tile whose first page
+    comes back full is split into grid x grid children until max_depth. Tiles
+    at max_depth paginate instead. All records are merged through
+    finalize_records, which dedupes on place id. No new tile level starts
+    once ``deadline`` passes.
+    """
+    records: List[Dict[str, Any]] = []
+    if bbox is None:
+        search = SearchUrlTemplate.from_url(template["search_url"])
+        search.set_query(f"{niche} in {city}")
+        first_payload = fetch_search_page(search.to_url(), template.get("cookies") or {}, deadline)
+        bbox = bbox_from_payload(first_payload)
+        records.extend(extract_companies_advanced(first_payload, fields=EXTRACT_FIELDS))
+        if bbox is None:
+            raise DirectSearchError(f"could not estimate a bbox for {city!r}")
+    print(f"[tiles] {city}: bbox {bbox}")
+
+    frontier = [(tile, 1) for tile in split_bbox(bbox, grid)]
+    searched = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while frontier:
+            futures = [
+                (
+                    tile,
+                    depth,
+                    # Pool threads save pages to the caller's output_dir()
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        _search_tile,
+                        template,
+                        niche,
+                        tile,
+                        paginate=depth >= max_depth,
+                        max_pages=max_pages,
+                        deadline=deadline,
+                    ),
+                )
+                for tile, depth in frontier
+            ]
+            frontier = []
+            for tile, depth, future in futures:
+                searched += 1
+                try:
+                    tile_records, full = future.result()
+                except DirectSearchError as e:
+                    print(f"[tiles] tile {tile} failed: {e}")
+                    continue
+                records.extend(tile_records)
+                if full and depth < max_depth:
+                    frontier.extend((child, depth + 1) for child in split_bbox(tile, grid))
+            print(f"[tiles] {searched} tiles searched, {len(records)} raw records")
+            if frontier and deadline.expired("tiles"):
+                break
+
+    return finalize_records(records, [], meta={"city": city, "niche": niche})
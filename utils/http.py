@@ -0,0 +1,213 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict
+
+import requests
+
+from utils import http_cache, metrics, rate_limit
+from utils.deadline import NO_DEADLINE, Deadline
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+RETRY_ATTEMPTS = int(os.getenv("HTTP_RETRY_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", "30"))
+# Retries plus failed pages one run (one city) may spend before giving up.
+PAGE_ERROR_BUDGET = int(os.getenv("PAGE_ERROR_BUDGET", "10"))
+
+# Error kinds worth another attempt; anything else fails the page at once.
+RETRYABLE = {"timeout", "connection", "throttled", "server_error", "truncated"}
+
+
+class FetchError(RuntimeError):
+    """A page could not be fetched or parsed; ``kind`` says why."""
+
+    def __init__(
+        self,
+        message: str,
+        kind: str,
+        status: int | None = None,
+        retry_after: float | None = None,
+    ):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ErrorBudget:
+    """Counts retries and failures for one run and says when to stop trying."""
+
+    def __init__(self, limit: int = PAGE_ERROR_BUDGET):
+        self.limit = limit
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def spend(self) -> bool:
+        """Consume one unit; return False once the budget is exhausted."""
+        with self._lock:
+            self.spent += 1
+            return self.spent <= self.limit
+
+    @property
+    def exhausted(self) -> bool:
+        return self.spent >= self.limit
+
+
+def classify_status(status: int) -> str | None:
+    if status == 429:
+        return "throttled"
+    if status >= 500:
+        return "server_error"
+    if status >= 400:
+        return "client_error"
+    return None
+
+
+def classify_exception(exc: Exception) -> str:
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return "connection"
+    return "client_error"
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Return the Retry-After delay in seconds (delta or HTTP date form)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2**attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+def _looks_truncated(text: str) -> bool:
+    tail = text.rstrip()
+    return not (tail.endswith("]") or tail.endswith("}") or tail.endswith("*/"))
+
+
+def check_response(status: int, text: str, parse: Callable[[str], Any], retry_after: str | None) -> Any:
+    """Return parse(text) for a good response, else raise the matching FetchError."""
+    kind = classify_status(status)
+    if kind:
+        raise FetchError(f"HTTP {status}", kind, status, parse_retry_after(retry_after))
+    try:
+        payload = parse(text)
+    except Exception as e:
+        kind = "truncated" if _looks_truncated(text) else "parse"
+        raise FetchError(f"unparsable body: {e}", kind, status) from e
+    metrics.incr("http.pages_ok")
+    return payload
+
+
+def cached_payload(url: str, parse: Callable[[str], Any]) -> Any:
+    """
+    parse() of the cached body for url, or None on a miss. Misses raise
+    FetchError("cache_miss") in HTTP_CACHE_OFFLINE mode.
+    """
+    text = http_cache.get(url) if http_cache.enabled() else None
+    if text is not None:
+        try:
+            return parse(text)
+        except Exception:
+            http_cache.discard(url)
+    if http_cache.HTTP_CACHE_OFFLINE:
+        metrics.incr("http.errors.cache_miss")
+        raise FetchError(f"not cached (offline mode): {url[:120]}", "cache_miss")
+    return None
+
+
+def store_body(url: str, text: str) -> None:
+    """Cache a body that check_response accepted."""
+    if http_cache.enabled():
+        http_cache.put(url, text)
+
+
+def retry_delay(
+    error: FetchError, attempt: int, attempts: int, budget: ErrorBudget, label: str
+) -> float:
+    """
+    Charge a failed attempt to budget and return the backoff before the next
+    one; re-raise error when it is not retryable or nothing is left.
+    """
+    metrics.incr(f"http.errors.{error.kind}")
+    last_attempt = attempt + 1 >= attempts
+    within_budget = budget.spend()
+    if error.kind not in RETRYABLE or last_attempt or not within_budget:
+        metrics.incr("http.pages_failed")
+        if budget.exhausted:
+            metrics.incr("http.budget_exhausted")
+        raise error
+    delay = backoff_delay(attempt, error.retry_after)
+    metrics.incr("http.retries")
+    print(
+        f"[{label}] {error.kind} ({error}); retry {attempt + 1}/{attempts - 1} "
+        f"in {delay:.1f}s"
+    )
+    return delay
+
+
+def fetch_with_retry(
+    url: str,
+    *,
+    headers: Dict[str, str],
+    cookies: Dict[str, str],
+    parse: Callable[[str], Any],
+    budget: ErrorBudget | None = None,
+    attempts: int = RETRY_ATTEMPTS,
+    timeout: float = HTTP_TIMEOUT,
+    label: str = "requests",
+    deadline: Deadline = NO_DEADLINE,
+) -> Any:
+    """
+    GET url and return ``parse(body)``, retrying transient failures.
+
+    Timeouts, connection errors, 429/5xx and truncated bodies are retried with
+    jittered exponential backoff (honouring Retry-After). 4xx responses and
+    bodies that are complete but unparsable fail immediately. Every retry and
+    failure is charged to ``budget``. Bodies are served from and stored in
+    the HTTP cache when HTTP_CACHE_DIR is set. Request timeouts and backoff
+    are capped by ``deadline``; once it passes, FetchError("deadline") is
+    raised instead of another attempt.
+    """
+    cached = cached_payload(url, parse)
+    if cached is not None:
+        return cached
+    budget = budget or ErrorBudget()
+    for attempt in range(max(1, attempts)):
+        if deadline.expired("http"):
+            raise FetchError("search deadline exceeded", "deadline")
+        waited = rate_limit.acquire(url)
+        if waited:
+            metrics.incr("rate_limit.wait_seconds", waited)
+        try:
+            resp = requests.get(
+                url, headers=headers, cookies=cookies, timeout=deadline.cap(timeout)
+            )
+            rate_limit.report(url, resp.status_code)
+            payload = check_response(
+                resp.status_code, resp.text, parse, resp.headers.get("Retry-After")
+            )
+            store_body(url, resp.text)
+            return payload
+        except FetchError as e:
+            error = e
+        except requests.RequestException as e:
+            error = FetchError(str(e), classify_exception(e))
+        time.sleep(min(retry_delay(error, attempt, attempts, budget, label), deadline.remaining()))
+    raise FetchError("no attempts made", "client_error")
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from utils import metrics
+from utils.pb_url import SearchUrlTemplate
+
+# Directory for cached response bodies; empty disables the cache.
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "")
+# Entries older than this many seconds are refetched.
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", str(7 * 24 * 3600)))
+# Least recently used entries are evicted above this size.
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "500"))
+# Serve only from the cache and fail on misses ("1").
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "0") == "1"
+
+# Query parameters and pb messages that change per session, not per page.
+# The pagination token (!9s after !5e1) is session-bound too; a page is
+# identified by q, viewport, page size (!7i) and offset (!8i) instead.
+VOLATILE_PARAMS = {"psi"}
+VOLATILE_PB_PATHS = {(22,)}
+
+_lock = threading.Lock()
+# Bytes on disk, counted once per process and then kept up to date
+_size: Dict[str, int] = {}
+
+
+def enabled() -> bool:
+    return bool(HTTP_CACHE_DIR)
+
+
+def normalize_url(url: str) -> str:
+    """
+    url with volatile parts removed and the query sorted, so reruns of the
+    same page share a cache entry.
+    """
+    try:
+        template = SearchUrlTemplate.from_url(url)
+    except ValueError:
+        return url
+    params = []
+    for key, value in template.params:
+        if key in VOLATILE_PARAMS:
+            continue
+        if key == "pb":
+            # Blank rather than drop tokens so message lengths stay valid
+            value = "".join(
+                f"!{f}{k}{'' if path[:1] in VOLATILE_PB_PATHS or idx == template.token_index else v}"
+                for idx, ((f, k, v), path) in enumerate(zip(template.tokens, template.paths))
+            )
+        params.append(key if value is None else f"{key}={value}")
+    return f"{template.base}?{'&'.join(sorted(params))}"
+
+
+def _path(url: str, cache_dir: str) -> str:
+    digest = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, digest[:2], f"{digest}.gz")
+
+
+def get(url: str, cache_dir: str | None = None, ttl: float = HTTP_CACHE_TTL) -> str | None:
+    """Cached body for url, or None when missing or expired."""
+    path = _path(url, cache_dir or HTTP_CACHE_DIR)
+    try:
+        stat = os.stat(path)
+        now = time.time()
+        if now - stat.st_mtime > ttl:
+            discard(url, cache_dir)
+            metrics.incr("http_cache.expired")
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            text = f.read()
+        # atime drives LRU eviction; mtime stays the write time for the TTL
+        os.utime(path, (now, stat.st_mtime))
+    except (OSError, EOFError):
+        metrics.incr("http_cache.misses")
+        return None
+    metrics.incr("http_cache.hits")
+    return text
+
+
+def put(url: str, text: str, cache_dir: str | None = None) -> None:
+    """Store text for url (gzip, atomic replace) and evict if over the size cap."""
+    cache_dir = cache_dir or HTTP_CACHE_DIR
+    path = _path(url, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        old = os.path.getsize(path) if os.path.exists(path) else 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            f.write(text.encode("utf-8"))
+        os.replace(tmp, path)
+        written = os.path.getsize(path)
+    except OSError as e:
+        print(f"[cache] could not store {url[:80]}: {e}")
+        return
+    metrics.incr("http_cache.stores")
+    with _lock:
+        if cache_dir not in _size:
+            _size[cache_dir] = sum(size for _, size, _ in _entries(cache_dir))
+        else:
+            _size[cache_dir] += written - old
+        if _size[cache_dir] > HTTP_CACHE_MAX_MB * 1024 * 1024:
+            _evict(cache_dir)
+
+
+def discard(url: str, cache_dir: str | None = None) -> None:
+    try:
+        os.remove(_path(url, cache_dir or HTTP_CACHE_DIR))
+    except OSError:
+        pass
+
+
+def _entries(cache_dir: str) -> List[Tuple[float, int, str]]:
+    """(atime, size, path) of every cached body."""
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if not name.endswith(".gz"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+    return entries
+
+
+def _evict(cache_dir: str) -> None:
+    """Drop least recently used entries until the cache is at 90% of its cap."""
+    entries = sorted(_entries(cache_dir))
+    total = sum(size for _, size, _ in entries)
+    target = HTTP_CACHE_MAX_MB * 1024 * 1024 * 0.9
+    evicted = 0
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    _size[cache_dir] = total
+    metrics.incr("http_cache.evictions", evicted)
+    print(f"[cache] evicted {evicted} entries; {total / 1024 / 1024:.1f} MB left")
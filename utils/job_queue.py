@@ -0,0 +1,386 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import requests
+
+from utils import metrics
+from utils.jobs import DONE, FAILED, PENDING, RUNNING
+
+# Seconds a claim stays valid without a heartbeat; workers beat every third.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Claims (including expired leases) an item gets before it is marked failed.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    niche TEXT NOT NULL,
+    city TEXT NOT NULL,
+    depth INTEGER,
+    spec TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER DEFAULT 0,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    records INTEGER DEFAULT 0,
+    output TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, attempts);
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    records TEXT NOT NULL
+);
+"""
+
+# Item keys kept in the spec column rather than their own columns
+_SPEC_KEYS = ("bbox", "tiled", "deadline_seconds")
+
+
+def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+    item = dict(row)
+    item.update(json.loads(item.pop("spec") or "{}"))
+    return item
+
+
+class SQLiteLeaseQueue:
+    """
+    Job queue in one SQLite file that workers on several hosts can share.
+
+    A claim hands out a lease token; the holder heartbeats to keep it and
+    completes with it, so a result is only committed by the current holder
+    and only once. Leases that run out are put back for another worker.
+    Committed records are kept in the queue, so any host can combine them.
+    """
+
+    def __init__(self, path: str, *, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL needs shared memory, which network filesystems do not provide
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE takes the write lock up front, so two hosts can
+        # never claim the same row
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, items: List[Dict[str, Any]]) -> int:
+        """Add items that are not queued yet; returns how many were new."""
+        rows = [
+            (
+                item["id"],
+                item["niche"],
+                item["city"],
+                item.get("depth"),
+                json.dumps({k: item.get(k) for k in _SPEC_KEYS}),
+                PENDING,
+                time.time(),
+            )
+            for item in items
+        ]
+
+        def run(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (id, niche, city, depth, spec, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+        return self._transaction(run)
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float, max_attempts: int) -> None:
+        expired = conn.execute(
+            "SELECT id, attempts, lease_owner FROM jobs WHERE status = ? AND lease_expires < ?",
+            (RUNNING, now),
+        ).fetchall()
+        for row in expired:
+            status = PENDING if row["attempts"] < max_attempts else FAILED
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_token = NULL, "
+                "lease_expires = NULL, error = ?, updated_at = ? WHERE id = ?",
+                (status, f"lease expired (held by {row['lease_owner']})", now, row["id"]),
+            )
+            metrics.incr("jobs.leases_expired")
+
+    def claim(self, worker: str, *, max_attempts: int = JOB_MAX_ATTEMPTS) -> Dict[str, Any] | None:
+        """Lease the next pending item to worker, or return None when there is none."""
+
+        def run(conn):
+            now = time.time()
+            self._requeue_expired(conn, now, max_attempts)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY attempts, rowid LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                "lease_token = ?, lease_expires = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (RUNNING, worker, token, now + self.lease_seconds, now, row["id"]),
+            )
+            item = _row_to_item(row)
+            item.update(status=RUNNING, attempts=row["attempts"] + 1, lease_owner=worker, lease_token=token)
+            return item
+
+        return self._transaction(run)
+
+    def heartbeat(self, item_id: str, token: str) -> bool:
+        """Extend a lease; False means it was lost and the result will be refused."""
+
+        def run(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_token = ? AND status = ?",
+                (now + self.lease_seconds, now, item_id, token, RUNNING),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(run)
+
+    def complete(
+        self,
+        item_id: str,
+        token: str,
+        *,
+        records: int,
+        output: str | None,
+        result: List[Dict[str, Any]] | None = None,
+    ) -> bool:
+        """
+        Commit a result; only the current lease holder succeeds, and only once.
+        ``result`` (the item's records) is stored alongside for results().
+        """
+
+        def run(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, records = ?, output = ?, lease_token = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_token = ? AND status = ?",
+                (DONE, records, output, time.time(), item_id, token, RUNNING),
+            )
+            if cursor.rowcount != 1:
+                return False
+            if result is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (id, records) VALUES (?, ?)",
+                    (item_id, json.dumps(result, ensure_ascii=False)),
+                )
+            return True
+
+        return self._transaction(run)
+
+    def fail(
+        self, item_id: str, token: str, error: str, *, max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> bool:
+        """Give a lease back after an error: requeue, or fail once attempts run out."""
+
+        def run(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+                "error = ?, lease_owner = NULL, lease_token = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ? AND lease_token = ? AND status = ?",
+                (max_attempts, PENDING, FAILED, error, time.time(), item_id, token, RUNNING),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(run)
+
+    def retry_failed(self) -> int:
+        """Put failed items back in the queue with a fresh attempt count."""
+        return self._transaction(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, updated_at = ? WHERE status = ?",
+                (PENDING, time.time(), FAILED),
+            ).rowcount
+        )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def items(self, status: str | None = None) -> List[Dict[str, Any]]:
+        sql, params = "SELECT * FROM jobs", ()
+        if status:
+            sql, params = sql + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY rowid", params).fetchall()
+        return [_row_to_item(row) for row in rows]
+
+    def results(self, item_id: str) -> List[Dict[str, Any]] | None:
+        """Records committed with an item, or None if none were stored."""
+        with self._lock:
+            row = self._conn.execute("SELECT records FROM results WHERE id = ?", (item_id,)).fetchone()
+        return json.loads(row["records"]) if row else None
+
+
+class HTTPLeaseQueue:
+    """Client for a queue served by serve_queue; same methods as SQLiteLeaseQueue."""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        resp = requests.post(f"{self.base_url}/{method}", json=kwargs, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()["result"]
+
+    def enqueue(self, items: List[Dict[str, Any]]) -> int:
+        return self._call("enqueue", items=items)
+
+    def claim(self, worker: str, *, max_attempts: int = JOB_MAX_ATTEMPTS) -> Dict[str, Any] | None:
+        return self._call("claim", worker=worker, max_attempts=max_attempts)
+
+    def heartbeat(self, item_id: str, token: str) -> bool:
+        return self._call("heartbeat", item_id=item_id, token=token)
+
+    def complete(
+        self,
+        item_id: str,
+        token: str,
+        *,
+        records: int,
+        output: str | None,
+        result: List[Dict[str, Any]] | None = None,
+    ) -> bool:
+        return self._call(
+            "complete", item_id=item_id, token=token, records=records, output=output, result=result
+        )
+
+    def fail(
+        self, item_id: str, token: str, error: str, *, max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> bool:
+        return self._call("fail", item_id=item_id, token=token, error=error, max_attempts=max_attempts)
+
+    def retry_failed(self) -> int:
+        return self._call("retry_failed")
+
+    def counts(self) -> Dict[str, int]:
+        return self._call("counts")
+
+    def items(self, status: str | None = None) -> List[Dict[str, Any]]:
+        return self._call("items", status=status)
+
+    def results(self, item_id: str) -> List[Dict[str, Any]] | None:
+        return self._call("results", item_id=item_id)
+
+
+_SERVED_METHODS = {
+    "enqueue", "claim", "heartbeat", "complete", "fail", "retry_failed", "counts", "items", "results",
+}
+
+
+def serve_queue(queue: SQLiteLeaseQueue, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """HTTP front for a SQLite queue: POST /<method> with the arguments as JSON."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            method = self.path.strip("/")
+            if method not in _SERVED_METHODS:
+                self.send_error(404, f"unknown method {method}")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            kwargs = json.loads(self.rfile.read(length) or b"{}")
+            try:
+                body = json.dumps({"result": getattr(queue, method)(**kwargs)}).encode("utf-8")
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                self.send_error(400, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def open_queue(target: str):
+    """Queue for a path / sqlite:///path (shared file) or http://host:port (served)."""
+    if target.startswith(("http://", "https://")):
+        return HTTPLeaseQueue(target)
+    if target.startswith("sqlite:///"):
+        target = target[len("sqlite:///"):]
+    return SQLiteLeaseQueue(target)
+
+
+class Heartbeat:
+    """Keeps a claimed item's lease alive from a background thread."""
+
+    def __init__(self, queue, item: Dict[str, Any], interval: float = JOB_LEASE_SECONDS / 3):
+        self.queue = queue
+        self.item = item
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                alive = self.queue.heartbeat(self.item["id"], self.item["lease_token"])
+            except (requests.RequestException, sqlite3.Error) as e:
+                print(f"[queue] heartbeat for {self.item['id']} failed: {e}")
+                continue
+            if not alive:
+                print(f"[queue] lease on {self.item['id']} was lost")
+                self.lost = True
+                return
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a SQLite job queue over HTTP.")
+    parser.add_argument("db", help="Queue database file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    server = serve_queue(SQLiteLeaseQueue(args.db), args.host, args.port)
+    print(f"[queue] serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import csv
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# Item lifecycle in the persisted work queue.
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def safe_part(text: str) -> str:
+    """Lowercase and strip a value down to filename-safe characters."""
+    if not text:
+        return "unknown"
+    return "".join(ch for ch in text.lower() if ch.isalnum() or ch in ("-", "_"))
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def load_job_file(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a job file (.json, .yaml/.yml or .csv) into a list of job specs.
+
+    JSON/YAML hold a list of jobs (or {"jobs": [...]}) where each job has
+    "niche"/"niches", "city"/"cities" and an optional "depth". CSV files use
+    one row per item with niche, city and depth columns. Optional "bbox"
+    (south,west,north,east) and "tiled" switch an item to a tiled search;
+    "deadline_seconds" overrides CITY_DEADLINE_SECONDS for its items.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            return [dict(row) for row in csv.DictReader(f)]
+        if ext in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as exc:
+                raise RuntimeError("PyYAML is required to read YAML job files") from exc
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if isinstance(spec, dict):
+        spec = spec.get("jobs", [spec])
+    if not isinstance(spec, list):
+        raise ValueError(f"{path}: expected a list of jobs")
+    return spec
+
+
+def expand_jobs(specs: List[Dict[str, Any]], default_depth: int) -> List[Dict[str, Any]]:
+    """
+    Expand niche x city job specs into individual queue items.
+
+    A niche/city pair listed again is dropped. Different spellings that
+    reduce to the same item id (e.g. "St. Louis" and "St Louis") are reported
+    and kept as separate items with a numbered id, so neither is lost.
+    """
+    items: List[Dict[str, Any]] = []
+    # item id -> {lowercased (niche, city): (niche, city) as first written}
+    seen_ids: Dict[str, Dict[Tuple[str, str], Tuple[str, str]]] = {}
+    repeated = 0
+    for spec in specs:
+        niches = _as_list(spec.get("niches") or spec.get("niche"))
+        cities = _as_list(spec.get("cities") or spec.get("city"))
+        depth_raw = spec.get("depth")
+        depth = int(depth_raw) if depth_raw not in (None, "") else default_depth
+        deadline_raw = spec.get("deadline_seconds")
+        deadline_seconds = float(deadline_raw) if deadline_raw not in (None, "") else None
+        for niche in niches:
+            for city in cities:
+                item_id = f"{safe_part(niche)}__{safe_part(city)}"
+                pair = (niche.lower(), city.lower())
+                spellings = seen_ids.setdefault(item_id, {})
+                if pair in spellings:
+                    repeated += 1
+                    continue
+                if spellings:
+                    first_niche, first_city = next(iter(spellings.values()))
+                    print(
+                        f"[jobs] {niche!r} in {city!r} and {first_niche!r} in {first_city!r} "
+                        f"both map to item id {item_id!r}; keeping both"
+                    )
+                    item_id = f"{item_id}__{len(spellings) + 1}"
+                spellings[pair] = (niche, city)
+                items.append(
+                    {
+                        "id": item_id,
+                        "niche": niche,
+                        "city": city,
+                        "depth": depth,
+                        "bbox": spec.get("bbox"),
+                        "tiled": str(spec.get("tiled", "")).lower() in ("1", "true", "yes"),
+                        "deadline_seconds": deadline_seconds,
+                        "status": PENDING,
+                        "attempts": 0,
+                        "records": 0,
+                        "output": None,
+                        "error": None,
+                        "updated_at": None,
+                    }
+                )
+    if repeated:
+        print(f"[jobs] skipped {repeated} niche/city pairs listed more than once")
+    return items
+
+
+class WorkQueue:
+    """JSON-file backed work queue that survives restarts."""
+
+    def __init__(self, path: str, items: List[Dict[str, Any]] | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    self.items[item["id"]] = item
+        for item in items or []:
+            # Keep the persisted status for items we already know about
+            self.items.setdefault(item["id"], item)
+        for item in self.items.values():
+            # Anything left running belongs to a run that died; retry it
+            if item["status"] == RUNNING:
+                item["status"] = PENDING
+        self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.items.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def pending(self, retry_failed: bool = False) -> List[Dict[str, Any]]:
+        wanted = {PENDING, FAILED} if retry_failed else {PENDING}
+        return [dict(i) for i in self.items.values() if i["status"] in wanted]
+
+    def update(self, item_id: str, **fields: Any) -> None:
+        with self._lock:
+            item = self.items[item_id]
+            item.update(fields)
+            item["updated_at"] = time.time()
+            self._save()
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for item in self.items.values():
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return counts
@@ -0,0 +1,268 @@
+import json
+import re
+from typing import Any, Callable, Iterator, List, Tuple
+
+# Characters pulled from the underlying file per read.
+CHUNK_SIZE = 1 << 16
+
+# Events of a top-level object held back while looking for the "d" wrapper.
+HOLD_LIMIT = 256
+
+Event = Tuple[str, Any]
+
+_TOKEN_RE = re.compile(
+    r'\s*(?:([\[\]{},:])'
+    r'|"([^"\\]*(?:\\.[^"\\]*)*)"'
+    r"|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)"
+    r"|(true|false|null))",
+    re.S,
+)
+_LITERALS = {"true": True, "false": False, "null": None}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_XSSI = ")]}'"
+_LOOKAHEAD = 32
+
+
+class _Source:
+    """Sliding text buffer over a read(n) callable."""
+
+    def __init__(self, read: Callable[[int], str], chunk_size: int = CHUNK_SIZE):
+        self._read = read
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self._read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def ensure(self, n: int) -> bool:
+        """Make at least n unread characters available if the input has them."""
+        while len(self.buf) - self.pos < n:
+            if not self.fill():
+                return False
+        return True
+
+    def skip_space(self) -> None:
+        while True:
+            rest = self.buf[self.pos:]
+            self.pos += len(rest) - len(rest.lstrip())
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+
+class _StringReader:
+    """
+    Reads the decoded contents of a JSON string straight off a _Source, so a
+    document embedded in a string can be parsed without materialising it.
+    The opening quote must already be consumed.
+    """
+
+    _PLAIN = re.compile(r'[^"\\]+')
+
+    def __init__(self, src: _Source):
+        self.src = src
+        self.done = False
+
+    def read(self, n: int) -> str:
+        parts, size = [], 0
+        src = self.src
+        while not self.done and size < n:
+            if not src.ensure(1):
+                raise ValueError("unterminated string")
+            match = self._PLAIN.match(src.buf, src.pos)
+            if match:
+                parts.append(match.group())
+                size += match.end() - src.pos
+                src.pos = match.end()
+                continue
+            ch = src.buf[src.pos]
+            if ch == '"':
+                src.pos += 1
+                self.done = True
+                break
+            # Backslash escape
+            if not src.ensure(2):
+                raise ValueError("unterminated escape")
+            code = src.buf[src.pos + 1]
+            if code != "u":
+                parts.append(_ESCAPES.get(code, code))
+                src.pos += 2
+                size += 1
+                continue
+            src.ensure(12)
+            text = src.buf[src.pos:src.pos + 12]
+            high = int(text[2:6], 16)
+            if 0xD800 <= high < 0xDC00 and text[6:8] == "\\u":
+                low = int(text[8:12], 16)
+                parts.append(chr(0x10000 + ((high - 0xD800) << 10) + (low - 0xDC00)))
+                src.pos += 12
+            else:
+                parts.append(chr(high))
+                src.pos += 6
+            size += 1
+        return "".join(parts)
+
+    def drain(self) -> None:
+        while not self.done:
+            self.read(self.src.chunk_size)
+
+
+class _Parser:
+    def __init__(self, read: Callable[[int], str], unwrap_key: str | None, chunk_size: int):
+        self.src = _Source(read, chunk_size)
+        self.unwrap_key = unwrap_key
+
+    def _skip_xssi(self) -> None:
+        self.src.skip_space()
+        self.src.ensure(len(_XSSI))
+        if self.src.buf.startswith(_XSSI, self.src.pos):
+            self.src.pos += len(_XSSI)
+
+    def _embedded_string(self) -> _StringReader | None:
+        """If the next value is a string holding a JSON document, open a reader on it."""
+        src = self.src
+        src.skip_space()
+        if src.ensure(1) and src.buf[src.pos] == ":":
+            src.pos += 1
+            src.skip_space()
+        if not src.ensure(1) or src.buf[src.pos] != '"':
+            return None
+        src.ensure(16)
+        head = src.buf[src.pos + 1:src.pos + 16].lstrip()
+        if not (head.startswith(_XSSI) or head[:1] in ("[", "{")):
+            return None
+        src.pos += 1
+        return _StringReader(src)
+
+    def events(self) -> Iterator[Event]:
+        self._skip_xssi()
+        src = self.src
+        match_token = _TOKEN_RE.match
+        # True for an open object, False for an open array
+        stack: List[bool] = []
+        expect_key = False
+        last_key = None
+        while True:
+            if last_key is not None and last_key == self.unwrap_key and stack == [True]:
+                last_key = None
+                reader = self._embedded_string()
+                if reader is not None:
+                    inner = _Parser(reader.read, None, src.chunk_size)
+                    yield "start_embedded", self.unwrap_key
+                    yield from inner.events()
+                    reader.drain()
+                    yield "end_embedded", self.unwrap_key
+                    continue
+
+            match = match_token(src.buf, src.pos)
+            # A token near the end of the buffer may continue in the next chunk
+            # ("12" of "12.5e3"), so only trust it with some lookahead behind it
+            if (match is None or len(src.buf) - match.end() < _LOOKAHEAD) and src.fill():
+                continue
+            if match is None:
+                if src.buf[src.pos:].strip():
+                    raise ValueError(f"invalid JSON near {src.buf[src.pos:src.pos + 40]!r}")
+                if stack:
+                    raise ValueError("unexpected end of input")
+                return
+            src.pos = match.end()
+            group = match.lastindex
+            text = match.group(group)
+
+            if group == 1:
+                if text == ",":
+                    expect_key = bool(stack) and stack[-1]
+                    continue
+                if text == ":":
+                    continue
+                if text == "{":
+                    stack.append(True)
+                    expect_key = True
+                    yield "start_map", None
+                elif text == "[":
+                    stack.append(False)
+                    yield "start_array", None
+                else:
+                    stack.pop()
+                    expect_key = False
+                    yield ("end_map" if text == "}" else "end_array"), None
+            elif group == 2:
+                value = json.loads(f'"{text}"') if "\\" in text else text
+                if expect_key:
+                    expect_key = False
+                    last_key = value
+                    yield "map_key", value
+                    continue
+                yield "string", value
+            elif group == 3:
+                yield "number", float(text) if ("." in text or "e" in text or "E" in text) else int(text)
+            else:
+                value = _LITERALS[text]
+                yield ("null" if value is None else "boolean"), value
+            if not stack:
+                # Done with the document; ignore trailing /*""*/ markers
+                return
+
+
+def iter_events(
+    read: Callable[[int], str],
+    *,
+    unwrap_key: str | None = "d",
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Event]:
+    """
+    Yield ijson-style events ("start_map", "map_key", "start_array", "string",
+    "number", "boolean", "null", "end_array", "end_map") from a text stream.
+
+    The XSSI prefix of Maps responses is skipped and trailing comment markers
+    are ignored. When a top-level object's unwrap_key holds a JSON document as
+    a string (the "d" wrapper), that document is parsed in place between
+    "start_embedded" and "end_embedded" events instead of being yielded as one
+    huge string.
+    """
+    return _Parser(read, unwrap_key, chunk_size).events()
+
+
+def iter_payload_events(read: Callable[[int], str], chunk_size: int = CHUNK_SIZE) -> Iterator[Event]:
+    """
+    Events for the payload parse_payload would return: the document inside a
+    "d" wrapper when there is one, the outer document otherwise.
+
+    Outer object events are held back (at most HOLD_LIMIT) until the wrapper is
+    recognised; the wrapper's other keys are small scalars.
+    """
+    events = iter_events(read, chunk_size=chunk_size)
+    first = next(events, None)
+    if first is None:
+        return
+    if first[0] != "start_map":
+        yield first
+        yield from events
+        return
+    held = [first]
+    for event in events:
+        if event[0] == "start_embedded":
+            for inner in events:
+                if inner[0] == "end_embedded":
+                    break
+                yield inner
+            # Drain the rest of the wrapper
+            for _ in events:
+                pass
+            return
+        held.append(event)
+        if len(held) > HOLD_LIMIT:
+            # Not a wrapper after all; stream the outer document as it is
+            yield from held
+            yield from events
+            return
+    yield from held
@@ -0,0 +1,60 @@
+import json
+import re
+from typing import Any, Iterable, List
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Top-level payload elements the pipeline reads: [29] holds the pagination
+# token (extract_token) and [64] the company entries.
+KEEP_INDICES = (29, 64)
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r"\s*")
+
+
+def _decode_with_msgspec(text: str, keep: set, last: int) -> List[Any]:
+    # Raw elements are only validated and sliced, never turned into objects
+    raw = msgspec.json.decode(text, type=List[msgspec.Raw])
+    return [
+        msgspec.json.decode(raw[idx]) if idx in keep else None
+        for idx in range(min(len(raw), last + 1))
+    ]
+
+
+def decode_top_level(text: str, keep: Iterable[int] = KEEP_INDICES) -> Any:
+    """
+    Decode only the kept elements of a top-level JSON array.
+
+    Other elements come back as None and the list ends after the last kept
+    index. With msgspec installed, skipped elements are scanned without
+    building any objects. Without it, each element is decoded by the C json
+    decoder from its offset and dropped at once, so peak memory stays near
+    the kept subtrees and nothing past the last kept index is decoded.
+    Non-array documents are decoded normally.
+    """
+    keep = set(keep)
+    last = max(keep)
+    start = _WS.match(text).end()
+    if not text.startswith("[", start):
+        return json.loads(text)
+    if msgspec is not None:
+        return _decode_with_msgspec(text, keep, last)
+
+    result: List[Any] = []
+    pos = _WS.match(text, start + 1).end()
+    if text.startswith("]", pos):
+        return result
+    while len(result) <= last:
+        value, pos = _DECODER.raw_decode(text, pos)
+        result.append(value if len(result) in keep else None)
+        pos = _WS.match(text, pos).end()
+        if text.startswith(",", pos):
+            pos = _WS.match(text, pos + 1).end()
+        elif text.startswith("]", pos):
+            break
+        else:
+            raise ValueError(f"expected ',' or ']' at {pos}")
+    return result
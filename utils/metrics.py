@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+# Process-wide run metrics: named counters plus a list of notable events.
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_events: List[Dict[str, Any]] = []
+
+METRICS_PATH = os.path.join("output", "run_metrics.json")
+
+
+def incr(name: str, amount: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def record_event(kind: str, **fields: Any) -> None:
+    with _lock:
+        _events.append({"kind": kind, "at": time.time(), **fields})
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {"counters": dict(_counters), "events": list(_events)}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _events.clear()
+
+
+def save(path: str = METRICS_PATH) -> str:
+    """Write the current metrics snapshot as JSON and return the path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    print(f"[metrics] saved run metrics to {path}")
+    return path
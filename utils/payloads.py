@@ -1,14 +1,76 @@
 import json
 import os
+import sqlite3
 import tempfile
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Generator, List, Tuple
 
 import pandas as pd
-import requests
 
-from utils.extractor2 import extract_companies_advanced
+from utils import changefeed, metrics, store
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.extractor2 import ALL_FIELDS, ALWAYS_FIELDS, entry_identity, extract_companies_advanced
+from utils.http import ErrorBudget, FetchError, fetch_with_retry
+from utils.jobs import safe_part
+from utils.lazy_decode import decode_top_level
+from utils.pb_url import SearchUrlTemplate
 from utils.token_generator import extract_token, update_url_with_token
 
+# Decode only data[29] and data[64] of each page ("1"); other elements stay None.
+LAZY_DECODE = os.getenv("LAZY_DECODE", "0") == "1"
+
+# Adaptive pagination: stop once this many consecutive pages bring fewer than
+# MIN_PAGE_YIELD new businesses (as a share of the page's entries).
+MIN_PAGE_YIELD = float(os.getenv("MIN_PAGE_YIELD", "0.1"))
+LOW_YIELD_PATIENCE = int(os.getenv("LOW_YIELD_PATIENCE", "2"))
+
+# Record fields to extract, comma-separated (e.g. "Name,PlaceId,Phone"). By
+# default everything except Address, which finalize_records drops anyway.
+EXTRACT_FIELDS = tuple(
+    f.strip() for f in os.getenv("EXTRACT_FIELDS", "").split(",") if f.strip()
+) or tuple(f for f in ALL_FIELDS if f != "Address")
+
+# Fetch pages 1..N by explicit pb offset (!8i) in one parallel wave ("1"),
+# checked against the token chain's first page; the chain is the fallback.
+OFFSET_PAGINATION = os.getenv("OFFSET_PAGINATION", "0") == "1"
+# Share of the token page's businesses the offset page must also return.
+OFFSET_MATCH = float(os.getenv("OFFSET_MATCH", "0.8"))
+
+# Where one search's side outputs (payload pages, extracted JSON/CSV) go;
+# concurrent batch items each get their own through output_dir().
+_output_dir: ContextVar[str] = ContextVar("output_dir", default="output")
+
+# Template shape -> whether it honoured page offsets when last checked
+_offset_verdicts: Dict[str, bool] = {}
+
+# Headers mirroring the browser's own search XHRs; reused for direct requests.
+CHROME_HEADERS = {
+    "accept": "*/*",
+    "accept-encoding": "gzip, deflate, br, zstd",
+    "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
+    "user-agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/143.0.0.0 Safari/537.36"
+    ),
+    "sec-ch-ua": '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-site": "same-origin",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-dest": "empty",
+    "referer": "https://www.google.com/",
+    "priority": "u=1, i",
+    "x-browser-channel": "stable",
+    "x-browser-copyright": "Copyright 2025 Google LLC. All Rights reserved.",
+    "x-browser-validation": "UujAs0GAwdnCJ9nvrswZ+O+oco0=",
+    "x-browser-year": "2025",
+    "x-client-data": "CJP+ygE=",
+    "x-maps-diversion-context-bin": "CAE=",
+}
+
 
 def strip_wrappers(text: str) -> str:
     """Remove XSSI prefix and trailing comment markers from Maps responses."""
@@ -22,14 +84,52 @@ def strip_wrappers(text: str) -> str:
     return text.strip()
 
 
-def parse_payload(raw_text: str) -> Any:
-    """Parse nested Maps payload that may be wrapped twice."""
+@contextmanager
+def output_dir(path: str):
+    """Send the side outputs of searches run in this context to path."""
+    token = _output_dir.set(path)
+    try:
+        yield path
+    finally:
+        _output_dir.reset(token)
+
+
+def output_path(name: str) -> str:
+    """Path of a side output file in the current output directory."""
+    directory = _output_dir.get()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def parse_payload(raw_text: str, lazy: bool = LAZY_DECODE) -> Any:
+    """
+    Parse nested Maps payload that may be wrapped twice. lazy (LAZY_DECODE by
+    default) builds only what extraction reads; tools that need the whole
+    page pass lazy=False.
+    """
+    if lazy:
+        return parse_payload_partial(raw_text)
     outer = json.loads(strip_wrappers(raw_text))
     if isinstance(outer, dict) and isinstance(outer.get("d"), str):
         return json.loads(strip_wrappers(outer["d"]))
     return outer
 
 
+def parse_payload_partial(raw_text: str) -> Any:
+    """
+    Like parse_payload, but only data[29] and data[64] are built as Python
+    objects; the page comes back as a list truncated after index 64 with None
+    everywhere else.
+    """
+    text = strip_wrappers(raw_text)
+    if text.startswith("{"):
+        outer = json.loads(text)
+        if not (isinstance(outer, dict) and isinstance(outer.get("d"), str)):
+            return outer
+        text = strip_wrappers(outer["d"])
+    return decode_top_level(text)
+
+
 def _merge_by_name(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     merged: Dict[str, Dict[str, Any]] = {}
 
@@ -88,7 +188,77 @@ def _is_lgbtq(rec: Dict[str, Any]) -> bool:
     return any(k in text for k in keywords)
 
 
-def _dedupe(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def dedupe_keys(rec: Dict[str, Any]) -> List[tuple]:
+    """
+    Keys _dedupe merges a record on, strongest first: place id, phone, site,
+    then name. Names are scoped to the city, as the same name in another city
+    is usually another business.
+    """
+    keys = []
+    place_id = rec.get("PlaceId") or rec.get("place_id")
+    if place_id and place_id != "N/A":
+        keys.append(("place", place_id))
+    n_phone = _normalize_phone(rec.get("Phone") or rec.get("company_phone"))
+    if n_phone:
+        keys.append(("phone", n_phone))
+    n_site = _normalize_site(rec.get("Website") or rec.get("company_website"))
+    if n_site:
+        keys.append(("site", n_site))
+    name = rec.get("Name") or rec.get("company_name")
+    if isinstance(name, str) and name.strip():
+        city = str(rec.get("City") or rec.get("city") or "").lower().strip()
+        keys.append(("name", name.lower().strip(), city))
+    return keys
+
+
+def record_key(rec: Dict[str, Any]) -> str | None:
+    """Stable cross-run identity: place id, else the strongest _dedupe key."""
+    place_id = rec.get("PlaceId") or rec.get("place_id")
+    if place_id and place_id != "N/A":
+        return f"place:{place_id}"
+    n_phone = _normalize_phone(rec.get("Phone") or rec.get("company_phone"))
+    if n_phone:
+        return f"phone:{n_phone}"
+    n_site = _normalize_site(rec.get("Website") or rec.get("company_website"))
+    if n_site and n_site != "n/a":
+        return f"site:{n_site}"
+    name = rec.get("Name") or rec.get("company_name")
+    if isinstance(name, str) and name.strip():
+        # Names alone collide across cities, unlike within one run
+        city = str(rec.get("City") or rec.get("city") or "").lower().strip()
+        return f"name:{name.lower().strip()}|{city}"
+    return None
+
+
+def _store_results(records: List[Dict[str, Any]], *, niche: str | None, city: str | None) -> None:
+    """Upsert one finished search into the RESULTS_DB SQLite store."""
+    try:
+        conn = store.connect(store.RESULTS_DB)
+        try:
+            run_id = store.start_run(conn, niche=niche, city=city)
+            count = store.upsert_records(
+                conn,
+                run_id,
+                records,
+                record_key,
+                normalize_phone=_normalize_phone,
+                normalize_site=_normalize_site,
+            )
+        finally:
+            conn.close()
+        print(f"[store] run {run_id}: upserted {count} businesses into {store.RESULTS_DB}")
+    except sqlite3.Error as e:
+        print(f"[store] failed to write results: {e}")
+
+
+def _dedupe(
+    records: List[Dict[str, Any]], fields: Tuple[str, ...] | None = None
+) -> List[Dict[str, Any]]:
+    """
+    Merge records of the same business (any shared dedupe_keys key).
+    With ``fields``, merged records keep only those plus ALWAYS_FIELDS and
+    City/Niche, so a projection leaves the other columns out entirely.
+    """
     merged: List[Dict[str, Any]] = []
     key_map: Dict[tuple, int] = {}
 
@@ -117,17 +287,11 @@ def _dedupe(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         reviews = rec.get("Reviews") or rec.get("number_of_reviews")
         city = rec.get("City") or rec.get("city")
         niche = rec.get("Niche") or rec.get("niche")
+        place_id = rec.get("PlaceId") or rec.get("place_id")
+        if place_id == "N/A":
+            place_id = None
 
-        keys = []
-        n_phone = _normalize_phone(phone)
-        n_site = _normalize_site(website)
-        n_name = name.lower().strip() if isinstance(name, str) else None
-        if n_phone:
-            keys.append(("phone", n_phone))
-        if n_site:
-            keys.append(("site", n_site))
-        if n_name:
-            keys.append(("name", n_name))
+        keys = dedupe_keys(rec)
 
         existing_idx = None
         for k in keys:
@@ -140,6 +304,7 @@ def _dedupe(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             merged.append(
                 {
                     "Name": name,
+                    "PlaceId": place_id,
                     "Profile": profile,
                     "Website": website,
                     "Phone": phone,
@@ -152,6 +317,7 @@ def _dedupe(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         else:
             cur = merged[existing_idx]
             cur["Name"] = pick(cur.get("Name"), name)
+            cur["PlaceId"] = pick(cur.get("PlaceId"), place_id)
             cur["Profile"] = pick(cur.get("Profile"), profile)
             cur["Website"] = pick(cur.get("Website"), website)
             cur["Phone"] = pick(cur.get("Phone"), phone)
@@ -180,23 +346,83 @@ def _dedupe(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             if k not in key_map:
                 key_map[k] = existing_idx
 
+    if fields is not None:
+        keep = set(fields) | set(ALWAYS_FIELDS) | {"City", "Niche"}
+        merged = [{k: v for k, v in rec.items() if k in keep} for rec in merged]
     return merged
 
 
-def _paginate_requests(
+def _page_entry_count(payload: Any) -> int:
+    """Number of company entries (data[64]) on a page."""
+    if isinstance(payload, list) and len(payload) > 64 and isinstance(payload[64], list):
+        return len(payload[64])
+    return 0
+
+
+def _absorb_page(
+    paged_json: Any,
+    page_counter: int,
+    paged_records: List[Dict[str, Any]],
+    seen: Dict[str, Any],
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+) -> Dict[str, Any]:
+    """Save one paginated payload, add its new records and return its page stats."""
+    # Persist each paginated payload as JSON (no TXT)
+    ech_label = 2 + page_counter  # first paginated page after ech=2 -> ech=3
+    page_json_path = output_path(f"ech{ech_label}_payload_page{ech_label}.json")
+    try:
+        with open(page_json_path, "w", encoding="utf-8") as f:
+            json.dump(paged_json, f, ensure_ascii=False, indent=2)
+        print(f"[requests] saved paginated payload to {page_json_path}")
+    except OSError as e:
+        print(f"[requests] failed to save paginated payload: {e}")
+
+    before = len(paged_records)
+    paged_records.extend(extract_companies_advanced(paged_json, seen=seen, fields=fields))
+    added = len(paged_records) - before
+    entries = _page_entry_count(paged_json)
+    page_yield = added / entries if entries else 0.0
+    stats = {"page": page_counter, "entries": entries, "new": added, "yield": page_yield}
+    print(
+        f"[requests] page {page_counter} added {added} records "
+        f"(yield {page_yield:.0%}, total so far {len(paged_records)})"
+    )
+    return stats
+
+
+def pagination_chain(
     start_url: str,
     first_token: str,
     max_pages: int,
     *,
-    headers: Dict[str, str],
-    cookies: Dict[str, str],
-) -> Tuple[List[Dict[str, Any]], str]:
-    """Follow pagination tokens with requests to pull additional records."""
+    seen: Dict[str, Any] | None = None,
+    min_yield: float = MIN_PAGE_YIELD,
+    patience: int = LOW_YIELD_PATIENCE,
+    budget: ErrorBudget | None = None,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+    deadline: Deadline = NO_DEADLINE,
+) -> Generator[str, Any, Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]]:
+    """
+    One token chain as a generator, so blocking and asyncio clients share it.
+
+    Yields the URL of each page to fetch and expects the parsed payload back
+    through send(), or the FetchError the page failed with. Returns the same
+    (records, last URL, page stats) as _paginate_requests; pages gathered
+    before ``deadline`` passes are kept. Page URLs carry their offset (!8i)
+    alongside the token, as the browser's own requests do, so each page has
+    a stable identity once the session token is ignored (see http_cache).
+    """
     page_counter = 0
     seen_tokens = set()
     next_token = first_token
     next_url = start_url
     paged_records: List[Dict[str, Any]] = []
+    page_stats: List[Dict[str, Any]] = []
+    low_yield_pages = 0
+    if seen is None:
+        seen = {}
+    if budget is None:
+        budget = ErrorBudget()
 
     while next_token:
         if next_token in seen_tokens:
@@ -210,44 +436,323 @@ def _paginate_requests(
         next_url = update_url_with_token(next_url, next_token)
         if not next_url:
             break
-        try:
-            print(f"[requests] fetching page {page_counter} with token {next_token}")
-            resp = requests.get(next_url, headers=headers, cookies=cookies)
-            resp.raise_for_status()
-        except Exception as e:
-            print(f"Failed pagination request ({page_counter}): {e}")
+        next_url = _with_page_offset(next_url, start_url, page_counter)
+        if budget.exhausted:
+            print("[requests] error budget exhausted; stopping pagination.")
+            break
+        if deadline.expired("pagination"):
+            break
+        print(f"[requests] fetching page {page_counter} with token {next_token}")
+        paged_json = yield next_url
+        if isinstance(paged_json, FetchError):
+            print(f"Failed pagination request ({page_counter}, {paged_json.kind}): {paged_json}")
             break
         print(f"[requests] fetched URL: {next_url}")
+        stats = _absorb_page(paged_json, page_counter, paged_records, seen, fields)
+        page_stats.append(stats)
+        page_yield = stats["yield"]
+        next_token = extract_token(paged_json)
 
-        paged_raw = resp.text.strip()
-        try:
-            paged_json = parse_payload(paged_raw)
-        except Exception as e:
-            print(f"Failed to parse paged response ({page_counter}): {e}")
+        low_yield_pages = low_yield_pages + 1 if page_yield < min_yield else 0
+        if next_token and low_yield_pages >= max(1, patience):
+            print(
+                f"[requests] {low_yield_pages} page(s) below {min_yield:.0%} new "
+                "businesses; stopping pagination."
+            )
             break
-        # Persist each paginated payload as JSON (no TXT)
-        ech_label = 2 + page_counter  # first paginated page after ech=2 -> ech=3
-        page_json_path = os.path.join(
-            "output", f"ech{ech_label}_payload_page{ech_label}.json"
-        )
-        try:
-            with open(page_json_path, "w", encoding="utf-8") as f:
-                json.dump(paged_json, f, ensure_ascii=False, indent=2)
-            print(f"[requests] saved paginated payload to {page_json_path}")
-        except OSError as e:
-            print(f"[requests] failed to save paginated payload: {e}")
-
-        before = len(paged_records)
-        paged_records.extend(extract_companies_advanced(paged_json))
-        print(
-            f"[requests] page {page_counter} added {len(paged_records) - before} records "
-            f"(total so far {len(paged_records)})"
-        )
-        next_token = extract_token(paged_json)
 
     if not next_token:
         print("[requests] no further tokens; pagination complete.")
-    return paged_records, next_url
+    return paged_records, next_url, page_stats
+
+
+def _with_page_offset(url: str, start_url: str, page: int) -> str:
+    """url with !8i set to page ``page`` after start_url; unchanged without size/offset fields."""
+    try:
+        start = SearchUrlTemplate.from_url(start_url)
+        template = SearchUrlTemplate.from_url(url)
+    except ValueError:
+        return url
+    size, offset = start.page_size, start.page_offset
+    if not size or offset is None:
+        return url
+    template.set_page_offset(offset + page * size)
+    return template.to_url()
+
+
+def offset_page_urls(start_url: str, first_token: str, max_pages: int) -> List[str] | None:
+    """
+    URLs for pages 1..max_pages after start_url, addressed by pb offset.
+
+    Returns None when the template carries no page size or offset field.
+    """
+    try:
+        template = SearchUrlTemplate.from_url(start_url)
+    except ValueError:
+        return None
+    size, offset = template.page_size, template.page_offset
+    if not size or offset is None:
+        return None
+    if template.has_token_slot:
+        template.set_token(first_token)
+    if template.get_param("ech") == "2":
+        template.set_ech(3)
+    urls = []
+    for page in range(1, max_pages + 1):
+        template.set_page_offset(offset + page * size)
+        urls.append(template.to_url())
+    return urls
+
+
+def _template_key(url: str) -> str:
+    """
+    Shape of a search URL (endpoint, parameter names and pb field layout,
+    without values), shared by every city and page searched with a template.
+    """
+    try:
+        template = SearchUrlTemplate.from_url(url)
+    except ValueError:
+        return url
+    shape = "".join(f"!{field}{kind}" for field, kind, _ in template.tokens)
+    params = ",".join(sorted(key for key, _ in template.params))
+    return f"{template.base}?{params}#{shape}"
+
+
+def _page_identities(payload: Any) -> set:
+    if not _page_entry_count(payload):
+        return set()
+    ids = set()
+    for entry in payload[64]:
+        if isinstance(entry, list) and len(entry) > 1 and isinstance(entry[1], list):
+            identity = entry_identity(entry[1])
+            if identity:
+                ids.add(identity)
+    return ids
+
+
+def _offsets_honoured(token_page: Any, offset_pages: List[Any], match: float = OFFSET_MATCH) -> bool:
+    """
+    True when the first offset page returns the token chain's first page and
+    the second offset page is not that same page again (offset ignored).
+    """
+    if isinstance(token_page, FetchError) or isinstance(offset_pages[0], FetchError):
+        return False
+    expected = _page_identities(token_page)
+    first = _page_identities(offset_pages[0])
+    if not expected or len(expected & first) < match * len(expected):
+        return False
+    if len(offset_pages) > 1 and not isinstance(offset_pages[1], FetchError):
+        second = _page_identities(offset_pages[1])
+        if second and len(second & first) >= match * len(second):
+            return False
+    return True
+
+
+def _paginate_offsets(
+    start_url: str,
+    first_token: str,
+    max_pages: int,
+    *,
+    headers: Dict[str, str],
+    cookies: Dict[str, str],
+    seen: Dict[str, Any],
+    min_yield: float,
+    patience: int,
+    budget: ErrorBudget,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]:
+    """
+    Fetch the token chain's first page and offset pages 1..max_pages in one
+    parallel wave. If the offset pages agree with the chain they are used
+    as-is; otherwise the chain continues from its already fetched first page.
+    A template shape seen ignoring offsets skips the wave from then on.
+    """
+    chain = pagination_chain(
+        start_url,
+        first_token,
+        max_pages,
+        seen=seen,
+        min_yield=min_yield,
+        patience=patience,
+        budget=budget,
+        fields=fields,
+        deadline=deadline,
+    )
+    try:
+        token_url = next(chain)
+    except StopIteration as done:
+        return done.value
+
+    def fetch(url: str) -> Any:
+        try:
+            return fetch_with_retry(
+                url,
+                headers=headers,
+                cookies=cookies,
+                parse=parse_payload,
+                budget=budget,
+                deadline=deadline,
+            )
+        except FetchError as e:
+            return e
+
+    def follow_chain(result: Any):
+        try:
+            while True:
+                result = fetch(chain.send(result))
+        except StopIteration as done:
+            return done.value
+
+    key = _template_key(token_url)
+    if _offset_verdicts.get(key) is False:
+        return follow_chain(fetch(token_url))
+    # From start_url: token_url already carries page 1's offset
+    urls = offset_page_urls(start_url, first_token, max_pages) or []
+    if not urls:
+        _offset_verdicts[key] = False
+        return follow_chain(fetch(token_url))
+
+    # The rate limiter still spaces these out; the wave just skips the
+    # round trip per page that the token chain needs.
+    with ThreadPoolExecutor(max_workers=len(urls) + 1) as pool:
+        token_future = pool.submit(fetch, token_url)
+        offset_pages = list(pool.map(fetch, urls))
+        token_page = token_future.result()
+
+    honoured = _offsets_honoured(token_page, offset_pages)
+    # A failed request says nothing about the template; check again next time
+    if not isinstance(token_page, FetchError) and not isinstance(offset_pages[0], FetchError):
+        _offset_verdicts[key] = honoured
+    if not honoured:
+        metrics.incr("pagination.offset_fallbacks")
+        print("[requests] template does not honour page offsets; following the token chain.")
+        return follow_chain(token_page)
+    chain.close()
+    metrics.incr("pagination.offset_waves")
+    print(f"[requests] page offsets honoured; fetched {len(urls)} pages in one wave.")
+
+    paged_records: List[Dict[str, Any]] = []
+    page_stats: List[Dict[str, Any]] = []
+    low_yield_pages = 0
+    last_url = start_url
+    for page_counter, (url, page) in enumerate(zip(urls, offset_pages), start=1):
+        if isinstance(page, FetchError):
+            print(f"Failed pagination request ({page_counter}, {page.kind}): {page}")
+            break
+        if not _page_entry_count(page):
+            print("[requests] offset page came back empty; pagination complete.")
+            break
+        last_url = url
+        stats = _absorb_page(page, page_counter, paged_records, seen, fields)
+        page_stats.append(stats)
+        if not extract_token(page):
+            print("[requests] no further tokens; pagination complete.")
+            break
+        low_yield_pages = low_yield_pages + 1 if stats["yield"] < min_yield else 0
+        if low_yield_pages >= max(1, patience):
+            print(
+                f"[requests] {low_yield_pages} page(s) below {min_yield:.0%} new "
+                "businesses; stopping pagination."
+            )
+            break
+    return paged_records, last_url, page_stats
+
+
+def _paginate_requests(
+    start_url: str,
+    first_token: str,
+    max_pages: int,
+    *,
+    headers: Dict[str, str],
+    cookies: Dict[str, str],
+    seen: Dict[str, Any] | None = None,
+    min_yield: float = MIN_PAGE_YIELD,
+    patience: int = LOW_YIELD_PATIENCE,
+    budget: ErrorBudget | None = None,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]:
+    """
+    Follow pagination tokens with requests to pull additional records.
+
+    Each page's yield is the share of its entries that were new identities
+    (against ``seen``, which earlier pages of the run should share). Pagination
+    stops after ``patience`` consecutive pages below ``min_yield``. Transient
+    failures are retried through fetch_with_retry, charged to ``budget``.
+    With OFFSET_PAGINATION, pages are fetched by offset in parallel when the
+    template honours offsets. Pagination stops early, keeping what it has,
+    once ``deadline`` passes. Returns the records, the last URL and per-page
+    stats.
+    """
+    budget = budget or ErrorBudget()
+    if OFFSET_PAGINATION:
+        return _paginate_offsets(
+            start_url,
+            first_token,
+            max_pages,
+            headers=headers,
+            cookies=cookies,
+            seen={} if seen is None else seen,
+            min_yield=min_yield,
+            patience=patience,
+            budget=budget,
+            fields=fields,
+            deadline=deadline,
+        )
+    chain = pagination_chain(
+        start_url,
+        first_token,
+        max_pages,
+        seen=seen,
+        min_yield=min_yield,
+        patience=patience,
+        budget=budget,
+        fields=fields,
+        deadline=deadline,
+    )
+    try:
+        url = next(chain)
+        while True:
+            try:
+                result = fetch_with_retry(
+                    url,
+                    headers=headers,
+                    cookies=cookies,
+                    parse=parse_payload,
+                    budget=budget,
+                    deadline=deadline,
+                )
+            except FetchError as e:
+                result = e
+            url = chain.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+def collect_captured_bodies(
+    captured: Dict[str, Any], driver, deadline: Deadline = NO_DEADLINE
+) -> List[Dict[str, Any]]:
+    """Pull the body of every captured response out of the browser in one batch."""
+    # Imported here: utils.capture needs botasaurus, the HTTP-only paths do not
+    from utils.capture import BODY_FETCH_TIMEOUT, fetch_response_bodies
+
+    raw = fetch_response_bodies(
+        driver, list(captured["request_ids"]), timeout=deadline.cap(BODY_FETCH_TIMEOUT)
+    )
+    if any(body is None for body in raw.values()):
+        deadline.expired("body_collection")
+    bodies: List[Dict[str, Any]] = []
+    for req_id, url in zip(captured["request_ids"], captured["urls"]):
+        content = raw.get(req_id) or b""
+        bodies.append(
+            {
+                "url": url,
+                "ech": captured["ech_map"].get(req_id),
+                "text": content.decode("utf-8", errors="replace").strip(),
+            }
+        )
+    return bodies
 
 
 def process_captured_payloads(
@@ -256,48 +761,52 @@ def process_captured_payloads(
     max_pages: int,
     *,
     meta: Dict[str, Any] | None = None,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+    deadline: Deadline = NO_DEADLINE,
 ) -> Tuple[str, int, List[Dict[str, Any]]]:
-    """Parse collected responses, follow pagination, dedupe, and persist output."""
-    os.makedirs("output", exist_ok=True)
-    ech1_records: List[Dict[str, Any]] = []
-    ech2plus_records: List[Dict[str, Any]] = []
-    meta = meta or {}
-    meta_city = meta.get("city")
-    meta_niche = meta.get("niche")
+    """
+    Parse collected responses, follow pagination, dedupe, and persist output.
+    ``fields`` is the record projection passed to extract_companies_advanced;
+    pagination stops once ``deadline`` passes, but every captured body is
+    still extracted and saved.
+    """
     try:
         browser_cookies = {c.get("name"): c.get("value") for c in driver.get_cookies()}
     except Exception:
         browser_cookies = {}
-    chrome_headers = {
-        "accept": "*/*",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
-        "user-agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/143.0.0.0 Safari/537.36"
-        ),
-        "sec-ch-ua": '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-site": "same-origin",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-dest": "empty",
-        "referer": "https://www.google.com/",
-        "priority": "u=1, i",
-        "x-browser-channel": "stable",
-        "x-browser-copyright": "Copyright 2025 Google LLC. All Rights reserved.",
-        "x-browser-validation": "UujAs0GAwdnCJ9nvrswZ+O+oco0=",
-        "x-browser-year": "2025",
-        "x-client-data": "CJP+ygE=",
-        "x-maps-diversion-context-bin": "CAE=",
-    }
+    return process_collected_payloads(
+        collect_captured_bodies(captured, driver, deadline),
+        browser_cookies,
+        max_pages,
+        meta=meta,
+        fields=fields,
+        deadline=deadline,
+    )
+
+
+def extract_collected_bodies(
+    bodies: List[Dict[str, Any]], *, fields: Tuple[str, ...] = EXTRACT_FIELDS
+) -> Dict[str, Any]:
+    """
+    Extract every captured body and find where pagination should start.
+
+    Returns the run state: ech1/ech2plus records, the shared ``seen`` map and
+    error budget, and ``chains``, the (url, token) of each ech=2 page to
+    paginate from. Every body is extracted even past a search's deadline:
+    it is already in hand and costs no network time.
+    """
+    ech1_records: List[Dict[str, Any]] = []
+    ech2plus_records: List[Dict[str, Any]] = []
+    # Entry identity -> extracted record, shared by every page of this run
+    seen_entries: Dict[str, Any] = {}
+    error_budget = ErrorBudget()
 
     ech_counts: Dict[str, int] = {}
+    chains: List[Tuple[str, str]] = []
 
-    for req_id, url in zip(captured["request_ids"], captured["urls"]):
-        response_body = driver.collect_response(req_id)
-        raw_text = (response_body.get_decoded_content() or "").strip()
+    for body in bodies:
+        url = body["url"]
+        raw_text = body["text"]
 
         try:
             payload_json = parse_payload(raw_text)
@@ -305,13 +814,11 @@ def process_captured_payloads(
             print(f"Captured {url} but failed to parse JSON ({e}); skipping.")
             continue
 
-        ech_val = captured["ech_map"].get(req_id)
+        ech_val = body["ech"]
 
         ech_label = ech_val or "unknown"
         ech_counts[ech_label] = ech_counts.get(ech_label, 0) + 1
-        json_payload_path = os.path.join(
-            "output", f"ech{ech_label}_payload_page{ech_counts[ech_label]}.json"
-        )
+        json_payload_path = output_path(f"ech{ech_label}_payload_page{ech_counts[ech_label]}.json")
         try:
             with open(json_payload_path, "w", encoding="utf-8") as f:
                 json.dump(payload_json, f, ensure_ascii=False, indent=2)
@@ -319,30 +826,15 @@ def process_captured_payloads(
         except OSError as e:
             print(f"[ech={ech_label}] failed to save payload: {e}")
 
-        if ech_val == "2":
-            next_token = extract_token(payload_json)
-            if next_token:
-                print(f"[ech=3+] initial pagination token: {next_token}")
-                paged_records, _ = _paginate_requests(
-                    url,
-                    next_token,
-                    max_pages,
-                    headers=chrome_headers,
-                    cookies=browser_cookies,
-                )
-                ech2plus_records.extend(paged_records)
-            else:
-                print("[ech=2] no pagination token found in payload")
-
         # Use extractor2 for all payloads, mirroring direct runs.
-        def run_extractor(func, payload_obj):
+        def run_extractor(func, payload_obj, **kwargs):
             with tempfile.NamedTemporaryFile(
                 "w", delete=False, suffix=".json", encoding="utf-8"
             ) as tmp:
                 json.dump(payload_obj, tmp, ensure_ascii=False)
                 tmp_path = tmp.name
             try:
-                return func(tmp_path)
+                return func(tmp_path, **kwargs)
             finally:
                 try:
                     os.remove(tmp_path)
@@ -350,12 +842,77 @@ def process_captured_payloads(
                     pass
 
         if ech_val == "1":
-            ech1_records.extend(run_extractor(extract_companies_advanced, payload_json))
+            ech1_records.extend(
+                run_extractor(
+                    extract_companies_advanced, payload_json, seen=seen_entries, fields=fields
+                )
+            )
         else:
             ech2plus_records.extend(
-                run_extractor(extract_companies_advanced, payload_json)
+                run_extractor(
+                    extract_companies_advanced, payload_json, seen=seen_entries, fields=fields
+                )
             )
 
+        if ech_val == "2":
+            next_token = extract_token(payload_json)
+            if next_token:
+                print(f"[ech=3+] initial pagination token: {next_token}")
+                chains.append((url, next_token))
+            else:
+                print("[ech=2] no pagination token found in payload")
+
+    return {
+        "ech1": ech1_records,
+        "ech2plus": ech2plus_records,
+        "seen": seen_entries,
+        "budget": error_budget,
+        "chains": chains,
+    }
+
+
+def process_collected_payloads(
+    bodies: List[Dict[str, Any]],
+    cookies: Dict[str, str],
+    max_pages: int,
+    *,
+    meta: Dict[str, Any] | None = None,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+    deadline: Deadline = NO_DEADLINE,
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """Same as process_captured_payloads, for bodies already taken off the browser."""
+    state = extract_collected_bodies(bodies, fields=fields)
+    for url, token in state["chains"]:
+        paged_records, _, _ = _paginate_requests(
+            url,
+            token,
+            max_pages,
+            headers=CHROME_HEADERS,
+            cookies=cookies,
+            seen=state["seen"],
+            budget=state["budget"],
+            fields=fields,
+            deadline=deadline,
+        )
+        state["ech2plus"].extend(paged_records)
+    return finalize_records(state["ech1"], state["ech2plus"], meta=meta, fields=fields)
+
+
+def finalize_records(
+    ech1_records: List[Dict[str, Any]],
+    ech2plus_records: List[Dict[str, Any]],
+    *,
+    meta: Dict[str, Any] | None = None,
+    fields: Tuple[str, ...] = EXTRACT_FIELDS,
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    Tag records with city/niche, dedupe them, and persist JSON/CSV outputs.
+    ``fields`` is the projection the records were extracted with.
+    """
+    meta = meta or {}
+    meta_city = meta.get("city")
+    meta_niche = meta.get("niche")
+
     # inject meta (city/niche) into all records
     def _apply_meta(recs: List[Dict[str, Any]]):
         for r in recs:
@@ -368,7 +925,7 @@ def process_captured_payloads(
     ech1_records = _apply_meta(ech1_records)
     ech2plus_records = _apply_meta(ech2plus_records)
 
-    extracted_path = os.path.join("output", "extracted_reviews.json")
+    extracted_path = output_path("extracted_reviews.json")
 
     def _drop_address(recs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         for r in recs:
@@ -379,18 +936,21 @@ def process_captured_payloads(
     _drop_address(ech2plus_records)
 
     # Save per-ech raw outputs before dedupe
-    ech1_out = os.path.join("output", "extracted_reviews_ech1.json")
-    ech2_out = os.path.join("output", "extracted_reviews_ech2plus.json")
+    ech1_out = output_path("extracted_reviews_ech1.json")
+    ech2_out = output_path("extracted_reviews_ech2plus.json")
     with open(ech1_out, "w", encoding="utf-8") as f:
         json.dump(ech1_records, f, ensure_ascii=False, indent=2)
     with open(ech2_out, "w", encoding="utf-8") as f:
         json.dump(ech2plus_records, f, ensure_ascii=False, indent=2)
 
-    deduped = _dedupe(ech1_records + ech2plus_records)
+    deduped = _dedupe(ech1_records + ech2plus_records, fields)
 
     # Normalize Reviews to integer with default 0
     def _normalize_reviews(recs: List[Dict[str, Any]]):
         for r in recs:
+            if "Reviews" not in r:
+                # Projected out by EXTRACT_FIELDS
+                continue
             val = r.get("Reviews")
             if val in (None, "N/A", "", [], {}):
                 r["Reviews"] = 0
@@ -406,24 +966,26 @@ def process_captured_payloads(
     deduped = _normalize_reviews(deduped)
     with open(extracted_path, "w", encoding="utf-8") as f:
         json.dump(deduped, f, ensure_ascii=False, indent=2)
+    if store.RESULTS_DB:
+        _store_results(deduped, niche=meta_niche, city=meta_city)
+    if changefeed.CHANGE_FEED:
+        changefeed.emit_changes(
+            deduped,
+            record_key,
+            niche=meta_niche,
+            city=meta_city,
+            fields=changefeed.carried_fields(set(fields) | set(ALWAYS_FIELDS)),
+        )
 
     # Also save to CSV for spreadsheet-friendly consumption
     def save_csv(records: List[Dict[str, Any]], *, niche: str, city: str):
         from datetime import datetime
 
-        # Sanitize parts for filename
-        def safe_part(text: str) -> str:
-            if not text:
-                return "unknown"
-            return "".join(
-                ch for ch in text.lower() if ch.isalnum() or ch in ("-", "_")
-            )
-
         date_part = datetime.utcnow().strftime("%Y%m%d")
         niche_part = safe_part(niche)
         city_part = safe_part(city)
         fname = f"{date_part}_{niche_part}_{city_part}.csv"
-        csv_path = os.path.join("output", fname)
+        csv_path = output_path(fname)
         try:
             pd.DataFrame(records).to_csv(csv_path, index=False)
             print(f"Saved CSV to {csv_path}")
@@ -0,0 +1,210 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote_plus
+
+_TOKEN_RE = re.compile(r"^(\d+)([a-zA-Z])(.*)$", re.DOTALL)
+
+# Field paths (message field numbers from the root of pb) for known values.
+PAGE_SIZE_PATH = (7,)
+PAGE_OFFSET_PATH = (8,)
+VIEWPORT_DISTANCE_PATH = (4, 1, 1)
+VIEWPORT_LNG_PATH = (4, 1, 2)
+VIEWPORT_LAT_PATH = (4, 1, 3)
+
+
+class SearchUrlTemplate:
+    """
+    Parsed Maps search URL: the ``pb`` protobuf-style tokens plus the query string.
+
+    ``pb`` is a flat list of ``!<field><type><value>`` tokens in which ``m``
+    tokens open a message spanning the next <value> tokens. Parsing records the
+    field path of every token, so known values (pagination token, page size,
+    viewport, q, ech) are updated in place and re-serialized without rescanning.
+    """
+
+    def __init__(self, url: str):
+        base, _, query = url.partition("?")
+        self.base = base
+        # [key, raw_value] pairs, kept URL-encoded so untouched ones round-trip exactly
+        self.params: List[List[Optional[str]]] = []
+        for part in query.split("&"):
+            if part:
+                key, sep, value = part.partition("=")
+                self.params.append([key, value if sep else None])
+        self._param_index: Dict[str, int] = {}
+        for idx, (key, _) in enumerate(self.params):
+            self._param_index.setdefault(key, idx)
+
+        self.tokens: List[List[str]] = []
+        self.paths: List[Tuple[int, ...]] = []
+        self._by_path: Dict[Tuple[int, ...], List[int]] = {}
+        self._token_idx: Optional[int] = None
+        self._cached_url: Optional[str] = url
+        pb_idx = self._param_index.get("pb")
+        if pb_idx is not None:
+            self._parse_pb(self.params[pb_idx][1])
+
+    def _parse_pb(self, pb: str) -> None:
+        # stack of (field path, index of the last token in the open message)
+        stack: List[Tuple[Tuple[int, ...], int]] = []
+        for raw in pb.split("!")[1:]:
+            match = _TOKEN_RE.match(raw)
+            if not match:
+                raise ValueError(f"Unrecognised pb token: {raw!r}")
+            field, kind, value = match.groups()
+            idx = len(self.tokens)
+            while stack and stack[-1][1] < idx:
+                stack.pop()
+            parent = stack[-1][0] if stack else ()
+            path = parent + (int(field),)
+            self.tokens.append([field, kind, value])
+            self.paths.append(path)
+            self._by_path.setdefault(path, []).append(idx)
+            if kind == "m":
+                stack.append((path, idx + int(value)))
+            # The pagination token sits right after a 5e1 sibling
+            if (
+                self._token_idx is None
+                and field == "9"
+                and kind == "s"
+                and idx > 0
+                and self.tokens[idx - 1][:2] == ["5", "e"]
+                and self.tokens[idx - 1][2] == "1"
+                and self.paths[idx - 1][:-1] == parent
+            ):
+                self._token_idx = idx
+
+    @classmethod
+    def from_url(cls, url: str) -> "SearchUrlTemplate":
+        """Return a mutable copy of the (cached) parsed template for url."""
+        return _parse_cached(url).copy()
+
+    def copy(self) -> "SearchUrlTemplate":
+        clone = object.__new__(SearchUrlTemplate)
+        clone.base = self.base
+        clone.params = [list(p) for p in self.params]
+        clone._param_index = self._param_index
+        clone.tokens = [list(t) for t in self.tokens]
+        clone.paths = self.paths
+        clone._by_path = self._by_path
+        clone._token_idx = self._token_idx
+        clone._cached_url = self._cached_url
+        return clone
+
+    # ---- pb tokens -------------------------------------------------------
+
+    def get(self, path: Tuple[int, ...]) -> Optional[str]:
+        """Return the raw value of the first token at path, if present."""
+        hits = self._by_path.get(tuple(path))
+        return self.tokens[hits[0]][2] if hits else None
+
+    def set(self, path: Tuple[int, ...], value) -> None:
+        """Replace the value of the first scalar token at path."""
+        hits = self._by_path.get(tuple(path))
+        if not hits:
+            raise KeyError(f"pb has no field at {path}")
+        token = self.tokens[hits[0]]
+        if token[1] == "m":
+            raise ValueError(f"pb field at {path} is a message")
+        token[2] = str(value)
+        self._cached_url = None
+
+    @property
+    def has_token_slot(self) -> bool:
+        return self._token_idx is not None
+
+    @property
+    def token_index(self) -> Optional[int]:
+        """Index in tokens of the pagination token, or None."""
+        return self._token_idx
+
+    @property
+    def token(self) -> Optional[str]:
+        return self.tokens[self._token_idx][2] if self.has_token_slot else None
+
+    def set_token(self, token: str) -> None:
+        if not self.has_token_slot:
+            raise KeyError("pb has no pagination token slot (!5e1!9s...)")
+        self.tokens[self._token_idx][2] = token
+        self._cached_url = None
+
+    def set_page_size(self, size: int) -> None:
+        self.set(PAGE_SIZE_PATH, int(size))
+
+    @property
+    def page_size(self) -> Optional[int]:
+        value = self.get(PAGE_SIZE_PATH)
+        return int(value) if value and value.isdigit() else None
+
+    @property
+    def page_offset(self) -> Optional[int]:
+        """Result offset of the page this URL asks for (!8i), if present."""
+        value = self.get(PAGE_OFFSET_PATH)
+        return int(value) if value and value.isdigit() else None
+
+    def set_page_offset(self, offset: int) -> None:
+        self.set(PAGE_OFFSET_PATH, int(offset))
+
+    @property
+    def viewport(self) -> Optional[Tuple[float, float, float]]:
+        """Return (distance_m, lng, lat) of the map viewport."""
+        values = [
+            self.get(p)
+            for p in (VIEWPORT_DISTANCE_PATH, VIEWPORT_LNG_PATH, VIEWPORT_LAT_PATH)
+        ]
+        if any(v is None for v in values):
+            return None
+        return tuple(float(v) for v in values)
+
+    def set_viewport(self, lat: float, lng: float, distance_m: float | None = None) -> None:
+        self.set(VIEWPORT_LAT_PATH, repr(float(lat)))
+        self.set(VIEWPORT_LNG_PATH, repr(float(lng)))
+        if distance_m is not None:
+            self.set(VIEWPORT_DISTANCE_PATH, repr(float(distance_m)))
+
+    # ---- query string ----------------------------------------------------
+
+    def get_param(self, key: str) -> Optional[str]:
+        idx = self._param_index.get(key)
+        if idx is None or self.params[idx][1] is None:
+            return None
+        return unquote_plus(self.params[idx][1])
+
+    def set_param(self, key: str, value: str) -> None:
+        encoded = quote(str(value), safe="")
+        idx = self._param_index.get(key)
+        if idx is None:
+            # copies share the index map; give this one its own before growing it
+            self._param_index = dict(self._param_index)
+            self._param_index[key] = len(self.params)
+            self.params.append([key, encoded])
+        else:
+            self.params[idx][1] = encoded
+        self._cached_url = None
+
+    def set_query(self, query: str) -> None:
+        self.set_param("q", query)
+
+    def set_ech(self, ech) -> None:
+        self.set_param("ech", str(ech))
+
+    # ---- serialization ---------------------------------------------------
+
+    def pb(self) -> str:
+        return "".join(f"!{f}{k}{v}" for f, k, v in self.tokens)
+
+    def to_url(self) -> str:
+        if self._cached_url is None:
+            parts = []
+            for key, value in self.params:
+                if key == "pb":
+                    value = self.pb()
+                parts.append(key if value is None else f"{key}={value}")
+            self._cached_url = f"{self.base}?{'&'.join(parts)}"
+        return self._cached_url
+
+
+@lru_cache(maxsize=64)
+def _parse_cached(url: str) -> SearchUrlTemplate:
+    return SearchUrlTemplate(url)
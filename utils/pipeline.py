@@ -0,0 +1,65 @@
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List
+
+# How many captured cities may wait for the HTTP stage before the browser pauses.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+
+_DONE = object()
+
+
+def run_pipeline(
+    items: List[Dict[str, Any]],
+    capture: Callable[[Dict[str, Any]], Any],
+    process: Callable[[Any], List[Dict[str, Any]]],
+    *,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    workers: int = PIPELINE_WORKERS,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run capture (browser) and process (HTTP + extraction) as overlapping stages.
+
+    The calling thread captures items one after another and hands each result to
+    background workers through a bounded queue, so city N+1 is being searched
+    while city N paginates. Returns the processed records per item, in order.
+    """
+    handoff: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+    results: Dict[int, List[Dict[str, Any]]] = {}
+
+    def worker():
+        while True:
+            job = handoff.get()
+            if job is _DONE:
+                break
+            idx, bundle = job
+            try:
+                results[idx] = process(bundle) or []
+            except Exception as e:
+                print(f"[pipeline] processing item {idx} failed: {e}")
+
+    threads = [
+        threading.Thread(target=worker, name=f"pipeline-http-{n}", daemon=True)
+        for n in range(max(1, workers))
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        for idx, item in enumerate(items):
+            try:
+                bundle = capture(item)
+            except Exception as e:
+                print(f"[pipeline] capture of item {idx} failed: {e}")
+                continue
+            if bundle:
+                # Blocks while the HTTP stage is behind (backpressure)
+                handoff.put((idx, bundle))
+    finally:
+        for _ in threads:
+            handoff.put(_DONE)
+        for t in threads:
+            t.join()
+
+    return [results.get(idx, []) for idx in range(len(items))]
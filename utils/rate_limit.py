@@ -0,0 +1,177 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Requests per second and burst size per host; RATE_LIMIT_RPS=0 disables limiting.
+# Unset, interactive runs are unlimited and batch runs use BATCH_RATE_LIMIT_RPS.
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+BATCH_RATE_LIMIT_RPS = 1.0
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "3"))
+# Per-host overrides, e.g. "www.google.com=0.5:2,maps.google.com=1:4" (rps:burst)
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+# Buckets are files here so every thread and process on the host shares them.
+RATE_LIMIT_DIR = os.getenv(
+    "RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "gbox_rate_limits")
+)
+# Throttled responses halve the rate down to this floor; successes win it back.
+MIN_RATE = 0.05
+RECOVERY_STEP = 0.1
+THROTTLE_STATUSES = {429, 503}
+
+
+def _parse_overrides(spec: str) -> Dict[str, Tuple[float, float]]:
+    overrides = {}
+    for part in spec.split(","):
+        host, _, values = part.strip().partition("=")
+        if not host or not values:
+            continue
+        rps, _, burst = values.partition(":")
+        overrides[host] = (float(rps), float(burst or RATE_LIMIT_BURST))
+    return overrides
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on path across processes; yields the open file."""
+    with open(path, "a+", encoding="utf-8") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenBucket:
+    """
+    Token bucket for one host whose state lives in a locked JSON file.
+
+    The configured rate is the ceiling; penalize() halves the live rate after
+    a throttling response and reward() walks it back up on success.
+    """
+
+    def __init__(self, host: str, rate: float, burst: float, state_dir: str = RATE_LIMIT_DIR):
+        self.host = host
+        self.base_rate = rate
+        self.burst = max(1.0, burst)
+        os.makedirs(state_dir, exist_ok=True)
+        safe_host = "".join(ch if ch.isalnum() or ch in "-." else "_" for ch in host)
+        self.path = os.path.join(state_dir, f"{safe_host}.json")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        with self._lock, _file_lock(self.path) as f:
+            f.seek(0)
+            raw = f.read()
+            now = time.time()
+            try:
+                state = json.loads(raw) if raw.strip() else {}
+            except ValueError:
+                state = {}
+            # A state file from a run with a higher configured rate never exceeds ours
+            state["rate"] = min(state.get("rate", self.base_rate), self.base_rate)
+            state.setdefault("tokens", self.burst)
+            state.setdefault("updated", now)
+            # Refill for the time elapsed since the last writer
+            elapsed = max(0.0, now - state["updated"])
+            state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+            state["updated"] = now
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available and return 0, else the seconds until they are."""
+        with self._state() as state:
+            if state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+            return (tokens - state["tokens"]) / state["rate"]
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available; return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self) -> float:
+        with self._state() as state:
+            state["rate"] = max(MIN_RATE, state["rate"] / 2)
+            state["tokens"] = 0.0
+            return state["rate"]
+
+    def reward(self) -> None:
+        with self._state() as state:
+            if state["rate"] < self.base_rate:
+                state["rate"] = min(self.base_rate, state["rate"] + self.base_rate * RECOVERY_STEP)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_overrides = _parse_overrides(RATE_LIMITS)
+
+
+def use_default_rate(rps: float) -> None:
+    """Limit hosts without an override to rps, unless RATE_LIMIT_RPS is set."""
+    global RATE_LIMIT_RPS
+    if os.getenv("RATE_LIMIT_RPS") is not None:
+        return
+    RATE_LIMIT_RPS = rps
+    with _buckets_lock:
+        _buckets.clear()
+    if rps > 0:
+        print(f"[rate] limiting each host to {rps:g} req/s (burst {RATE_LIMIT_BURST:g}); set RATE_LIMIT_RPS to change")
+
+
+def bucket_for(url: str) -> TokenBucket | None:
+    """Return the shared bucket for url's host, or None when limiting is off."""
+    host = urlsplit(url).netloc or url
+    rate, burst = _overrides.get(host, (RATE_LIMIT_RPS, RATE_LIMIT_BURST))
+    if rate <= 0:
+        return None
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(host, rate, burst)
+        return _buckets[host]
+
+
+def acquire(url: str) -> float:
+    bucket = bucket_for(url)
+    return bucket.acquire() if bucket else 0.0
+
+
+def report(url: str, status: int | None) -> None:
+    """Feed a response status back so the host's rate adapts."""
+    bucket = bucket_for(url)
+    if not bucket or status is None:
+        return
+    if status in THROTTLE_STATUSES:
+        rate = bucket.penalize()
+        print(f"[rate] {bucket.host} answered {status}; slowing to {rate:.2f} req/s")
+    elif 200 <= status < 300:
+        bucket.reward()
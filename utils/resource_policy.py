@@ -0,0 +1,121 @@
+import os
+from fnmatch import fnmatch
+from typing import Dict, List
+
+from botasaurus.browser import cdp
+
+from utils import metrics
+
+# "block" applies the patterns below to every scraping browser; "off" loads everything.
+RESOURCE_POLICY = os.getenv("RESOURCE_POLICY", "block")
+# Extra comma-separated URL patterns ('*' wildcards) to block on top of the defaults.
+RESOURCE_BLOCK_EXTRA = os.getenv("RESOURCE_BLOCK_EXTRA", "")
+
+# Nothing here feeds extraction: images, fonts, map/satellite tiles, photos.
+DEFAULT_BLOCK_PATTERNS = [
+    "*.png*",
+    "*.jpg*",
+    "*.jpeg*",
+    "*.gif*",
+    "*.webp*",
+    "*.svg*",
+    "*.ico*",
+    "*.woff*",
+    "*.ttf*",
+    "*fonts.gstatic.com/*",
+    "*fonts.googleapis.com/*",
+    "*google.com/maps/vt*",
+    "*google.com/maps/vt/*",
+    "*khms*.google.com/*",
+    "*googleusercontent.com/*",
+    "*streetviewpixels-pa.googleapis.com/*",
+    "*google.com/maps/preview/log*",
+]
+
+# The search XHRs the capture tracker needs must never match a block pattern.
+_PROTECTED_SAMPLES = [
+    "https://www.google.com/search?tbm=map&authuser=0&hl=en&pb=!4m12&q=x&ech=1",
+    "https://www.google.com/maps/",
+]
+
+# Typical transfer sizes (bytes) used to estimate what blocking saved, since a
+# blocked request never reports its size.
+_TYPICAL_BYTES = {
+    "Image": 20_000,
+    "Font": 40_000,
+    "Stylesheet": 15_000,
+    "Media": 200_000,
+    "Other": 5_000,
+}
+
+# Set on a driver once its blocking and handlers are in place
+_APPLIED_ATTR = "_resource_policy_applied"
+
+
+def block_patterns() -> List[str]:
+    patterns = list(DEFAULT_BLOCK_PATTERNS)
+    patterns.extend(p.strip() for p in RESOURCE_BLOCK_EXTRA.split(",") if p.strip())
+    safe = []
+    for pattern in patterns:
+        if any(fnmatch(sample, pattern) for sample in _PROTECTED_SAMPLES):
+            print(f"[resources] ignoring pattern {pattern!r}; it would block search XHRs")
+            continue
+        safe.append(pattern)
+    return safe
+
+
+def apply_resource_policy(driver) -> bool:
+    """
+    Block heavy resources in this browser via CDP (Network.setBlockedURLs).
+
+    Safe to call for every search; a driver is only configured once. Blocked
+    requests are counted per resource type in the run metrics along with an
+    estimate of the bytes saved; bytes actually loaded are counted too.
+    """
+    if RESOURCE_POLICY == "off" or getattr(driver, _APPLIED_ATTR, False):
+        return False
+    patterns = block_patterns()
+    driver.block_urls(patterns)
+
+    request_types: Dict[str, str] = {}
+
+    def on_response(event: cdp.network.ResponseReceived):
+        request_types[event.request_id] = event.type_.value if event.type_ else "Other"
+
+    def on_finished(event: cdp.network.LoadingFinished):
+        kind = request_types.pop(event.request_id, "Other")
+        metrics.incr("resources.bytes_loaded", event.encoded_data_length or 0)
+        metrics.incr(f"resources.bytes_loaded.{kind}", event.encoded_data_length or 0)
+
+    def on_failed(event: cdp.network.LoadingFailed):
+        request_types.pop(event.request_id, None)
+        if event.blocked_reason is None:
+            return
+        kind = event.type_.value if event.type_ else "Other"
+        metrics.incr(f"resources.blocked.{kind}")
+        metrics.incr("resources.bytes_saved_estimate", _TYPICAL_BYTES.get(kind, 5_000))
+
+    driver._tab.add_handler(cdp.network.ResponseReceived, on_response)
+    driver._tab.add_handler(cdp.network.LoadingFinished, on_finished)
+    driver._tab.add_handler(cdp.network.LoadingFailed, on_failed)
+    setattr(driver, _APPLIED_ATTR, True)
+    print(f"[resources] blocking {len(patterns)} URL patterns in the browser")
+    return True
+
+
+def resource_report() -> str:
+    """One-line summary of blocked requests and bytes for the run so far."""
+    counters = metrics.snapshot()["counters"]
+    blocked = sum(v for k, v in counters.items() if k.startswith("resources.blocked."))
+    saved = counters.get("resources.bytes_saved_estimate", 0)
+    loaded = counters.get("resources.bytes_loaded", 0)
+    return (
+        f"[resources] blocked {int(blocked)} requests, ~{saved / 1e6:.1f} MB saved, "
+        f"{loaded / 1e6:.1f} MB loaded"
+    )
+
+
+def forget_driver(driver) -> None:
+    """Clear the applied mark so the driver gets configured again on its next search."""
+    if getattr(driver, _APPLIED_ATTR, False):
+        delattr(driver, _APPLIED_ATTR)
@@ -0,0 +1,92 @@
+import math
+from typing import Any, Dict, List
+
+from utils import rate_limit
+from utils.capture import build_capture_tracker, reset_capture_tracker, tab_lock
+from utils.deadline import NO_DEADLINE, Deadline
+
+MAPS_URL = "https://www.google.com/maps/"
+SEARCH_BOX = "input#searchboxinput"
+SEARCH_BUTTON = 'button[aria-label="Search"]'
+
+# Attribute holding a driver's warm Maps state: {"captured": tracker dict,
+# "queries": int, "warm": bool}. Kept on the driver itself, so it dies with it.
+_SESSION_ATTR = "_maps_session"
+# Cookies carried over from a recycled driver to the next one that boots.
+_carried_cookies: List[Dict[str, Any]] = []
+
+
+def _session(driver) -> Dict[str, Any] | None:
+    return getattr(driver, _SESSION_ATTR, None)
+
+
+def _boot(driver, wait_seconds: int) -> Dict[str, Any]:
+    """
+    Load Maps in the tab and register a fresh capture handler. Every cold
+    boot gets its own tracker, so nothing from a previous page load is reused.
+    """
+    previous = _session(driver)
+    if _carried_cookies and previous is None:
+        try:
+            driver.add_cookies(list(_carried_cookies))
+        except Exception as e:
+            print(f"[session] could not restore cookies: {e}")
+        _carried_cookies.clear()
+    rate_limit.acquire(MAPS_URL)
+    driver.google_get(MAPS_URL, accept_google_cookies=True)
+    driver.wait_for_element(SEARCH_BOX, wait=wait_seconds)
+    driver.wait_for_element(SEARCH_BUTTON, wait=wait_seconds)
+    captured, handler = build_capture_tracker()
+    driver.after_response_received(handler)
+    session = {"captured": captured, "queries": previous["queries"] if previous else 0, "warm": True}
+    setattr(driver, _SESSION_ATTR, session)
+    return session
+
+
+def _submit(driver, session: Dict[str, Any], query: str, wait_seconds: int) -> None:
+    reset_capture_tracker(session["captured"], query)
+    rate_limit.acquire(MAPS_URL)
+    driver.clear(SEARCH_BOX, wait=wait_seconds)
+    driver.type(SEARCH_BOX, query, wait=wait_seconds)
+    driver.click(SEARCH_BUTTON, wait=wait_seconds)
+    session["queries"] += 1
+
+
+def start_search(
+    driver, query: str, wait_seconds: int = 60, deadline: Deadline = NO_DEADLINE
+) -> Dict[str, Any]:
+    """
+    Submit query in the driver's Maps tab and return its capture tracker.
+
+    Maps is loaded once per driver; later queries reuse the open app by
+    clearing the search box and resetting the tracker in place. Any failure on
+    the warm path falls back to a full reload. Page waits are cut short to
+    what is left of ``deadline``.
+    """
+    wait_seconds = int(math.ceil(deadline.cap(wait_seconds)))
+    with tab_lock(driver):
+        session = _session(driver)
+        if session and session.get("warm"):
+            try:
+                _submit(driver, session, query, wait_seconds=min(5, wait_seconds))
+                return session["captured"]
+            except Exception as e:
+                print(f"[session] warm search failed ({e}); reloading Maps")
+                session["warm"] = False
+        session = _boot(driver, wait_seconds)
+        _submit(driver, session, query, wait_seconds)
+        return session["captured"]
+
+
+def drop_session(driver, keep_cookies: bool = False) -> None:
+    """
+    Forget a driver's warm state before it is closed. With keep_cookies, its
+    cookies are restored into the next driver that boots Maps.
+    """
+    if keep_cookies:
+        try:
+            _carried_cookies[:] = driver.get_cookies()
+        except Exception as e:
+            print(f"[session] could not save cookies: {e}")
+    if _session(driver) is not None:
+        delattr(driver, _SESSION_ATTR)
@@ -0,0 +1,216 @@
+import csv
+import heapq
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from utils import metrics
+from utils.payloads import _dedupe, dedupe_keys
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Consolidate combined exports on disk instead of in memory ("1").
+SPILL_MERGE = os.getenv("SPILL_MERGE", "0") == "1"
+# Hash partitions, and records buffered in memory before a sorted run is written.
+SPILL_PARTITIONS = int(os.getenv("SPILL_PARTITIONS", "64"))
+SPILL_RUN_RECORDS = int(os.getenv("SPILL_RUN_RECORDS", "50000"))
+# "csv", or "parquet" (needs pyarrow) for consolidated exports.
+SPILL_FORMAT = os.getenv("SPILL_FORMAT", "csv")
+# Rows per Parquet row group / CSV write batch.
+SPILL_WRITE_BATCH = 10000
+
+# Columns of a _dedupe record
+OUTPUT_FIELDS = ("Name", "PlaceId", "Profile", "Website", "Phone", "Rating", "Reviews", "City", "Niche")
+
+
+class SpillMerger:
+    """
+    Out-of-core merge + dedupe of record streams larger than memory.
+
+    add() streams records to disk and links their dedupe_keys in a union-find,
+    so records sharing any key (place id, phone, site or name) end up in one
+    group, exactly the records _dedupe could merge. merge() spills each record
+    to a hash partition of its group, k-way merges each partition's sorted
+    runs and runs _dedupe on one group at a time. Memory holds one entry per
+    distinct key plus SPILL_RUN_RECORDS records and one group; the output
+    matches _dedupe over all records, in partition order instead of arrival order.
+    """
+
+    def __init__(
+        self,
+        work_dir: str | None = None,
+        *,
+        partitions: int = SPILL_PARTITIONS,
+        run_records: int = SPILL_RUN_RECORDS,
+    ):
+        self.work_dir = tempfile.mkdtemp(prefix="spill_", dir=work_dir)
+        self.partitions = max(1, partitions)
+        self.run_records = max(1, run_records)
+        self._buffers: List[List[Tuple[str, int, Dict[str, Any]]]] = [[] for _ in range(self.partitions)]
+        self._buffered = 0
+        self._runs: List[List[str]] = [[] for _ in range(self.partitions)]
+        self._seq = 0
+        self._parents: Dict[str, str] = {}
+        self._incoming_path = os.path.join(self.work_dir, "incoming.ndjson")
+        self._incoming = open(self._incoming_path, "w", encoding="utf-8")
+
+    @property
+    def added(self) -> int:
+        return self._seq
+
+    def _find(self, key: str) -> str:
+        root = key
+        while self._parents.get(root, root) != root:
+            root = self._parents[root]
+        while key != root:
+            self._parents[key], key = root, self._parents[key]
+        return root
+
+    def _group(self, rec: Dict[str, Any], seq: int) -> str:
+        keys = dedupe_keys(rec)
+        # Keyless records (no name at all) are kept apart, never merged
+        return self._find(json.dumps(keys[0])) if keys else f"~{seq}"
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> None:
+        for rec in records:
+            keys = [json.dumps(k) for k in dedupe_keys(rec)]
+            roots = {self._find(k) for k in keys}
+            if keys:
+                target = min(roots)
+                for root in roots:
+                    self._parents[root] = target
+            self._incoming.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._seq += 1
+
+    def _partition(self) -> None:
+        """Spill every added record into sorted runs of its group's partition."""
+        self._incoming.close()
+        with open(self._incoming_path, "r", encoding="utf-8") as f:
+            for seq, line in enumerate(f):
+                rec = json.loads(line)
+                group = self._group(rec, seq)
+                part = zlib.crc32(group.encode("utf-8")) % self.partitions
+                # seq keeps arrival order within a group, which _dedupe's picks rely on
+                self._buffers[part].append((group, seq, rec))
+                self._buffered += 1
+                if self._buffered >= self.run_records:
+                    self._flush()
+        self._flush()
+        os.remove(self._incoming_path)
+
+    def _flush(self) -> None:
+        for part, buffer in enumerate(self._buffers):
+            if not buffer:
+                continue
+            buffer.sort(key=lambda item: (item[0], item[1]))
+            path = os.path.join(self.work_dir, f"p{part:04d}-r{len(self._runs[part]):04d}.ndjson")
+            with open(path, "w", encoding="utf-8") as f:
+                for item in buffer:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._runs[part].append(path)
+            self._buffers[part] = []
+        if self._buffered:
+            metrics.incr("spill.runs_written")
+        self._buffered = 0
+
+    @staticmethod
+    def _read_run(path: str) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, seq, rec = json.loads(line)
+                yield key, seq, rec
+
+    def merge(self) -> Iterator[Dict[str, Any]]:
+        """Yield deduped records partition by partition. Call once, after the last add()."""
+        self._partition()
+        for runs in self._runs:
+            merged = heapq.merge(*(self._read_run(p) for p in runs), key=lambda item: (item[0], item[1]))
+            for _, group in itertools.groupby(merged, key=lambda item: item[0]):
+                yield from _dedupe([rec for _, _, rec in group])
+
+    def close(self) -> None:
+        self._incoming.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def __enter__(self) -> "SpillMerger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _batches(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for rec in records:
+        batch.append(rec)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_csv(records: Iterable[Dict[str, Any]], path: str) -> int:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for batch in _batches(records, SPILL_WRITE_BATCH):
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_parquet(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Stream records into a Parquet file, one row group per batch (all string columns)."""
+    schema = pyarrow.schema([(field, pyarrow.string()) for field in OUTPUT_FIELDS])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for batch in _batches(records, SPILL_WRITE_BATCH):
+            columns = {
+                field: [None if r.get(field) is None else str(r.get(field)) for r in batch]
+                for field in OUTPUT_FIELDS
+            }
+            writer.write_table(pyarrow.table(columns, schema=schema))
+            count += len(batch)
+    return count
+
+
+def write_merged(merger: SpillMerger, out_path: str, fmt: str = SPILL_FORMAT) -> str:
+    """
+    Stream merger's deduped records to out_path as CSV, or as Parquet (same
+    name, .parquet) when fmt asks for it and pyarrow exists. Returns the path.
+    """
+    if fmt == "parquet" and pyarrow is None:
+        print("[spill] pyarrow is not installed; writing CSV instead of Parquet")
+    if fmt == "parquet" and pyarrow is not None:
+        out_path = os.path.splitext(out_path)[0] + ".parquet"
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        count = write_parquet(merger.merge(), out_path)
+    else:
+        count = write_csv(merger.merge(), out_path)
+    print(f"[spill] consolidated {merger.added} records into {count} rows at {out_path}")
+    return out_path
+
+
+def consolidate(
+    record_streams: Iterable[Iterable[Dict[str, Any]]],
+    out_path: str,
+    *,
+    fmt: str = SPILL_FORMAT,
+    work_dir: str | None = None,
+) -> str:
+    """Spill every stream, then merge + dedupe on disk into out_path."""
+    with SpillMerger(work_dir) as merger:
+        for records in record_streams:
+            merger.add(records)
+        return write_merged(merger, out_path, fmt)
@@ -0,0 +1,213 @@
+import csv
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+# SQLite file that accumulates results across runs; empty disables the store.
+RESULTS_DB = os.getenv("RESULTS_DB", "")
+
+BUSINESS_FIELDS = ("place_id", "name", "profile", "website", "phone", "rating", "reviews", "city", "niche")
+# Record key for each column above
+RECORD_FIELDS = {
+    "place_id": "PlaceId",
+    "name": "Name",
+    "profile": "Profile",
+    "website": "Website",
+    "phone": "Phone",
+    "rating": "Rating",
+    "reviews": "Reviews",
+    "city": "City",
+    "niche": "Niche",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    niche TEXT,
+    city TEXT,
+    records INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS businesses (
+    business_key TEXT PRIMARY KEY,
+    place_id TEXT,
+    name TEXT,
+    profile TEXT,
+    website TEXT,
+    phone TEXT,
+    rating REAL,
+    reviews INTEGER,
+    city TEXT,
+    niche TEXT,
+    phone_norm TEXT,
+    site_norm TEXT,
+    first_run INTEGER NOT NULL REFERENCES runs(id),
+    last_run INTEGER NOT NULL REFERENCES runs(id),
+    changed_run INTEGER NOT NULL REFERENCES runs(id),
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    business_key TEXT NOT NULL REFERENCES businesses(business_key),
+    rating REAL,
+    reviews INTEGER,
+    PRIMARY KEY (run_id, business_key)
+);
+CREATE INDEX IF NOT EXISTS idx_businesses_niche ON businesses(niche);
+CREATE INDEX IF NOT EXISTS idx_businesses_city ON businesses(city);
+CREATE INDEX IF NOT EXISTS idx_businesses_phone ON businesses(phone_norm);
+CREATE INDEX IF NOT EXISTS idx_businesses_site ON businesses(site_norm);
+CREATE INDEX IF NOT EXISTS idx_businesses_place ON businesses(place_id);
+CREATE INDEX IF NOT EXISTS idx_businesses_changed ON businesses(changed_run);
+CREATE INDEX IF NOT EXISTS idx_observations_business ON observations(business_key);
+"""
+
+# New values win, but a missing value never erases a known one. A row counts
+# as changed in this run when any stored value actually differs afterwards.
+_UPSERT = f"""
+INSERT INTO businesses (
+    business_key, {", ".join(BUSINESS_FIELDS)}, phone_norm, site_norm,
+    first_run, last_run, changed_run, updated_at
+) VALUES (:business_key, {", ".join(":" + f for f in BUSINESS_FIELDS)}, :phone_norm, :site_norm,
+    :run_id, :run_id, :run_id, :now)
+ON CONFLICT(business_key) DO UPDATE SET
+    {", ".join(f"{f} = COALESCE(excluded.{f}, businesses.{f})" for f in BUSINESS_FIELDS)},
+    phone_norm = COALESCE(excluded.phone_norm, businesses.phone_norm),
+    site_norm = COALESCE(excluded.site_norm, businesses.site_norm),
+    last_run = excluded.last_run,
+    changed_run = CASE WHEN {" OR ".join(
+        f"COALESCE(excluded.{f}, businesses.{f}) IS NOT businesses.{f}" for f in BUSINESS_FIELDS
+    )} THEN excluded.changed_run ELSE businesses.changed_run END,
+    updated_at = excluded.updated_at
+"""
+
+
+def connect(path: str = RESULTS_DB) -> sqlite3.Connection:
+    """Open (and create) the results database in WAL mode."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # WAL lets exports and other processes read while a run is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _clean(value: Any) -> Any:
+    if value in (None, "N/A", ""):
+        return None
+    return value
+
+
+def _as_number(value: Any, kind: Callable[[Any], Any]) -> Any:
+    value = _clean(value)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, str):
+            value = value.replace(",", "")
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def start_run(conn: sqlite3.Connection, *, niche: str | None = None, city: str | None = None) -> int:
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO runs (started_at, niche, city) VALUES (?, ?, ?)",
+            (time.time(), niche, city),
+        )
+    return cursor.lastrowid
+
+
+def upsert_records(
+    conn: sqlite3.Connection,
+    run_id: int,
+    records: Iterable[Dict[str, Any]],
+    key: Callable[[Dict[str, Any]], str | None],
+    *,
+    normalize_phone: Callable[[Any], str | None] = lambda v: None,
+    normalize_site: Callable[[Any], str | None] = lambda v: None,
+) -> int:
+    """
+    Upsert records as businesses plus one observation each for run_id.
+
+    key returns a record's identity (place id or dedupe key); records without
+    one are skipped. Everything is written in a single transaction.
+    """
+    now = time.time()
+    rows: List[Dict[str, Any]] = []
+    for rec in records:
+        business_key = key(rec)
+        if not business_key:
+            continue
+        row = {field: _clean(rec.get(name)) for field, name in RECORD_FIELDS.items()}
+        row["rating"] = _as_number(rec.get("Rating"), float)
+        row["reviews"] = _as_number(rec.get("Reviews"), int)
+        row.update(
+            business_key=business_key,
+            phone_norm=normalize_phone(row["phone"]),
+            site_norm=normalize_site(row["website"]),
+            run_id=run_id,
+            now=now,
+        )
+        rows.append(row)
+
+    with conn:
+        conn.executemany(_UPSERT, rows)
+        conn.executemany(
+            "INSERT OR REPLACE INTO observations (run_id, business_key, rating, reviews) "
+            "VALUES (:run_id, :business_key, :rating, :reviews)",
+            rows,
+        )
+        conn.execute("UPDATE runs SET records = ? WHERE id = ?", (len(rows), run_id))
+    return len(rows)
+
+
+def latest_run(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(id) FROM runs").fetchone()
+    return row[0] or 0
+
+
+def changed_since(
+    conn: sqlite3.Connection,
+    since_run: int,
+    *,
+    niche: str | None = None,
+    city: str | None = None,
+) -> Iterable[sqlite3.Row]:
+    """Businesses added or changed by runs after since_run (indexed on changed_run)."""
+    sql = "SELECT * FROM businesses WHERE changed_run > ?"
+    params: List[Any] = [since_run]
+    if niche:
+        sql += " AND niche = ?"
+        params.append(niche)
+    if city:
+        sql += " AND city = ?"
+        params.append(city)
+    return conn.execute(sql + " ORDER BY changed_run, business_key", params)
+
+
+def export_changed(
+    conn: sqlite3.Connection,
+    since_run: int,
+    out_path: str,
+    *,
+    niche: str | None = None,
+    city: str | None = None,
+) -> int:
+    """Stream the rows changed after since_run into a CSV file; returns the row count."""
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    count = 0
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        for row in changed_since(conn, since_run, niche=niche, city=city):
+            if writer is None:
+                writer = csv.writer(f)
+                writer.writerow(row.keys())
+            writer.writerow(tuple(row))
+            count += 1
+    print(f"[store] exported {count} rows changed after run {since_run} to {out_path}")
+    return count
@@ -1,6 +1,7 @@
-import json
 from typing import Optional
 
+from utils.pb_url import SearchUrlTemplate
+
 
 def extract_token(payload: dict) -> Optional[str]:
     """
@@ -40,17 +41,17 @@ def extract_token(payload: dict) -> Optional[str]:
 def update_url_with_token(base_url: str, new_token: str) -> Optional[str]:
     """
     Replace the token segment in the maps search URL with the provided token.
-    Looks for !5e1!9s <token> !10m2 marker pattern and bumps ech to 3 for paginated calls.
+    The token is the !9s value following !5e1 in the pb parameter; ech is bumped
+    from 2 to 3 for paginated calls.
     """
-    marker = "!5e1!9s"
-    start = base_url.find(marker)
-    if start == -1:
+    try:
+        template = SearchUrlTemplate.from_url(base_url)
+    except ValueError:
         return None
-    start += len(marker)
-    end = base_url.find("!10m2", start)
-    if end == -1:
+    if not template.has_token_slot:
         return None
-    new_url = base_url[:start] + new_token + base_url[end:]
+    template.set_token(new_token)
     # After the first page (ech=2), ensure subsequent requests use ech=3
-    new_url = new_url.replace("&ech=2", "&ech=3")
-    return new_url
+    if template.get_param("ech") == "2":
+        template.set_ech(3)
+    return template.to_url()
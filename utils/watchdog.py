@@ -0,0 +1,133 @@
+import os
+import threading
+from typing import Any, Dict, List
+
+from utils import metrics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Recycle a browser after this many searches or once its process tree passes
+# this RSS; 0 disables the respective check.
+RECYCLE_AFTER_QUERIES = int(os.getenv("RECYCLE_AFTER_QUERIES", "40"))
+RECYCLE_RSS_MB = float(os.getenv("RECYCLE_RSS_MB", "1500"))
+
+_lock = threading.Lock()
+_pending: Dict[str, Any] = {}
+# Searches a driver has served, kept on the driver so the count dies with it
+_QUERIES_ATTR = "_watchdog_queries"
+
+
+def _proc_rss(pid: int) -> int | None:
+    """RSS of one process in bytes, from psutil or /proc."""
+    if psutil:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _descendants(pid: int) -> List[int]:
+    if psutil:
+        try:
+            return [c.pid for c in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as f:
+                # ppid is the 2nd field after the parenthesised command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def tree_rss(pid: int | None) -> int | None:
+    """RSS of a process and all its descendants (Chrome spawns many)."""
+    if not pid:
+        return None
+    total = _proc_rss(pid)
+    if total is None:
+        return None
+    for child in _descendants(pid):
+        total += _proc_rss(child) or 0
+    return total
+
+
+def sample(driver) -> Dict[str, float | None]:
+    """Return browser and Python RSS in MB for a driver."""
+    browser_pid = getattr(getattr(driver, "_browser", None), "_process_pid", None)
+    browser = tree_rss(browser_pid)
+    python = _proc_rss(os.getpid())
+    return {
+        "browser_rss_mb": browser / 1e6 if browser is not None else None,
+        "python_rss_mb": python / 1e6 if python is not None else None,
+    }
+
+
+def check_driver(driver) -> str | None:
+    """
+    Count a finished search on driver and decide whether it should be recycled.
+
+    Returns the reason when a recycle is due and remembers it until
+    take_pending() is called by whoever owns the driver pool.
+    """
+    with _lock:
+        queries = getattr(driver, _QUERIES_ATTR, 0) + 1
+        setattr(driver, _QUERIES_ATTR, queries)
+    usage = sample(driver)
+    browser_mb = usage["browser_rss_mb"]
+    if browser_mb is not None:
+        metrics.incr("browser.rss_samples")
+        metrics.incr("browser.rss_mb_total", browser_mb)
+
+    reason = None
+    if RECYCLE_AFTER_QUERIES and queries >= RECYCLE_AFTER_QUERIES:
+        reason = f"{queries} queries"
+    elif RECYCLE_RSS_MB and browser_mb is not None and browser_mb >= RECYCLE_RSS_MB:
+        reason = f"browser RSS {browser_mb:.0f} MB"
+    if reason:
+        with _lock:
+            setattr(driver, _QUERIES_ATTR, 0)
+            _pending.update({"reason": reason, "queries": queries, **usage})
+    return reason
+
+
+def take_pending() -> Dict[str, Any] | None:
+    """Pop the pending recycle request, if any."""
+    with _lock:
+        if not _pending:
+            return None
+        pending = dict(_pending)
+        _pending.clear()
+        return pending
+
+
+def record_recycle(pending: Dict[str, Any]) -> None:
+    metrics.incr("browser.recycles")
+    metrics.record_event("browser_recycle", **pending)
+    print(f"[watchdog] recycled browser after {pending['reason']}")